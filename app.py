@@ -1,17 +1,138 @@
 import streamlit as st
 import os
+import uuid
 import numpy as np
-import wfdb
-from src import file_upload, visualization, analysis
-import neurokit2 as nk
-from src.chatgpt_integration import interpret_ecg_results
+from src import file_upload, visualization, analysis, utils, record_reader, hrv, model, data_preprocessing, session, beats, viewer, instrumentation
+from src.chatgpt_integration import interpret_ecg_results_async
 
 
 st.set_page_config(page_title="Análisis de ECG", page_icon=":heartpulse:", layout="wide")
 
-# Directorio temporal para guardar archivos cargados
+# Directorio temporal para guardar archivos cargados (un subdirectorio por sesión)
 temp_data_dir = "temp_data"
 os.makedirs(temp_data_dir, exist_ok=True)
+file_upload.cleanup_sessions(temp_data_dir)
+
+def load_record(uploaded_files, record_name):
+    """
+    Abre el registro directamente sobre los bytes subidos (vista int16, sin copias).
+    Si el formato no está soportado por el lector, se recurre a wfdb.
+    """
+    files = {os.path.splitext(f.name)[1]: f for f in uploaded_files}
+    try:
+        return record_reader.open_record_bytes(files[".hea"].getvalue(), files[".mat"].getbuffer())
+    except (KeyError, ValueError):
+        return record_reader.read_record(record_name)
+
+def full_signal(record, powerline_hz=None):
+    """
+    Señal completa en mV (float32). Si se indica la frecuencia de la red eléctrica, se
+    filtra con la canalización de preprocesado estándar. ``p_signal`` devuelve una copia
+    nueva en cada acceso: se filtra esa copia en el sitio (el registro no cambia) y hay
+    que usar el valor devuelto.
+    """
+    signal = record.p_signal
+    if powerline_hz:
+        pipeline = data_preprocessing.default_pipeline(powerline_hz)
+        data_preprocessing.preprocess(signal, record.fs, out=signal, pipeline=pipeline)
+    return signal
+
+def show_session_summary(session_analysis):
+    """
+    Progreso y tabla resumen de los registros de la sesión. Mientras queden registros
+    pendientes, el fragmento se actualiza solo cada segundo sin reejecutar la página.
+    """
+    @st.fragment(run_every=None if session_analysis.done() else 1.0)
+    def summary_fragment():
+        done, total = session_analysis.progress()
+        st.progress(done / total if total else 1.0, text=f"Registros analizados: {done}/{total}")
+        st.dataframe(
+            session.summary_arrays(session_analysis.summary()),
+            hide_index=True,
+            column_config={
+                "record": "Registro",
+                "status": "Estado",
+                "heart_rate_bpm": st.column_config.NumberColumn("FC (bpm)", format="%.1f"),
+                "n_peaks": "Picos R",
+                "sdnn_ms": st.column_config.NumberColumn("SDNN (ms)", format="%.1f"),
+                "rmssd_ms": st.column_config.NumberColumn("RMSSD (ms)", format="%.1f"),
+                "alerts": "Alertas",
+                "duration_s": st.column_config.NumberColumn("Duración (s)", format="%.1f"),
+                "n_leads": "Derivaciones",
+                "age": "Edad",
+                "sex": "Sexo",
+                "dx": "Diagnósticos (SNOMED)",
+                "error": "Error",
+            },
+        )
+        if done == total and st.session_state.get("session_pending"):
+            # Reejecutar la página una vez para detener la actualización periódica
+            st.session_state["session_pending"] = False
+            st.rerun()
+
+    st.session_state["session_pending"] = not session_analysis.done()
+    summary_fragment()
+
+def show_interpretation(ecg_summary):
+    """
+    Interpretación del resumen de ECG sin bloquear la página. La petición se lanza una vez
+    por resumen (el futuro se guarda en ``st.session_state``) y, mientras no haya respuesta,
+    el fragmento la consulta cada segundo sin reejecutar el análisis.
+    """
+    pending = st.session_state.get("interpretation")
+    if pending is None or pending[0] != ecg_summary:
+        pending = (ecg_summary, interpret_ecg_results_async(ecg_summary))
+        st.session_state["interpretation"] = pending
+    interpretation_future = pending[1]
+
+    @st.fragment(run_every=None if interpretation_future.done() else 1.0)
+    def interpretation_fragment():
+        if not interpretation_future.done():
+            st.info("Generando la interpretación...")
+            return
+        st.write(interpretation_future.result())  # ya resuelto: no bloquea
+        if st.session_state.get("interpretation_pending"):
+            # Reejecutar la página una vez para detener la consulta periódica
+            st.session_state["interpretation_pending"] = False
+            st.rerun()
+
+    st.session_state["interpretation_pending"] = not interpretation_future.done()
+    interpretation_fragment()
+
+def show_metrics_panel():
+    """
+    Panel de depuración: tiempo por etapa del análisis (``src/instrumentation.py``).
+    El registro de métricas es de todo el proceso, no solo de esta sesión.
+    """
+    with st.sidebar.expander("Métricas de rendimiento"):
+        st.checkbox(
+            "Registrar métricas", value=instrumentation.enabled(), key="metrics_enabled",
+            on_change=lambda: instrumentation.enable(st.session_state["metrics_enabled"]),
+        )
+        if not instrumentation.enabled():
+            st.caption("Desactivadas. También se activan con ECG_METRICS=1, ECG_METRICS_FILE o ECG_METRICS_PORT.")
+            return
+        st.dataframe(
+            instrumentation.snapshot(),
+            hide_index=True,
+            column_config={
+                "stage": "Etapa",
+                "calls": "Llamadas",
+                "errors": "Errores",
+                "total_s": st.column_config.NumberColumn("Total (s)", format="%.2f"),
+                "mean_ms": st.column_config.NumberColumn("Media (ms)", format="%.1f"),
+                "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+                "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+                "max_ms": st.column_config.NumberColumn("Máx. (ms)", format="%.1f"),
+                "samples_per_s": st.column_config.NumberColumn("Muestras/s", format="%.3g"),
+            },
+        )
+        col_download, col_reset = st.columns(2)
+        col_download.download_button("Prometheus", instrumentation.render_prometheus(),
+                                     file_name="ecg_metrics.prom", mime="text/plain")
+        if col_reset.button("Reiniciar"):
+            instrumentation.reset()
+            st.rerun()
 
 def main(): 
     st.title("Análisis de Señales ECG")
@@ -22,21 +143,58 @@ def main():
     )
 
     if uploaded_files:
-        # Guarda los archivos cargados en el directorio temporal y retorna sus rutas
-        mat_file_path, hea_file_path = file_upload.upload_files(uploaded_files)
-
-        # Se verifica que ambos archivos fueron cargados y guardados
-        if mat_file_path and hea_file_path:
-            st.success("Archivos cargados correctamente.")
-
-            # Obtener la ruta base del registro sin extensión para wfdb
-            record_name = os.path.splitext(mat_file_path)[0]
+        # Agrupa los archivos por registro y los guarda en el directorio de esta sesión
+        record_pairs, incomplete_records = file_upload.pair_record_files(uploaded_files)
+        session_dir = file_upload.session_directory(st.session_state.setdefault("session_id", uuid.uuid4().hex))
+        # Hash del contenido de cada registro: clave de la caché de resultados (y de los archivos guardados)
+        record_hashes = {name: utils.hash_uploaded_files(files.values()) for name, files in record_pairs.items()}
+        record_paths = file_upload.save_record_files(record_pairs, session_dir, record_hashes)
+        if incomplete_records:
+            st.warning(f"Registros incompletos (falta el .hea o el .mat): {', '.join(incomplete_records)}")
+
+        # Se verifica que al menos un registro tiene ambos archivos
+        if record_paths:
+            st.success(f"Archivos cargados correctamente: {len(record_paths)} registro(s).")
+
+            # ** Preprocesado opcional: deriva de la línea base, red eléctrica y pasa banda **
+            preprocess = st.sidebar.checkbox("Filtrar la señal (línea base, red eléctrica, 0.5-100 Hz)", value=False)
+            powerline_hz = st.sidebar.radio("Frecuencia de la red eléctrica (Hz)", [50, 60], horizontal=True) if preprocess else None
+
+            # ** Visualización: visor interactivo (WebGL, datos por ventanas) o imagen de papel ECG **
+            interactive_view = st.sidebar.radio(
+                "Visualización", ["Interactiva (12 derivaciones)", "Papel ECG (imagen)"]
+            ) == "Interactiva (12 derivaciones)"
+
+            cache = utils.result_cache
+
+            if len(record_paths) > 1:
+                # Todos los registros se analizan en segundo plano en el pool compartido
+                session_analysis = st.session_state.setdefault("session_analysis", session.SessionAnalysis())
+                session_analysis.retain(record_paths)
+                for name in sorted(record_paths):
+                    session_analysis.submit(name, record_paths[name], record_hashes[name], powerline_hz=powerline_hz)
+                st.header("Resumen de la Sesión")
+                show_session_summary(session_analysis)
+                record_label = st.selectbox("Selecciona el registro a visualizar:", sorted(record_paths))
+            else:
+                record_label = next(iter(record_paths))
+
+            # Registro mostrado en detalle
+            record_files = list(record_pairs[record_label].values())
+            record_name = record_paths[record_label]
+            record_hash = record_hashes[record_label]
 
             try:
-                # Cargar el registro ECG usando wfdb
-                record = wfdb.rdrecord(record_name)
-                ecg_data = record.p_signal  # Los datos de la señal (NumPy array: muestras x derivaciones)
-                fs = record.fs              # Frecuencia de muestreo (int)
+                # Abrir el registro ECG (solo si no está ya en caché). Las entradas con la señal
+                # completa (registro, señal filtrada, eje de tiempo, visor) solo se guardan en memoria:
+                # en disco serían copias de cientos de MB de los registros Holter
+                record = cache.get_or_compute(
+                    utils.make_key(record_hash, "record"),
+                    lambda: load_record(record_files, record_name),
+                    disk=False,
+                )
+                ecg_data = record.digital    # Muestras digitales int16 (vista: muestras x derivaciones)
+                fs = record.fs               # Frecuencia de muestreo (int)
                 lead_names = record.sig_name # Nombres de las derivaciones (list of str)
 
                 st.write(f"Frecuencia de muestreo: {fs} Hz")
@@ -80,11 +238,24 @@ def main():
                 # Encontrar el índice de la derivación seleccionada
                 selected_lead_index = lead_names.index(selected_lead_name)
 
-                # Extraer la señal de la derivación seleccionada
-                signal_to_process = ecg_data[:, selected_lead_index]
+                if powerline_hz:
+                    # Todas las derivaciones filtradas en una sola llamada (en caché por registro y red)
+                    filtered_signal = cache.get_or_compute(
+                        utils.make_key(record_hash, "preprocessed", powerline_hz=powerline_hz),
+                        lambda: full_signal(record, powerline_hz),
+                        disk=False,
+                    )
+                    signal_to_process = filtered_signal[:, selected_lead_index]
+                else:
+                    # Extraer la señal de la derivación seleccionada (escalada a mV solo para esta derivación)
+                    signal_to_process = record.lead(selected_lead_index)
 
                 # Calcular el vector de tiempo en milisegundos
-                time_ms = np.linspace(0, len(signal_to_process) / fs, len(signal_to_process)) * 1000
+                time_ms = cache.get_or_compute(
+                    utils.make_key(record_hash, "time_ms", n=len(signal_to_process), fs=fs),
+                    lambda: np.linspace(0, len(signal_to_process) / fs, len(signal_to_process)) * 1000,
+                    disk=False,
+                )
 
                 # Obtener el rango completo de tiempo de la señal
                 full_min_time_ms = time_ms.min() if len(time_ms) > 0 else 0
@@ -117,41 +288,79 @@ def main():
 
                 # Visualización con Cuadrícula
                 st.header("Visualización de la Señal ECG con Cuadrícula")
-                visualization.plot_ecg_signal_single_lead(signal_to_process, time_ms, fs, selected_lead_name, x_range=selected_x_range)
+                if interactive_view:
+                    # Proveedor de ventanas decimadas del registro (la pirámide min/max se calcula una vez).
+                    # Solo en memoria, como el registro
+                    signal_provider = cache.get_or_compute(
+                        utils.make_key(record_hash, "viewer", powerline_hz=powerline_hz),
+                        lambda: viewer.WindowedSignal(filtered_signal if powerline_hz else full_signal(record),
+                                                      fs, lead_names),
+                        disk=False,
+                    )
+                    viewer.show_ecg_viewer(signal_provider, x_range=selected_x_range, key="ecg_viewer")
+                else:
+                    visualization.plot_ecg_signal_single_lead(signal_to_process, time_ms, fs, selected_lead_name, x_range=selected_x_range)
 
 
                 # Análisis de Frecuencia Cardiaca
                 st.header("Análisis de Frecuencia Cardiaca")
                 st.write(f"Análisis basado en la derivación: **{selected_lead_name}**")
 
-                # Detección de Picos R con NeuroKit2
+                # Detección de Picos R en todas las derivaciones a la vez
                 st.subheader("Detección de Picos R")
-                st.write("Realizando detección de picos R usando NeuroKit2...")
+                st.write("Realizando detección de picos R en todas las derivaciones...")
                 # Inicializar heart_rate con un valor predeterminado
                 heart_rate = None
-                # Detectar picos R en la señal COMPLETA
-                all_qrs_indices = analysis.detect_peaks_neurokit2(signal_to_process, fs)
+                # Detectar picos R en la señal COMPLETA de las 12 derivaciones en una sola pasada,
+                # con la calidad de cada derivación y el consenso ponderado por calidad
+                detection = cache.get_or_compute(
+                    utils.make_key(record_hash, "consensus_peaks", powerline_hz=powerline_hz),
+                    lambda: analysis.detect_peaks_consensus(
+                        filtered_signal if powerline_hz else full_signal(record), fs)
+                )
+                consensus_qrs_indices = detection["peaks"]
+                st.write(f"Picos R de consenso entre derivaciones: **{len(consensus_qrs_indices)}**")
+
+                with st.expander("Calidad de las derivaciones"):
+                    st.dataframe(
+                        {
+                            "Derivación": lead_names,
+                            "Calidad": detection["quality"],
+                            "Picos R": [len(peaks) for peaks in detection["per_lead_peaks"]],
+                            "Latidos de consenso": detection["lead_support"],
+                        },
+                        column_config={
+                            "Calidad": st.column_config.ProgressColumn(min_value=0.0, max_value=1.0, format="%.2f"),
+                        },
+                        hide_index=True,
+                    )
+                    st.caption("Las derivaciones con calidad baja no participan en el consenso.")
+
+                use_consensus = st.checkbox(
+                    "Usar los picos R de consenso entre derivaciones (detección automática)", value=True
+                )
+                if use_consensus:
+                    all_qrs_indices = consensus_qrs_indices
+                    peak_source = "consensus"
+                else:
+                    all_qrs_indices = detection["per_lead_peaks"][selected_lead_index]
+                    peak_source = selected_lead_name
 
                 if len(all_qrs_indices) > 0:
+                    # Sumas prefijas de la serie RR: las estadísticas de cualquier rango cuestan O(log n)
+                    rr_stats = cache.get_or_compute(
+                        utils.make_key(record_hash, "rr_stats", lead=peak_source, powerline_hz=powerline_hz),
+                        lambda: hrv.RRStats(all_qrs_indices, fs, time_ms=time_ms)
+                    )
+
                     # Calcular la frecuencia cardíaca promedio
                     if len(all_qrs_indices) > 1:
-                        heart_rate, _ = analysis.calculate_heart_rate(all_qrs_indices, fs)
+                        heart_rate = rr_stats.summary()["heart_rate_bpm"]
                     else:
                         heart_rate = 0  # Si no hay suficientes picos, asignar 0 o un valor predeterminado
 
-                    # Filtrar picos R para el rango de tiempo visible
-                    # Convertir los índices de todos los picos a tiempo en ms
-                    all_qrs_times_ms = time_ms[all_qrs_indices]
-
-                    # Encontrar los índices de los picos (de la lista completa) que caen dentro del rango de tiempo visible
-                    # Usamos np.where para obtener los índices dentro de all_qrs_indices
-                    indices_of_visible_peaks_in_all = np.where(
-                        (all_qrs_times_ms >= selected_x_range[0]) &
-                        (all_qrs_times_ms <= selected_x_range[1])
-                    )[0] # [0] porque np.where devuelve una tupla con un array
-
-                    # Obtener los índices originales de los picos que están en el rango visible
-                    qrs_indices_in_visible_range = all_qrs_indices[indices_of_visible_peaks_in_all]
+                    # Picos R dentro del rango de tiempo visible (búsqueda binaria sobre los tiempos de los picos)
+                    qrs_indices_in_visible_range = rr_stats.peaks_in_range(*selected_x_range)
 
 
                     # Mostrar el conteo de picos en el rango visible
@@ -160,7 +369,12 @@ def main():
 
                     # Visualización de Picos R detectados
                     # Pasamos all_qrs_indices a la función de visualización porque ella filtra internamente
-                    visualization.plot_qrs_detection_single_lead(signal_to_process, time_ms, all_qrs_indices, fs, selected_lead_name, x_range=selected_x_range)
+                    if interactive_view:
+                        viewer.show_ecg_viewer(signal_provider, x_range=selected_x_range, qrs_indices=all_qrs_indices,
+                                               leads=[selected_lead_index], key="qrs_viewer",
+                                               title=f"Picos R en {selected_lead_name}")
+                    else:
+                        visualization.plot_qrs_detection_single_lead(signal_to_process, time_ms, all_qrs_indices, fs, selected_lead_name, x_range=selected_x_range)
 
 
                     # Cálculo y Alerta de Frecuencia Cardiaca
@@ -170,12 +384,20 @@ def main():
                     # Si hay suficientes picos en el rango visible para calcular al menos un intervalo RR
                     if len(qrs_indices_in_visible_range) > 1:
                         
-                        heart_rate, rr_intervals_ms = analysis.calculate_heart_rate(qrs_indices_in_visible_range, fs)
+                        visible_hrv = rr_stats.summary(*selected_x_range)
+                        heart_rate = visible_hrv["heart_rate_bpm"]
 
                         if heart_rate is not None:
                             st.write(f"Frecuencia cardíaca promedio calculada para el **rango visible**: **{heart_rate:.2f} bpm**")
                             st.info("Nota: La frecuencia cardíaca calculada aquí se basa en los picos detectados en el segmento de tiempo actualmente visible.")
 
+                            # Variabilidad de la frecuencia cardíaca (dominio del tiempo) en el rango visible
+                            if visible_hrv["sdnn_ms"] is not None:
+                                col_sdnn, col_rmssd, col_pnn50 = st.columns(3)
+                                col_sdnn.metric("SDNN", f"{visible_hrv['sdnn_ms']:.1f} ms")
+                                col_rmssd.metric("RMSSD", f"{visible_hrv['rmssd_ms']:.1f} ms")
+                                col_pnn50.metric("pNN50", f"{visible_hrv['pnn50'] * 100:.1f} %")
+
                             # Alerta de frecuencia cardíaca (basada en el rango visible)
                             if heart_rate < 60 or heart_rate > 100:
                                 st.warning("Alerta: Frecuencia cardíaca fuera del rango normal (60-100 bpm) en el segmento visible.")
@@ -188,6 +410,50 @@ def main():
                     else:
                         st.warning("No hay suficientes picos R detectados en el rango visible para calcular la frecuencia cardíaca.")
 
+                    # Morfología: latidos agrupados por correlación con plantillas (todas las derivaciones)
+                    st.subheader("Morfología de los Latidos")
+                    clusters = cache.get_or_compute(
+                        utils.make_key(record_hash, "beat_clusters", peaks=peak_source, powerline_hz=powerline_hz),
+                        lambda: beats.cluster_beats(
+                            filtered_signal if powerline_hz else full_signal(record), all_qrs_indices, fs)
+                    )
+                    if len(clusters["counts"]):
+                        st.write(f"{len(clusters['peaks'])} latidos agrupados en **{len(clusters['counts'])}** "
+                                 f"clase(s) morfológica(s)")
+                        st.dataframe(
+                            {
+                                "Clase": np.arange(len(clusters["counts"])),
+                                "Latidos": clusters["counts"],
+                                "%": 100 * clusters["counts"] / clusters["counts"].sum(),
+                            },
+                            column_config={"%": st.column_config.NumberColumn(format="%.1f")},
+                            hide_index=True,
+                        )
+                        st.line_chart({f"Clase {i}": template[selected_lead_index]
+                                       for i, template in enumerate(clusters["templates"])})
+                        st.caption(f"Plantilla normalizada de cada clase en {selected_lead_name} (ventana de -100 a +150 ms alrededor del pico R).")
+                    else:
+                        st.info("No hay latidos con ventana completa para agrupar.")
+
+                    # Clasificación de latidos (solo si se ha configurado un modelo con ECG_MODEL_PATH)
+                    if os.getenv("ECG_MODEL_PATH"):
+                        st.subheader("Clasificación de Latidos")
+                        classifier = model.load_classifier()
+                        if classifier.n_leads == 1:
+                            classification = cache.get_or_compute(
+                                utils.make_key(record_hash, "classification", lead=selected_lead_name, peaks=peak_source,
+                                               powerline_hz=powerline_hz, model=classifier.model_path),
+                                lambda: classifier.classify_record(signal_to_process, all_qrs_indices, fs)
+                            )
+                            if classification["record_label"] is not None:
+                                label_names = dict(zip(classifier.labels, classifier.label_names))
+                                st.write(f"Clasificación del registro: **{label_names[classification['record_label']]}** "
+                                         f"({len(classification['beat_indices'])} latidos clasificados)")
+                            else:
+                                st.info("No hay latidos con ventana completa para clasificar.")
+                        else:
+                            st.info(f"El modelo configurado espera {classifier.n_leads} derivaciones.")
+
 
                 else:
                     st.warning("No se detectaron picos R en la derivación seleccionada (en toda la señal). No se puede realizar el análisis de frecuencia cardíaca.")
@@ -195,18 +461,19 @@ def main():
                         """
                         Posibles razones:
                         - La señal está muy ruidosa en esta derivación.
-                        - La detección automática de NeuroKit2 no funcionó correctamente para esta señal/derivación.
+                        - La detección automática no funcionó correctamente para esta señal/derivación.
                         - La derivación seleccionada no contiene una señal de ECG clara (por ejemplo, es una derivación exploratoria o de bajo voltaje).
-                        Considera seleccionar otra derivación si está disponible.
+                        Considera seleccionar otra derivación si está disponible, o usar los picos R de consenso.
                         """
                     )
 
 
             except Exception as e:
+                instrumentation.record_error("app", e)
                 st.error(f"Ocurrió un error durante el procesamiento o análisis: {e}")
                 st.exception(e)
         else:
-            st.warning("Asegúrate de subir tanto el archivo .mat como el .hea para el registro completo. Ambos son necesarios.")
+            st.warning("Asegúrate de subir tanto el archivo .mat como el .hea de cada registro. Ambos son necesarios.")
         # Generar un resumen de los resultados del ECG
         ecg_summary = f"""
         Análisis de ECG:
@@ -216,10 +483,17 @@ def main():
         - Observaciones: {'Frecuencia cardíaca fuera del rango normal' if heart_rate < 60 or heart_rate > 100 else 'Frecuencia cardíaca dentro del rango normal'}
         """
 
-        # Interpretar los resultados usando ChatGPT
+        # Interpretar los resultados usando ChatGPT (sin bloquear: el análisis ya se ha mostrado)
         st.header("Interpretación del ECG")
-        interpretation = interpret_ecg_results(ecg_summary)
-        st.write(interpretation)
+        show_interpretation(ecg_summary)
+
+    # Contadores de la caché de resultados (para verificar su funcionamiento bajo carga)
+    with st.sidebar.expander("Caché de resultados"):
+        st.json(utils.result_cache.stats())
+    show_metrics_panel()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    instrumentation.serve_from_env()  # endpoint /metrics (una vez por proceso), solo si ECG_METRICS_PORT está definido
+    with instrumentation.timer("app.run"):
+        main()
+    instrumentation.dump()  # solo si ECG_METRICS_FILE está definido
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Benchmark: detección de picos R derivación por derivación con NeuroKit2
+frente a la detección por lotes de todas las derivaciones en una sola pasada.
+
+Uso:
+    python benchmarks/bench_batch_detection.py [--record data/raw_data/JS00001] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import wfdb
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import analysis  # noqa: E402
+
+
+def time_call(func, repeat):
+    """Devuelve el mejor tiempo (s) de ``repeat`` ejecuciones de ``func``."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def per_lead(ecg_data, fs):
+    return [analysis.detect_peaks_neurokit2(ecg_data[:, i], fs) for i in range(ecg_data.shape[1])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", default="data/raw_data/JS00001", help="Ruta del registro WFDB sin extensión")
+    parser.add_argument("--repeat", type=int, default=20, help="Número de repeticiones por método")
+    args = parser.parse_args()
+
+    record = wfdb.rdrecord(args.record)
+    ecg_data, fs = record.p_signal, record.fs
+
+    t_per_lead = time_call(lambda: per_lead(ecg_data, fs), args.repeat)
+    t_batch = time_call(lambda: analysis.detect_peaks_batch(ecg_data, fs), args.repeat)
+
+    # Concordancia: picos por lotes a menos de 50 ms de un pico de NeuroKit2
+    reference = per_lead(ecg_data, fs)
+    batch_peaks, consensus = analysis.detect_peaks_batch(ecg_data, fs)
+    tolerance = int(0.050 * fs)
+
+    print(f"Registro: {args.record} ({ecg_data.shape[0]} muestras x {ecg_data.shape[1]} derivaciones, {fs} Hz)")
+    print(f"NeuroKit2 por derivación: {t_per_lead * 1000:8.2f} ms")
+    print(f"Detección por lotes:      {t_batch * 1000:8.2f} ms  (x{t_per_lead / t_batch:.1f})")
+    print(f"Picos de consenso: {len(consensus)}")
+    for name, ref, peaks in zip(record.sig_name, reference, batch_peaks):
+        if len(ref) and len(peaks):
+            matched = int(np.sum(np.abs(peaks[:, None] - ref[None, :]).min(axis=1) <= tolerance))
+        else:
+            matched = 0
+        print(f"  {name:>4}: NeuroKit2={len(ref):3d}  lotes={len(peaks):3d}  coincidentes={matched:3d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark de la segmentación de latidos y la agrupación por morfología (``src.beats``)
+sobre un registro Holter simulado.
+
+Se simula un registro de ``--beats`` latidos con tres morfologías (latido normal,
+extrasístoles ventriculares anchas y sin onda P, y latidos aberrantes con el QRS
+mellado) más ruido y deriva de la línea base. Se mide:
+
+- La extracción de todas las ventanas en la matriz float32 frente a un bucle de
+  Python que copia y apila latido a latido.
+- La agrupación por plantillas (latidos/s, clases encontradas y pureza frente a la
+  morfología simulada) y su pico de memoria con distintos tamaños de bloque.
+
+Uso:
+    python benchmarks/bench_beats.py [--beats 100000] [--fs 250] [--leads 2]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import beats  # noqa: E402
+
+CLASSES = ["normal", "ventricular", "aberrante"]
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory_mib(func):
+    """Pico de memoria (MiB) reservado por ``func`` según tracemalloc."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def beat_shapes(fs, n_leads):
+    """Forma de cada morfología (clases x derivaciones x muestras) en una ventana de -0.3 a 0.5 s."""
+    t = np.arange(int(-0.3 * fs), int(0.5 * fs)) / fs
+
+    def wave(center, width, amplitude):
+        return amplitude * np.exp(-0.5 * ((t - center) / width) ** 2)
+
+    normal = wave(-0.16, 0.025, 0.15) + wave(0, 0.01, 1.0) + wave(0.03, 0.012, -0.25) + wave(0.25, 0.05, 0.3)
+    ventricular = wave(0, 0.035, -1.2) + wave(0.06, 0.03, 0.5) + wave(0.28, 0.07, -0.4)
+    aberrant = (wave(-0.16, 0.025, 0.15) + wave(-0.012, 0.01, 0.8) + wave(0.018, 0.01, 0.7)
+                + wave(0.045, 0.015, -0.3) + wave(0.25, 0.05, 0.3))
+    gains = np.linspace(1.0, 0.6, n_leads)  # amplitud distinta en cada derivación
+    shapes = np.stack([normal, ventricular, aberrant])
+    return shapes[:, np.newaxis, :] * gains[np.newaxis, :, np.newaxis], int(0.3 * fs)
+
+
+def simulate_holter(n_beats, fs, n_leads, ectopic_fraction, rng):
+    """
+    Registro simulado (muestras x derivaciones, float32), picos R (con ±1 muestra de
+    error, como un detector) y morfología real de cada latido.
+    """
+    kinds = rng.choice(3, n_beats, p=[1 - ectopic_fraction, ectopic_fraction * 0.7, ectopic_fraction * 0.3])
+    rr = rng.normal(0.85, 0.05, n_beats).clip(0.6, 1.2)
+    rr[kinds == 1] *= 0.75  # las extrasístoles llegan antes
+    peaks = (np.cumsum(rr) * fs).astype(int) + fs
+    n_samples = peaks[-1] + fs
+
+    shapes, pre = beat_shapes(fs, n_leads)
+    signal = rng.normal(0, 0.03, (n_samples, n_leads)).astype(np.float32)
+    signal += (0.2 * np.sin(2 * np.pi * 0.2 * np.arange(n_samples) / fs)).astype(np.float32)[:, np.newaxis]
+    positions = peaks[:, np.newaxis] - pre + np.arange(shapes.shape[2])
+    for lead in range(n_leads):
+        np.add.at(signal[:, lead], positions, shapes[kinds, lead, :])
+
+    detected = peaks + rng.integers(-1, 2, n_beats)
+    return signal, detected, kinds
+
+
+def loop_extract(signal, peaks, pre, post):
+    return np.stack([signal[p - pre:p + post].T.astype(np.float32) for p in peaks])
+
+
+def purity(labels, kinds):
+    """Fracción de latidos cuya clase coincide con la morfología mayoritaria de su clase."""
+    correct = 0
+    for label in np.unique(labels):
+        correct += np.bincount(kinds[labels == label], minlength=3).max()
+    return correct / len(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--beats", type=int, default=100000, help="Número de latidos simulados")
+    parser.add_argument("--fs", type=int, default=250, help="Frecuencia de muestreo en Hz")
+    parser.add_argument("--leads", type=int, default=2, help="Número de derivaciones")
+    parser.add_argument("--ectopic", type=float, default=0.05, help="Fracción de latidos no normales")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por medición")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    signal, peaks, kinds = simulate_holter(args.beats, args.fs, args.leads, args.ectopic, rng)
+    pre, post = int(round(0.25 * args.fs)), int(round(0.4 * args.fs))
+    print(f"{args.beats:,d} latidos, {args.leads} derivaciones a {args.fs} Hz "
+          f"({len(signal) / args.fs / 3600:.1f} h, {signal.nbytes / 2**20:.0f} MiB)")
+    print("Morfologías simuladas: " + ", ".join(f"{name}={n}" for name, n in zip(CLASSES, np.bincount(kinds))))
+
+    print("\nExtracción de ventanas (-0.25 s, +0.4 s):")
+    t_loop = best_time(lambda: loop_extract(signal, peaks, pre, post), args.repeat)
+    t_view = best_time(lambda: beats.extract_beats(signal, peaks, args.fs), args.repeat)
+    _, matrix = beats.extract_beats(signal, peaks, args.fs)
+    print(f"  Bucle de Python + np.stack:   {t_loop * 1000:8.1f} ms")
+    print(f"  Vista + matriz float32:       {t_view * 1000:8.1f} ms  (x{t_loop / t_view:.1f}), "
+          f"{matrix.nbytes / 2**20:.0f} MiB")
+    del matrix
+
+    print("\nAgrupación por plantillas:")
+    for chunk in (256, 1024, 4096):
+        def run():
+            return beats.cluster_beats(signal, peaks, args.fs, chunk_beats=chunk)
+        elapsed = best_time(run, args.repeat)
+        memory = peak_memory_mib(run)
+        result = run()
+        print(f"  bloque={chunk:6d}: {elapsed * 1000:8.1f} ms  {args.beats / elapsed:10,.0f} latidos/s  "
+              f"pico {memory:6.1f} MiB  clases={len(result['counts'])}  "
+              f"pureza={purity(result['labels'], kinds[np.isin(peaks, result['peaks'])]):.3f}")
+    print("  Latidos por clase: " + ", ".join(str(n) for n in result["counts"]))
+
+
+if __name__ == "__main__":
+    main()
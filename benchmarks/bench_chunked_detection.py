@@ -0,0 +1,60 @@
+"""
+Benchmark de la detección de picos R por bloques con solapamiento
+(``analysis.detect_peaks_chunked``) frente a una única llamada sobre toda la señal.
+
+Simula un registro largo con NeuroKit2 y compara tiempo, pico de memoria y
+coincidencia exacta de la lista de picos.
+
+Uso:
+    python benchmarks/bench_chunked_detection.py [--minutes 60] [--fs 500] [--workers 1 4]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import neurokit2 as nk
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import analysis  # noqa: E402
+
+
+def measure(func):
+    """Devuelve (resultado, tiempo en s, pico de memoria asignada en bytes) de ``func``."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60, help="Duración del registro simulado, en minutos")
+    parser.add_argument("--fs", type=int, default=500, help="Frecuencia de muestreo en Hz")
+    parser.add_argument("--chunk-s", type=float, default=60, help="Duración de cada bloque, en segundos")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="Hilos a probar")
+    args = parser.parse_args()
+
+    signal = nk.ecg_simulate(duration=int(args.minutes * 60), sampling_rate=args.fs, heart_rate=70,
+                             noise=0.05, random_state=0)
+    print(f"Señal simulada: {args.minutes:g} min, {len(signal):,d} muestras a {args.fs} Hz")
+
+    whole, t_whole, m_whole = measure(lambda: analysis.detect_peaks_neurokit2(signal, args.fs))
+    print(f"Señal completa:            {t_whole:7.2f} s   pico de memoria {m_whole / 2**20:8.1f} MiB   picos {len(whole)}")
+
+    for workers in args.workers:
+        peaks, elapsed, peak_mem = measure(
+            lambda: analysis.detect_peaks_chunked(signal, args.fs, chunk_s=args.chunk_s, workers=workers))
+        same = "idénticos" if np.array_equal(peaks, whole) else f"distintos ({analysis.compare_peaks(peaks, whole, args.fs)})"
+        print(f"Por bloques ({workers} hilo(s)):   {elapsed:7.2f} s   pico de memoria {peak_mem / 2**20:8.1f} MiB   "
+              f"picos {len(peaks)} ({same})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: consenso de picos R entre derivaciones con derivaciones ruidosas.
+
+Sobre el registro de ejemplo se añade ruido blanco a un número creciente de
+derivaciones y se compara, frente a los picos de consenso de la señal limpia, el
+consenso por mayoría (``detect_peaks_batch``) con el consenso ponderado por la calidad
+de cada derivación (``detect_peaks_consensus``). También se mide el coste de puntuar
+la calidad de todas las derivaciones y de la fusión ponderada.
+
+Uso:
+    python benchmarks/bench_consensus.py [--record data/raw_data/JS00001] [--noise 1.0] [--seeds 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import wfdb
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import analysis  # noqa: E402
+
+
+def time_call(func, repeat):
+    """Devuelve el mejor tiempo (s) de ``repeat`` ejecuciones de ``func``."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def add_noise(ecg_data, n_noisy, noise, rng):
+    """Copia de la señal con ruido blanco en ``n_noisy`` derivaciones elegidas al azar."""
+    noisy = ecg_data.copy()
+    for lead in rng.choice(ecg_data.shape[1], n_noisy, replace=False):
+        noisy[:, lead] += rng.normal(0, noise, len(noisy))
+    return noisy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", default="data/raw_data/JS00001", help="Ruta del registro WFDB sin extensión")
+    parser.add_argument("--noise", type=float, default=1.0, help="Desviación típica del ruido en mV")
+    parser.add_argument("--seeds", type=int, default=3, help="Repeticiones con ruido distinto por escenario")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones para las mediciones de tiempo")
+    args = parser.parse_args()
+
+    record = wfdb.rdrecord(args.record)
+    ecg_data, fs = np.nan_to_num(record.p_signal), record.fs
+    n_leads = ecg_data.shape[1]
+    _, reference = analysis.detect_peaks_batch(ecg_data, fs)
+
+    per_lead_peaks, filtered, energy = analysis._detect_per_lead(ecg_data, fs, 200, 0.3)
+    quality = analysis.lead_quality(None, fs, filtered=filtered, energy=energy)
+    t_batch = time_call(lambda: analysis.detect_peaks_batch(ecg_data, fs), args.repeat)
+    t_consensus = time_call(lambda: analysis.detect_peaks_consensus(ecg_data, fs), args.repeat)
+    t_quality = time_call(lambda: analysis.lead_quality(ecg_data, fs), args.repeat)
+    t_fuse = time_call(lambda: analysis.fuse_peaks_weighted(per_lead_peaks, fs, quality), args.repeat)
+
+    print(f"Registro: {args.record} ({ecg_data.shape[0]} muestras x {n_leads} derivaciones, {fs} Hz), "
+          f"{len(reference)} latidos de referencia")
+    print(f"Detección + consenso por mayoría:  {t_batch * 1000:8.2f} ms")
+    print(f"Detección + consenso ponderado:    {t_consensus * 1000:8.2f} ms")
+    print(f"  Calidad de las derivaciones:     {t_quality * 1000:8.2f} ms (incluye el filtrado)")
+    print(f"  Fusión ponderada:                {t_fuse * 1000:8.2f} ms")
+    print()
+    print(f"Ruido de {args.noise} mV; sensibilidad / VPP / error medio frente a la señal limpia")
+    print(f"{'ruidosas':>8}  {'mayoría':>24}  {'ponderado':>24}")
+    for n_noisy in range(0, n_leads, 2):
+        scores = {"mayoría": [], "ponderado": []}
+        for seed in range(args.seeds):
+            noisy = add_noise(ecg_data, n_noisy, args.noise, np.random.default_rng(seed))
+            scores["mayoría"].append(analysis.compare_peaks(analysis.detect_peaks_batch(noisy, fs)[1], reference, fs))
+            scores["ponderado"].append(
+                analysis.compare_peaks(analysis.detect_peaks_consensus(noisy, fs)["peaks"], reference, fs))
+        cells = []
+        for results in scores.values():
+            errors = [r["mean_error_ms"] for r in results if r["mean_error_ms"] is not None]
+            cells.append(f"{np.mean([r['sensitivity'] for r in results]):5.2f} / "
+                         f"{np.mean([r['ppv'] for r in results]):4.2f} / "
+                         f"{np.mean(errors) if errors else float('nan'):5.1f} ms")
+        print(f"{n_noisy:>8}  {cells[0]:>24}  {cells[1]:>24}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark del módulo de análisis RR/HRV (``src.hrv``) sobre series de longitud Holter.
+
+Mide la construcción de las sumas prefijas, el coste de una consulta de rango
+(equivalente a mover el slider) frente a filtrar con máscaras y recalcular, y las
+series en ventana deslizante.
+
+Uso:
+    python benchmarks/bench_hrv.py [--beats 100000] [--fs 500]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import analysis, hrv  # noqa: E402
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--beats", type=int, default=100000, help="Número de latidos simulados")
+    parser.add_argument("--fs", type=int, default=500, help="Frecuencia de muestreo en Hz")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por medición")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rr_samples = rng.normal(0.85, 0.08, args.beats).clip(0.3, 2.0) * args.fs
+    qrs_indices = np.cumsum(rr_samples).astype(int)
+    duration_ms = qrs_indices[-1] * 1000 / args.fs
+    x_range = (duration_ms * 0.4, duration_ms * 0.4 + 10000)  # ventana visible de 10 s
+    times_ms = qrs_indices * 1000 / args.fs
+
+    def mask_and_recompute():
+        visible = qrs_indices[(times_ms >= x_range[0]) & (times_ms <= x_range[1])]
+        return analysis.calculate_heart_rate(visible, args.fs)
+
+    stats = hrv.RRStats(qrs_indices, args.fs)
+    cases = [
+        ("RRStats (sumas prefijas, una vez)", lambda: hrv.RRStats(qrs_indices, args.fs)),
+        ("Consulta de rango con RRStats", lambda: stats.summary(*x_range)),
+        ("Máscara np.where + calculate_heart_rate", mask_and_recompute),
+        ("hrv_summary (serie completa)", lambda: hrv.hrv_summary(hrv.rr_intervals(qrs_indices, args.fs))),
+        ("rolling_hrv (ventana de 5 min)", lambda: hrv.rolling_hrv(qrs_indices, args.fs, window_s=300)),
+    ]
+    print(f"{args.beats:,d} latidos ({duration_ms / 3.6e6:.1f} h a {args.fs} Hz)")
+    for name, func in cases:
+        print(f"  {name:<42} {best_time(func, args.repeat) * 1e6:10.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
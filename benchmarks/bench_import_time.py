@@ -0,0 +1,77 @@
+"""
+Tiempo de importación de los módulos de ``src`` en un intérprete nuevo (``-X importtime``).
+
+Para cada módulo se lanza ``python -X importtime -c "import <módulo>"`` varias veces y
+se toma el mejor tiempo acumulado. También se indica qué dependencias pesadas
+(NeuroKit2, TensorFlow, matplotlib, OpenAI, wfdb, pandas, scipy...) se cargan al importarlo:
+deberían cargarse solo en el primer uso.
+
+Uso:
+    python benchmarks/bench_import_time.py [--repeat 5] [--modules src.batch src.analysis]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+MODULES = [
+    "src.instrumentation", "src.utils", "src.record_reader", "src.hrv", "src.data_preprocessing", "src.analysis",
+    "src.batch", "src.signal_store", "src.session", "src.streaming", "src.beats", "src.model", "src.chatgpt_integration",
+    "src.visualization", "src.viewer",
+]
+
+# Dependencias que solo deben importarse cuando se usan
+HEAVY_MODULES = ["neurokit2", "tensorflow", "matplotlib", "openai", "dotenv", "wfdb", "pandas", "plotly", "sklearn",
+                 "scipy.signal", "scipy.ndimage", "scipy.stats"]
+
+
+def import_time(module):
+    """
+    Importa ``module`` en un intérprete nuevo con ``-X importtime``.
+
+    Returns:
+        float: Tiempo acumulado de la importación, en segundos.
+        list: Dependencias de ``HEAVY_MODULES`` cargadas.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        cumulative[name] = int(cumulative_us)
+    return cumulative[module] / 1e6, [name for name in HEAVY_MODULES if name in cumulative]
+
+
+def measure_import_times(modules=MODULES, repeat=5):
+    """
+    Mejor tiempo de importación de cada módulo.
+
+    Returns:
+        dict: Módulo -> ``time_s`` y ``heavy`` (dependencias pesadas cargadas).
+    """
+    results = {}
+    for module in modules:
+        runs = [import_time(module) for _ in range(repeat)]
+        results[module] = {"time_s": min(t for t, _ in runs), "heavy": runs[0][1]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=MODULES, help="Módulos a importar")
+    parser.add_argument("--repeat", type=int, default=5, help="Intérpretes nuevos por módulo")
+    args = parser.parse_args()
+
+    for module, result in measure_import_times(args.modules, args.repeat).items():
+        heavy = ", ".join(result["heavy"]) or "-"
+        print(f"{module:<26} {result['time_s'] * 1000:8.1f} ms   dependencias pesadas: {heavy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark del coste de la instrumentación (``src.instrumentation``).
+
+Se mide, con las métricas desactivadas y activadas:
+
+- Una llamada a una función vacía sin decorar, con ``@timed`` y dentro de ``with timer(...)``
+  (coste fijo por llamada, en ns).
+- Etapas reales sobre el registro de ejemplo (``record_reader.open_record_bytes``,
+  ``detect_peaks_consensus``, ``Pipeline.apply`` y ``cluster_beats``): tiempo de la
+  función original (``__wrapped__``) frente a la instrumentada.
+
+Por último se mide el coste de exportar las métricas en formato Prometheus.
+
+Uso:
+    python benchmarks/bench_instrumentation.py [--record data/raw_data/JS00001] [--calls 200000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import analysis, beats, data_preprocessing, instrumentation, record_reader  # noqa: E402
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def noop():
+    pass
+
+
+@instrumentation.timed("bench.noop")
+def timed_noop():
+    pass
+
+
+def with_timer():
+    with instrumentation.timer("bench.timer"):
+        pass
+
+
+def per_call_ns(func, calls, repeat):
+    def loop():
+        for _ in range(calls):
+            func()
+    return best_time(loop, repeat) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", default="data/raw_data/JS00001", help="Registro WFDB sin extensión")
+    parser.add_argument("--calls", type=int, default=200000, help="Llamadas por medición del coste fijo")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por medición")
+    args = parser.parse_args()
+
+    with open(f"{args.record}.hea", "rb") as f:
+        hea_bytes = f.read()
+    with open(f"{args.record}.mat", "rb") as f:
+        mat_bytes = f.read()
+    record = record_reader.open_record_bytes(hea_bytes, mat_bytes)
+    signal, fs = record.p_signal, record.fs
+    peaks = analysis.detect_peaks_consensus(signal, fs)["peaks"]
+    pipeline = data_preprocessing.default_pipeline(50)
+
+    stages = {
+        "open_record_bytes": (record_reader.open_record_bytes, (hea_bytes, mat_bytes)),
+        "detect_peaks_consensus": (analysis.detect_peaks_consensus, (signal, fs)),
+        "Pipeline.apply": (data_preprocessing.Pipeline.apply, (pipeline, signal, fs)),
+        "cluster_beats": (beats.cluster_beats, (signal, peaks, fs)),
+    }
+
+    base_ns = per_call_ns(noop, args.calls, 3)
+    print("Coste fijo por llamada (ns):")
+    print(f"  {'función sin decorar':<34}{base_ns:8.0f}")
+    for enabled in (False, True):
+        instrumentation.enable(enabled)
+        state = "activadas" if enabled else "desactivadas"
+        print(f"  {f'@timed, métricas {state}':<34}{per_call_ns(timed_noop, args.calls, 3) - base_ns:+8.0f}")
+        print(f"  {f'with timer, métricas {state}':<34}{per_call_ns(with_timer, args.calls, 3) - base_ns:+8.0f}")
+
+    print(f"\nEtapas sobre {os.path.basename(args.record)} (mejor de {args.repeat}, ms):")
+    print(f"  {'etapa':<26}{'original':>10}{'desactiv.':>11}{'activadas':>11}")
+    for name, (func, func_args) in stages.items():
+        original = best_time(lambda: func.__wrapped__(*func_args), args.repeat)
+        times = []
+        for enabled in (False, True):
+            instrumentation.enable(enabled)
+            times.append(best_time(lambda: func(*func_args), args.repeat))
+        print(f"  {name:<26}{original * 1000:10.3f}{times[0] * 1000:11.3f}{times[1] * 1000:11.3f}")
+
+    instrumentation.enable(True)
+    text = instrumentation.render_prometheus()
+    elapsed = best_time(instrumentation.render_prometheus, args.repeat)
+    print(f"\nExportación Prometheus: {elapsed * 1000:.2f} ms ({len(text.splitlines())} líneas)")
+    instrumentation.enable(False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark de throughput del clasificador de latidos (``src.model``) en CPU.
+
+Mide latidos/s para distintos tamaños de lote y número de hilos sobre una señal
+simulada larga, y registros/s sobre el registro de ejemplo (solo clasificación,
+con los picos R ya detectados). Por defecto usa el modelo de prueba incluido.
+
+Uso:
+    python benchmarks/bench_model.py [--model models/tiny_beat_classifier.npz] [--batch-sizes 64 1024 4096] [--threads 1 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+import neurokit2 as nk
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import analysis, model, record_reader  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=model.TEST_MODEL_PATH, help="Ruta del modelo")
+    parser.add_argument("--record", default="data/raw_data/JS00001", help="Registro WFDB para registros/s")
+    parser.add_argument("--minutes", type=float, default=30, help="Duración de la señal simulada, en minutos")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[64, 1024, 4096], help="Tamaños de lote")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4], help="Hilos de inferencia")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por medición")
+    args = parser.parse_args()
+
+    fs = 500
+    signal = nk.ecg_simulate(duration=int(args.minutes * 60), sampling_rate=fs, heart_rate=80, random_state=0)
+    qrs_indices = analysis.detect_peaks_chunked(signal, fs)
+    print(f"Señal simulada: {args.minutes:g} min, {len(qrs_indices)} latidos")
+
+    for threads in args.threads:
+        for batch_size in args.batch_sizes:
+            classifier = model.BeatClassifier(args.model, batch_size=batch_size, num_threads=threads)
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                classifier.predict_proba(signal, qrs_indices, fs)
+                best = min(best, time.perf_counter() - start)
+            print(f"  hilos={threads:<2d} lote={batch_size:<5d} {len(qrs_indices) / best:12,.0f} latidos/s")
+
+    record = record_reader.open_record(args.record)
+    lead = record.lead("II")
+    peaks = analysis.detect_peaks_batch(lead, record.fs)[0][0]
+    classifier = model.load_classifier(args.model)
+    n = 200
+    start = time.perf_counter()
+    for _ in range(n):
+        classifier.classify_record(lead, peaks, record.fs)
+    elapsed = time.perf_counter() - start
+    print(f"Registro {args.record} ({len(peaks)} latidos): {n / elapsed:,.0f} registros/s")
+
+
+if __name__ == "__main__":
+    main()
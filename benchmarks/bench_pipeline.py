@@ -0,0 +1,260 @@
+"""
+Benchmark de la canalización completa carga → filtrado → detección → render, con
+líneas base en JSON para detectar regresiones entre ejecuciones.
+
+Se sintetizan registros con ``nk.ecg_simulate`` (duración, número de derivaciones y
+frecuencia de muestreo configurables), se escriben en formato WFDB de 16 bits y se
+procesan junto con el registro incluido ``JS00001``. Para cada etapa se mide el mejor
+tiempo de ``--repeat`` ejecuciones, el throughput (muestras/s) y el pico de memoria
+asignada (``tracemalloc``, en una ejecución aparte para no alterar los tiempos).
+Además se mide el tiempo de importación de los módulos de ``src`` en intérpretes
+nuevos (``bench_import_time.py``, basado en ``-X importtime``).
+
+Uso:
+    python benchmarks/bench_pipeline.py --output baseline.json
+    python benchmarks/bench_pipeline.py --baseline baseline.json [--tolerance 0.2]
+    python benchmarks/bench_pipeline.py --diff antes.json despues.json
+
+Con ``--baseline`` o ``--diff`` se comparan los resultados etapa a etapa y el proceso
+termina con código 1 si alguna etapa es más lenta (o usa más memoria) que la línea
+base en más de ``--tolerance``.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import neurokit2 as nk  # noqa: E402
+import numpy as np  # noqa: E402
+import wfdb  # noqa: E402
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import analysis, data_preprocessing, record_reader, visualization  # noqa: E402
+from bench_import_time import measure_import_times  # noqa: E402
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "raw_data"))
+LEAD_NAMES = ["I", "II", "III", "aVR", "aVL", "aVF", "V1", "V2", "V3", "V4", "V5", "V6"]
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func):
+    """Pico de memoria asignada (bytes) durante una ejecución de ``func``."""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def synthesize_record(write_dir, seconds, n_leads, fs):
+    """
+    Simula un registro de ``n_leads`` derivaciones y lo escribe en WFDB (formato 16).
+
+    Returns:
+        str: Ruta del registro sin extensión.
+    """
+    name = f"synthetic_{seconds:g}s_{n_leads}l_{fs}hz".replace(".", "_")
+    base = nk.ecg_simulate(duration=seconds, sampling_rate=fs, heart_rate=70, noise=0.05, random_state=0)
+    rng = np.random.default_rng(0)
+    # Derivaciones con distinta amplitud y ruido a partir de la misma actividad cardiaca
+    signals = np.column_stack([base * rng.uniform(0.5, 1.5) + 0.02 * rng.standard_normal(len(base))
+                               for _ in range(n_leads)])
+    sig_name = [LEAD_NAMES[i] if i < len(LEAD_NAMES) else f"ch{i + 1}" for i in range(n_leads)]
+    wfdb.wrsamp(name, fs=fs, units=["mV"] * n_leads, sig_name=sig_name, p_signal=signals,
+                fmt=["16"] * n_leads, adc_gain=[1000.0] * n_leads, baseline=[0] * n_leads,
+                write_dir=write_dir)
+    return os.path.join(write_dir, name)
+
+
+def bench_record(path, repeat):
+    """
+    Mide cada etapa de la canalización sobre un registro WFDB.
+
+    Returns:
+        dict: ``n_samples``, ``n_leads``, ``fs`` y ``stages`` (etapa -> ``time_s``,
+              ``samples_per_s`` y ``peak_mib``).
+    """
+    record = wfdb.rdrecord(path)
+    fs = int(record.fs)
+    signal = record.p_signal
+    lead = np.ascontiguousarray(signal[:, min(1, signal.shape[1] - 1)])
+    n_samples, n_leads = signal.shape
+    time_ms = np.arange(n_samples) * (1000 / fs)
+    qrs_indices = analysis.detect_peaks_neurokit2(lead, fs)
+
+    # (nombre, función, muestras procesadas)
+    stages = [
+        ("load_wfdb", lambda: wfdb.rdrecord(path), n_samples * n_leads),
+        ("load_mapped", lambda: record_reader.open_record(path).p_signal, n_samples * n_leads),
+        ("filter_ecg", lambda: data_preprocessing.filter_ecg(lead, fs), n_samples),
+        ("preprocess", lambda: data_preprocessing.preprocess(signal, fs), n_samples * n_leads),
+        ("detect_neurokit2", lambda: analysis.detect_peaks_neurokit2(lead, fs), n_samples),
+        ("detect_batch", lambda: analysis.detect_peaks_batch(signal, fs), n_samples * n_leads),
+        ("detect_consensus", lambda: analysis.detect_peaks_consensus(signal, fs), n_samples * n_leads),
+        ("heart_rate", lambda: analysis.calculate_heart_rate(qrs_indices, fs), n_samples),
+        ("plot_signal", lambda: visualization.plot_ecg_signal_single_lead(lead, time_ms, fs, "II"), n_samples),
+        ("plot_qrs", lambda: visualization.plot_qrs_detection_single_lead(lead, time_ms, qrs_indices, fs, "II"),
+         n_samples),
+    ]
+
+    results = {}
+    for name, func, samples in stages:
+        elapsed = best_time(func, repeat)
+        results[name] = {
+            "time_s": elapsed,
+            "samples_per_s": samples / elapsed if elapsed > 0 else None,
+            "peak_mib": peak_memory(func) / 2**20,
+        }
+    return {"n_samples": n_samples, "n_leads": n_leads, "fs": fs, "stages": results}
+
+
+# Diferencias absolutas mínimas para considerar una regresión: por debajo, el ruido de
+# medición de las etapas muy rápidas domina sobre la razón entre tiempos
+MIN_DELTA = {"time_s": 1e-3, "peak_mib": 0.5}
+
+
+def compare(baseline, current, tolerance):
+    """
+    Compara dos ejecuciones etapa a etapa e imprime las diferencias.
+
+    Returns:
+        list: Regresiones encontradas, como tuplas (registro, etapa, métrica, razón).
+    """
+    regressions = []
+    if current.get("imports") and baseline.get("imports"):
+        print("Importaciones")
+        for module, result in current["imports"].items():
+            old = baseline["imports"].get(module)
+            if old is None:
+                continue
+            flags = []
+            ratio = result["time_s"] / old["time_s"] if old["time_s"] else 1.0
+            if ratio > 1 + tolerance and result["time_s"] - old["time_s"] > MIN_DELTA["time_s"]:
+                flags.append("time_s")
+                regressions.append(("imports", module, "time_s", ratio))
+            new_heavy = sorted(set(result["heavy"]) - set(old["heavy"]))
+            if new_heavy:
+                flags.append(f"carga {', '.join(new_heavy)}")
+                regressions.append(("imports", module, "heavy", new_heavy))
+            mark = f"  <-- REGRESIÓN ({'; '.join(flags)})" if flags else ""
+            print(f"  {module:<26} tiempo x{ratio:5.2f} ({old['time_s'] * 1000:9.2f} → "
+                  f"{result['time_s'] * 1000:9.2f} ms){mark}")
+
+    for case, result in current["results"].items():
+        reference = baseline["results"].get(case)
+        if reference is None:
+            print(f"{case}: sin línea base")
+            continue
+        print(case)
+        for stage, metrics in result["stages"].items():
+            old = reference["stages"].get(stage)
+            if old is None:
+                print(f"  {stage:<18} sin línea base")
+                continue
+            flags = []
+            for metric in ("time_s", "peak_mib"):
+                ratio = metrics[metric] / old[metric] if old[metric] else 1.0
+                if ratio > 1 + tolerance and metrics[metric] - old[metric] > MIN_DELTA[metric]:
+                    flags.append(metric)
+                    regressions.append((case, stage, metric, ratio))
+            time_ratio = metrics["time_s"] / old["time_s"] if old["time_s"] else 1.0
+            mem_ratio = metrics["peak_mib"] / old["peak_mib"] if old["peak_mib"] else 1.0
+            mark = f"  <-- REGRESIÓN ({', '.join(flags)})" if flags else ""
+            print(f"  {stage:<18} tiempo x{time_ratio:5.2f} ({old['time_s'] * 1000:9.2f} → "
+                  f"{metrics['time_s'] * 1000:9.2f} ms)   memoria x{mem_ratio:5.2f}{mark}")
+    return regressions
+
+
+def print_results(run):
+    if run.get("imports"):
+        print("Importaciones (intérprete nuevo)")
+        for module, result in run["imports"].items():
+            print(f"  {module:<26} {result['time_s'] * 1000:9.1f} ms   "
+                  f"dependencias pesadas: {', '.join(result['heavy']) or '-'}")
+    for case, result in run["results"].items():
+        print(f"{case}: {result['n_samples']:,d} muestras x {result['n_leads']} derivación(es) a {result['fs']} Hz")
+        for stage, metrics in result["stages"].items():
+            print(f"  {stage:<18} {metrics['time_s'] * 1000:10.2f} ms   "
+                  f"{metrics['samples_per_s'] / 1e6:9.2f} M muestras/s   pico {metrics['peak_mib']:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 300], help="Duraciones simuladas, en segundos")
+    parser.add_argument("--leads", type=int, nargs="+", default=[12], help="Número de derivaciones simuladas")
+    parser.add_argument("--fs", type=int, nargs="+", default=[500], help="Frecuencias de muestreo simuladas, en Hz")
+    parser.add_argument("--no-bundled", action="store_true", help="No incluir el registro JS00001")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por etapa")
+    parser.add_argument("--no-imports", action="store_true", help="No medir el tiempo de importación")
+    parser.add_argument("--output", help="Guarda los resultados en este archivo JSON (línea base)")
+    parser.add_argument("--baseline", help="Compara los resultados con esta línea base JSON")
+    parser.add_argument("--diff", nargs=2, metavar=("ANTES", "DESPUES"), help="Compara dos archivos JSON sin ejecutar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento relativo tolerado (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    if args.diff:
+        with open(args.diff[0], encoding="utf-8") as f:
+            before = json.load(f)
+        with open(args.diff[1], encoding="utf-8") as f:
+            after = json.load(f)
+        sys.exit(1 if compare(before, after, args.tolerance) else 0)
+
+    run = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "repeat": args.repeat,
+        },
+        "imports": {} if args.no_imports else measure_import_times(repeat=args.repeat),
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        records = [] if args.no_bundled else [("JS00001", os.path.join(DATA_DIR, "JS00001"))]
+        for seconds in args.seconds:
+            for n_leads in args.leads:
+                for fs in args.fs:
+                    records.append((f"synthetic_{seconds:g}s_{n_leads}leads_{fs}hz",
+                                    synthesize_record(tmp, seconds, n_leads, fs)))
+        for case, path in records:
+            run["results"][case] = bench_record(path, args.repeat)
+    print_results(run)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nComparación con {args.baseline} (tolerancia {args.tolerance:.0%}):")
+        regressions = compare(baseline, run, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regresión(es) detectada(s).")
+            sys.exit(1)
+        print("Sin regresiones.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark y validación del lector con mapeo en memoria (``src.record_reader``)
+frente a ``wfdb.rdrecord``.
+
+Comprueba muestra a muestra que las señales coinciden con wfdb y compara el tiempo
+y el pico de memoria de cargar el registro completo frente a extraer una sola
+derivación en una ventana corta.
+
+Uso:
+    python benchmarks/bench_record_reader.py [--record data/raw_data/JS00001] [--repeat 50]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import wfdb
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import record_reader  # noqa: E402
+
+
+def measure(func, repeat):
+    """Devuelve el mejor tiempo (s) y el pico de memoria asignada (bytes) de ``func``."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def validate(record_name):
+    """Compara el lector con wfdb muestra a muestra. Devuelve el error físico máximo (mV)."""
+    digital = wfdb.rdrecord(record_name, physical=False).d_signal
+    physical = wfdb.rdrecord(record_name).p_signal
+    mapped = record_reader.open_record(record_name)
+
+    if not np.array_equal(np.asarray(mapped.digital), digital):
+        raise AssertionError("Las muestras digitales no coinciden con wfdb.")
+    if not np.array_equal(mapped.window(dtype=np.float64), physical):
+        raise AssertionError("Las muestras físicas (float64) no coinciden con wfdb.")
+    return float(np.max(np.abs(mapped.window() - physical)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", default="data/raw_data/JS00001", help="Ruta del registro WFDB sin extensión")
+    parser.add_argument("--repeat", type=int, default=50, help="Número de repeticiones por medición")
+    parser.add_argument("--window-s", type=float, default=2.0, help="Duración de la ventana corta, en segundos")
+    args = parser.parse_args()
+
+    max_error = validate(args.record)
+    print(f"Validación frente a wfdb: OK (error máximo en float32: {max_error:.2e} mV)")
+
+    fs = record_reader.open_record(args.record).fs
+    stop = int(args.window_s * fs)
+
+    cases = [
+        ("wfdb.rdrecord (float64, completo)", lambda: wfdb.rdrecord(args.record).p_signal),
+        ("record_reader (float32, completo)", lambda: record_reader.open_record(args.record).p_signal),
+        (f"record_reader (1 derivación, {args.window_s:g} s)",
+         lambda: record_reader.open_record(args.record).lead(1, 0, stop)),
+    ]
+    for name, func in cases:
+        seconds, peak = measure(func, args.repeat)
+        print(f"{name:<40} {seconds * 1000:8.3f} ms   pico de memoria: {peak / 1024:9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
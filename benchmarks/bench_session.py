@@ -0,0 +1,86 @@
+"""
+Benchmark de una sesión con muchos registros (``src.session``): análisis secuencial,
+uno por carga de página, frente al pool compartido de hilos o de procesos.
+
+Se crean ``--records`` copias del registro de ejemplo ``JS00001`` con nombres
+distintos en un directorio temporal y se mide el tiempo hasta tener la tabla resumen
+completa.
+
+Uso:
+    python benchmarks/bench_session.py [--records 50] [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import session, utils  # noqa: E402
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "raw_data"))
+
+
+def make_records(directory, n):
+    """Copia JS00001 ``n`` veces con nombres distintos; devuelve nombre -> ruta sin extensión."""
+    with open(os.path.join(DATA_DIR, "JS00001.hea"), encoding="utf-8") as f:
+        header = f.read()
+    paths = {}
+    for i in range(n):
+        name = f"R{i:05d}"
+        with open(os.path.join(directory, f"{name}.hea"), "w", encoding="utf-8") as f:
+            f.write(header.replace("JS00001", name))
+        shutil.copyfile(os.path.join(DATA_DIR, "JS00001.mat"), os.path.join(directory, f"{name}.mat"))
+        paths[name] = os.path.join(directory, name)
+    return paths
+
+
+def run_session(paths, executor):
+    """Encola todos los registros en una sesión nueva y espera a la tabla completa."""
+    analysis = session.SessionAnalysis(executor=executor, cache=utils.ResultCache(max_entries=len(paths)))
+    start = time.perf_counter()
+    futures = [analysis.submit(name, path, record_hash=name) for name, path in paths.items()]
+    wait(futures)
+    elapsed = time.perf_counter() - start
+    rows = analysis.summary()
+    assert all(row["status"] == "ok" for row in rows), rows
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=50, help="Número de registros de la sesión")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Tamaño de los pools")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_records(tmp, args.records)
+        session.summarize_record(next(iter(paths.values())))  # calentamiento (importaciones, cachés de filtros)
+
+        start = time.perf_counter()
+        for path in paths.values():
+            session.summarize_record(path)
+        sequential = time.perf_counter() - start
+        print(f"{args.records} registros, {args.workers} trabajador(es)")
+        print(f"  Secuencial:          {sequential:7.2f} s   {args.records / sequential:7.1f} registros/s")
+
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            elapsed = run_session(paths, executor)
+        print(f"  Pool de hilos:       {elapsed:7.2f} s   {args.records / elapsed:7.1f} registros/s   "
+              f"x{sequential / elapsed:.1f}")
+
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            # Arranque de los procesos fuera de la medición (en la aplicación el pool ya está creado)
+            wait([executor.submit(session.summarize_record, next(iter(paths.values())))
+                  for _ in range(args.workers)])
+            elapsed = run_session(paths, executor)
+        print(f"  Pool de procesos:    {elapsed:7.2f} s   {args.records / elapsed:7.1f} registros/s   "
+              f"x{sequential / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
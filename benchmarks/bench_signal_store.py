@@ -0,0 +1,147 @@
+"""
+Benchmark del almacén columnar (``src.signal_store``) frente a los archivos WFDB sueltos.
+
+Se genera un conjunto de ``--records`` registros (copias de ``data/raw_data/JS00001`` con
+edad, sexo y diagnósticos aleatorios en la cabecera) y se mide:
+
+- La conversión al almacén (registros/s) y la relación de compresión, con zlib y sin
+  comprimir (``codec="none"``).
+- Una consulta de cohorte (diagnóstico + edad): releyendo todas las cabeceras .hea frente
+  a la tabla de metadatos del almacén.
+- La lectura masiva de las señales de la cohorte y de todo el conjunto (MiB/s de muestras
+  int16): ``record_reader.read_record`` registro a registro frente a ``iter_records`` de
+  los dos almacenes. Con los archivos en la caché del sistema operativo, la lectura con
+  zlib está limitada por la descompresión; desde un disco o una red lentos compensa leer
+  la mitad de bytes.
+
+Además se comprueba que las muestras leídas del almacén son idénticas a las originales.
+
+Uso:
+    python benchmarks/bench_signal_store.py [--records 2000] [--workers 4]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import record_reader, signal_store, utils  # noqa: E402
+from src.batch import find_records  # noqa: E402
+
+SOURCE = os.path.join(os.path.dirname(__file__), "..", "data", "raw_data", "JS00001")
+DX_CODES = ["164889003", "59118001", "164934002", "426783006", "270492004", "427084000", "426177001"]
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_dataset(path, n_records, rng):
+    """Copias de JS00001 en subdirectorios de 1000 registros, con metadatos aleatorios."""
+    with open(f"{SOURCE}.hea", encoding="utf-8") as f:
+        lines = [line for line in f.read().splitlines() if not line.startswith("#")]
+    for i in range(n_records):
+        name = f"JS{i:05d}"
+        directory = os.path.join(path, f"g{i // 1000}")
+        os.makedirs(directory, exist_ok=True)
+        dx = rng.choice(DX_CODES, rng.integers(1, 4), replace=False)
+        header = [lines[0].replace("JS00001", name)] + [line.replace("JS00001", name) for line in lines[1:]]
+        header += [f"#Age: {rng.integers(18, 95)}", f"#Sex: {rng.choice(['Male', 'Female'])}",
+                   f"#Dx: {','.join(dx)}", "#Rx: Unknown", "#Hx: Unknown", "#Sx: Unknown"]
+        with open(os.path.join(directory, f"{name}.hea"), "w", encoding="utf-8") as f:
+            f.write("\n".join(header) + "\n")
+        shutil.copyfile(f"{SOURCE}.mat", os.path.join(directory, f"{name}.mat"))
+
+
+def query_headers(input_dir, dx, age_min):
+    """Cohorte releyendo cada cabecera .hea (lo que haría un script sin almacén)."""
+    selected = []
+    for record in find_records(input_dir):
+        with open(os.path.join(input_dir, f"{record}.hea"), encoding="utf-8") as f:
+            header = record_reader.parse_header(f.read())
+        metadata = utils.parse_header_comments(header["comments"])
+        if dx in metadata["dx"] and metadata["age"] is not None and metadata["age"] >= age_min:
+            selected.append(record)
+    return selected
+
+
+def read_files(input_dir, records):
+    total = 0
+    for record in records:
+        total += int(record_reader.read_record(os.path.join(input_dir, record)).digital.sum(dtype=np.int64))
+    return total
+
+
+def read_store(store, ids):
+    total = 0
+    for rec in store.iter_records(ids):
+        total += int(rec.digital.sum(dtype=np.int64))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=2000, help="Número de registros del conjunto")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para la conversión")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por medición")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_dir = os.path.join(tmp, "raw")
+        make_dataset(raw_dir, args.records, rng)
+
+        stores = {}
+        for codec in signal_store.CODECS:
+            path = os.path.join(tmp, f"store_{codec}")
+            summary = signal_store.ingest(raw_dir, path, workers=args.workers, codec=codec)
+            print(f"Conversión ({codec}): {summary['records']} registros en {summary['seconds']:.1f} s "
+                  f"({summary['records'] / summary['seconds']:.0f} registros/s), "
+                  f"{summary['input_bytes'] / 2**20:.0f} MiB -> {summary['output_bytes'] / 2**20:.1f} MiB "
+                  f"(x{summary['input_bytes'] / summary['output_bytes']:.1f})")
+            stores[codec] = store = signal_store.SignalStore(path)
+            for record in (store.names[0], store.names[-1]):
+                original = record_reader.read_record(os.path.join(raw_dir, record))
+                stored = store.record(record)
+                assert np.array_equal(original.digital, stored.digital), record
+                assert np.array_equal(original.p_signal, stored.p_signal), record
+                assert np.array_equal(original.digital[1234:4321], store.record(record, 1234, 4321).digital), record
+        store, store_dir = stores["zlib"], os.path.join(tmp, "store_zlib")
+
+        dx, age_min = DX_CODES[0], 80
+        expected = query_headers(raw_dir, dx, age_min)
+        ids = store.query(dx=dx, age_min=age_min)
+        assert store.names[ids].tolist() == expected
+        t_headers = best_time(lambda: query_headers(raw_dir, dx, age_min), args.repeat)
+        t_query = best_time(lambda: store.query(dx=dx, age_min=age_min), args.repeat)
+        t_open = best_time(lambda: signal_store.SignalStore(store_dir), args.repeat)
+        print(f"\nCohorte Dx={dx} y edad >= {age_min}: {len(ids)} de {len(store)} registros")
+        print(f"  Releyendo las cabeceras .hea:   {t_headers * 1000:9.1f} ms")
+        print(f"  Almacén (consulta):             {t_query * 1000:9.3f} ms  (x{t_headers / t_query:.0f}); "
+              f"abrir el índice: {t_open * 1000:.1f} ms")
+
+        for name, subset in (("cohorte", ids), ("todo el conjunto", np.arange(len(store)))):
+            records = store.names[subset].tolist()
+            total = read_files(raw_dir, records)
+            mib = store.index["n_samples"][subset] @ store.index["n_sig"][subset].astype(np.int64) * 2 / 2**20
+            t_files = best_time(lambda: read_files(raw_dir, records), args.repeat)
+            print(f"\nLectura masiva de {name} ({len(records)} registros, {mib:.0f} MiB de muestras):")
+            print(f"  record_reader por archivo:      {t_files * 1000:9.1f} ms  {mib / t_files:8.0f} MiB/s")
+            for codec, codec_store in stores.items():
+                assert read_store(codec_store, subset) == total
+                t_store = best_time(lambda: read_store(codec_store, subset), args.repeat)
+                print(f"  {f'iter_records ({codec}):':<32}{t_store * 1000:9.1f} ms  {mib / t_store:8.0f} MiB/s  "
+                      f"(x{t_files / t_store:.1f})")
+
+if __name__ == "__main__":
+    main()
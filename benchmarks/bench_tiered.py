@@ -0,0 +1,136 @@
+"""
+Benchmark de la detección de picos R por niveles (``analysis.detect_peaks_tiered``).
+
+La vía rápida (``detect_peaks_fast``, Pan-Tompkins vectorizado sobre todas las
+derivaciones) se valida frente a la vía lenta a la que escala (NeuroKit2 por derivación
+sobre la señal limpiada con ``nk.ecg_clean``, con ``detect_peaks_chunked``):
+
+- Registro de ejemplo: por derivación, confianza, si se escaló a NeuroKit2, nivel de los
+  picos finales y sensibilidad / VPP / error medio de la vía rápida y de la detección por
+  niveles frente a NeuroKit2.
+- Registros simulados de 12 derivaciones (un ECG de ``nk.ecg_simulate`` con una ganancia
+  distinta por derivación) a varias frecuencias cardíacas, con ruido blanco y con
+  artefactos (deriva de la línea base y ráfagas de ruido) en algunas derivaciones. La
+  referencia son los picos de NeuroKit2 sobre la señal limpia; se puntúan la vía rápida,
+  la detección por niveles y NeuroKit2 sobre las derivaciones ruidosas.
+
+Por último se mide el tiempo de NeuroKit2 por derivación, de la vía rápida sola y de la
+detección por niveles sobre el registro de ejemplo repetido hasta ``--seconds``.
+
+Uso:
+    python benchmarks/bench_tiered.py [--record data/raw_data/JS00001] [--seconds 10 60 300]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import neurokit2 as nk
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import analysis, record_reader  # noqa: E402
+
+warnings.filterwarnings("ignore")
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def neurokit_per_lead(ecg_data, fs):
+    return [analysis.detect_peaks_chunked(ecg_data[:, lead], fs, detector=analysis._detect_peaks_neurokit2_clean)
+            for lead in range(ecg_data.shape[1])]
+
+
+def add_artifacts(ecg_data, fs, n_leads, rng):
+    """Deriva de la línea base (0.3 Hz, 1 mV) y una ráfaga de ruido de 2 s en ``n_leads`` derivaciones."""
+    noisy = ecg_data.copy()
+    t = np.arange(len(noisy)) / fs
+    for lead in rng.choice(ecg_data.shape[1], n_leads, replace=False):
+        noisy[:, lead] += np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, 2 * np.pi))
+        start = rng.integers(0, len(noisy) - 2 * fs)
+        noisy[start:start + 2 * fs, lead] += rng.normal(0, 1.0, 2 * fs)
+    return noisy
+
+
+def summarize(per_lead_peaks, reference, fs):
+    """Sensibilidad, VPP y error medio (ms) medios entre derivaciones frente a los picos ``reference``."""
+    results = [analysis.compare_peaks(peaks, reference, fs) for peaks in per_lead_peaks]
+    errors = [r["mean_error_ms"] for r in results if r["mean_error_ms"] is not None]
+    return (np.mean([r["sensitivity"] for r in results]), np.mean([r["ppv"] or 0.0 for r in results]),
+            np.mean(errors) if errors else float("nan"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", default="data/raw_data/JS00001", help="Registro WFDB sin extensión")
+    parser.add_argument("--sim-seconds", type=int, default=30, help="Duración de los registros simulados, en s")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60, 300],
+                        help="Duraciones para las mediciones de tiempo, en s")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por medición")
+    args = parser.parse_args()
+
+    record = record_reader.read_record(args.record)
+    ecg_data, fs = record.window(dtype=np.float64), record.fs
+
+    slow = neurokit_per_lead(ecg_data, fs)
+    fast = analysis.detect_peaks_fast(ecg_data, fs)["per_lead_peaks"]
+    tiered = analysis.detect_peaks_tiered(ecg_data, fs)
+    print(f"{os.path.basename(args.record)}: nivel del registro '{tiered['record_tier']}'; "
+          f"sensibilidad / VPP / error medio frente a NeuroKit2")
+    print(f"  {'deriv.':<7}{'confianza':>10}{'escal.':>7}{'nivel':>10}{'vía rápida':>24}{'por niveles':>24}")
+    for lead, name in enumerate(record.sig_name):
+        cells = []
+        for peaks in (fast[lead], tiered["per_lead_peaks"][lead]):
+            r = analysis.compare_peaks(peaks, slow[lead], fs)
+            cells.append(f"{r['sensitivity']:5.2f} / {r['ppv']:4.2f} / {r['mean_error_ms'] or 0:5.1f} ms")
+        escalated = "sí" if tiered["escalated"][lead] else "no"
+        print(f"  {name:<7}{tiered['confidence'][lead]:10.2f}{escalated:>7}{tiered['tier'][lead]:>10}"
+              f"{cells[0]:>24}{cells[1]:>24}")
+
+    print(f"\nRegistros simulados de {args.sim_seconds} s y 12 derivaciones (media entre derivaciones)")
+    print(f"  {'escenario':<30}{'nivel':>8}{'escal.':>7}{'vía rápida':>24}{'por niveles':>24}{'NeuroKit2':>24}")
+    rng = np.random.default_rng(0)
+    gains = rng.uniform(0.3, 1.5, 12)
+    for heart_rate in (60, 100, 150):
+        ecg = nk.ecg_simulate(duration=args.sim_seconds, sampling_rate=fs, heart_rate=heart_rate,
+                              random_state=heart_rate)
+        reference = analysis.detect_peaks_neurokit2(ecg, fs)
+        clean = ecg[:, np.newaxis] * gains
+        scenarios = {
+            "limpio": clean,
+            "ruido 0.1 mV": clean + rng.normal(0, 0.1, clean.shape),
+            "ruido 0.3 mV": clean + rng.normal(0, 0.3, clean.shape),
+            "artefactos (3 deriv.)": add_artifacts(clean, fs, 3, rng),
+        }
+        for name, signal in scenarios.items():
+            tiered = analysis.detect_peaks_tiered(signal, fs)
+            results = (analysis.detect_peaks_fast(signal, fs)["per_lead_peaks"], tiered["per_lead_peaks"],
+                       neurokit_per_lead(signal, fs))
+            cells = [f"{s:5.2f} / {p:4.2f} / {e:5.1f} ms" for s, p, e in
+                     (summarize(peaks, reference, fs) for peaks in results)]
+            print(f"  {f'{heart_rate} lpm, {name}':<30}{tiered['record_tier']:>8}"
+                  f"{tiered['escalated'].sum():>7}{cells[0]:>24}{cells[1]:>24}{cells[2]:>24}")
+
+    print(f"\nTiempo (mejor de {args.repeat}, ms), {ecg_data.shape[1]} derivaciones a {fs} Hz:")
+    print(f"  {'duración':>9}{'NeuroKit2':>12}{'vía rápida':>12}{'por niveles':>13}{'aceleración':>13}")
+    for seconds in args.seconds:
+        reps = int(np.ceil(seconds * fs / len(ecg_data)))
+        signal = np.tile(ecg_data, (reps, 1))[:int(seconds * fs)]
+        t_slow = best_time(lambda: neurokit_per_lead(signal, fs), args.repeat)
+        t_fast = best_time(lambda: analysis.detect_peaks_fast(signal, fs), args.repeat)
+        t_tiered = best_time(lambda: analysis.detect_peaks_tiered(signal, fs), args.repeat)
+        print(f"  {seconds:>8g}s{t_slow * 1000:12.1f}{t_fast * 1000:12.1f}{t_tiered * 1000:13.1f}"
+              f"{t_slow / t_tiered:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
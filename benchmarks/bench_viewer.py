@@ -0,0 +1,101 @@
+"""
+Benchmark del visor interactivo (``src.viewer``): tiempo en el servidor y tamaño de los
+datos enviados al navegador por interacción, en función de la longitud del registro.
+
+Para cada duración se simula un registro de ``--leads`` derivaciones (en un memmap
+temporal, como un registro Holter abierto con ``record_reader``) y se mide:
+
+- La construcción de la pirámide min/max (una vez por registro).
+- Para vistas de todo el registro, 1 h, 1 min y 10 s: el tiempo de servir la ventana
+  (con los picos R), el de construir y serializar la figura de Plotly y el tamaño del
+  JSON, que debe ser aproximadamente constante sea cual sea la duración.
+
+Uso:
+    python benchmarks/bench_viewer.py [--fs 500] [--leads 12] [--hours 0.003 1 24]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import viewer  # noqa: E402
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def simulate(path, n, n_leads, fs, rng):
+    """Escribe en ``path`` una señal sintética (un "QRS" cada 0.8 s sobre ruido) y la abre como memmap."""
+    signal = np.memmap(path, dtype=np.float32, mode="w+", shape=(n, n_leads))
+    block = 1 << 20
+    for start in range(0, n, block):
+        stop = min(n, start + block)
+        signal[start:stop] = 0.05 * rng.standard_normal((stop - start, n_leads), dtype=np.float32)
+    qrs_indices = np.arange(fs // 2, n, int(0.8 * fs))
+    signal[qrs_indices] += 0.9
+    signal.flush()
+    return np.memmap(path, dtype=np.float32, mode="r", shape=(n, n_leads)), qrs_indices
+
+
+def interaction(provider, qrs_indices, x_range, max_points):
+    """Lo que hace el visor en cada interacción: ventana con margen, picos R y figura serializada."""
+    span = x_range[1] - x_range[0]
+    window = provider.window(x_range[0] - span / 2, x_range[1] + span / 2, max_points=2 * max_points)
+    peaks = [provider.peaks(qrs_indices, *window["x_range"], lead, max_points=2 * max_points)
+             for lead in range(provider.signal.shape[1])]
+    return viewer.ecg_figure(window, x_range, peaks=peaks).to_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fs", type=int, default=500, help="Frecuencia de muestreo en Hz")
+    parser.add_argument("--leads", type=int, default=12, help="Número de derivaciones")
+    parser.add_argument("--hours", type=float, nargs="+", default=[10 / 3600, 1, 24], help="Duraciones a probar, en horas")
+    parser.add_argument("--max-points", type=int, default=1200, help="Intervalos min/max por derivación en la vista")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por caso")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for hours in args.hours:
+            n = int(hours * 3600 * args.fs)
+            signal, qrs_indices = simulate(os.path.join(tmp, f"{hours}.f32"), n, args.leads, args.fs, rng)
+            provider = viewer.WindowedSignal(signal, args.fs)
+            # Ventanas enteramente fuera del registro: trazas vacías, sin errores
+            for outside in ((-2000, -1000), (provider.duration_ms + 1000, provider.duration_ms + 2000)):
+                assert all(len(t) == 0 for _, t, _ in provider.window(*outside)["traces"]), outside
+
+            start = time.perf_counter()
+            interaction(provider, qrs_indices, (0, provider.duration_ms), args.max_points)
+            first = time.perf_counter() - start
+            print(f"{hours:8.3f} h ({n:>11,d} muestras x {args.leads}): primera vista (incluye la pirámide) "
+                  f"{first * 1000:8.1f} ms")
+
+            views = {"completo": provider.duration_ms, "1 h": 3.6e6, "1 min": 6e4, "10 s": 1e4}
+            for name, span in views.items():
+                if span > provider.duration_ms:
+                    continue
+                x_min = (provider.duration_ms - span) / 2
+                x_range = (x_min, x_min + span)
+                window_time = best_time(lambda: provider.window(x_range[0] - span / 2, x_range[1] + span / 2,
+                                                                max_points=2 * args.max_points), args.repeat)
+                total = best_time(lambda: interaction(provider, qrs_indices, x_range, args.max_points), args.repeat)
+                payload = len(interaction(provider, qrs_indices, x_range, args.max_points))
+                print(f"    vista {name:>8}: ventana {window_time * 1000:7.1f} ms | ventana + figura + JSON "
+                      f"{total * 1000:7.1f} ms | {payload / 1024:7.0f} KiB")
+            del provider, signal
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark del render de ``visualization.plot_ecg_signal_single_lead`` y
+``visualization.plot_qrs_detection_single_lead`` en función de la longitud del registro.
+
+Con la decimación mín/máx al ancho en píxeles y la cuadrícula con nivel de detalle,
+el tiempo de render debe ser aproximadamente constante, desde 10 s hasta 24 h.
+
+Uso:
+    python benchmarks/bench_visualization.py [--fs 500] [--hours 0.003 1 24]
+"""
+import argparse
+import os
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np  # noqa: E402
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import visualization  # noqa: E402
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fs", type=int, default=500, help="Frecuencia de muestreo en Hz")
+    parser.add_argument("--hours", type=float, nargs="+", default=[10 / 3600, 1, 24], help="Duraciones a probar, en horas")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por caso")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for hours in args.hours:
+        n = int(hours * 3600 * args.fs)
+        # Señal sintética: un "QRS" cada 0.8 s sobre ruido, en float32 como la devuelve el lector
+        signal = (0.05 * rng.standard_normal(n)).astype(np.float32)
+        qrs_indices = np.arange(args.fs // 2, n, int(0.8 * args.fs))
+        signal[qrs_indices] += 0.9
+        time_ms = np.arange(n) * (1000 / args.fs)
+
+        full = best_time(lambda: visualization.plot_ecg_signal_single_lead(signal, time_ms, args.fs, "II"), args.repeat)
+        qrs = best_time(lambda: visualization.plot_qrs_detection_single_lead(
+            signal, time_ms, qrs_indices, args.fs, "II"), args.repeat)
+        window = best_time(lambda: visualization.plot_qrs_detection_single_lead(
+            signal, time_ms, qrs_indices, args.fs, "II", x_range=(1000, 11000)), args.repeat)
+        print(f"{hours:8.3f} h ({n:>11,d} muestras): señal completa {full * 1000:7.1f} ms | "
+              f"picos R completo {qrs * 1000:7.1f} ms | ventana 10 s {window * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Genera el modelo de prueba ``tiny_beat_classifier.npz`` usado por ``src.model``.
+
+Es un perceptrón multicapa con pesos aleatorios deterministas (semilla fija): no tiene
+valor clínico y solo sirve para ejercitar la segmentación, la inferencia por lotes y
+los benchmarks sin conexión ni dependencias de TensorFlow/ONNX.
+
+Uso:
+    python models/build_test_model.py
+"""
+import json
+import os
+
+import numpy as np
+
+METADATA = {
+    "fs": 500,
+    "pre_s": 0.25,
+    "post_s": 0.40,
+    "n_leads": 1,
+    # Códigos SNOMED CT como en el campo #Dx de las cabeceras
+    "labels": ["426783006", "164884008", "164889003"],
+    "label_names": ["Ritmo sinusal", "Extrasístole ventricular", "Fibrilación auricular"],
+}
+HIDDEN = 32
+
+
+def main():
+    rng = np.random.default_rng(20240426)
+    window = int(round(METADATA["pre_s"] * METADATA["fs"])) + int(round(METADATA["post_s"] * METADATA["fs"]))
+    n_inputs = METADATA["n_leads"] * window
+    weights = {
+        "W0": (rng.standard_normal((n_inputs, HIDDEN)) / np.sqrt(n_inputs)).astype(np.float32),
+        "b0": np.zeros(HIDDEN, dtype=np.float32),
+        "W1": (rng.standard_normal((HIDDEN, len(METADATA["labels"]))) / np.sqrt(HIDDEN)).astype(np.float32),
+        "b1": np.zeros(len(METADATA["labels"]), dtype=np.float32),
+    }
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiny_beat_classifier.npz")
+    np.savez_compressed(path, metadata=np.array(json.dumps(METADATA, ensure_ascii=False)), **weights)
+    print(f"Modelo de prueba guardado en {path}")
+
+
+if __name__ == "__main__":
+    main()
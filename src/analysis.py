@@ -1,7 +1,12 @@
-import neurokit2 as nk
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
 import numpy as np
-import streamlit as st 
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src import instrumentation
+from src.data_preprocessing import design_sos
 
+@instrumentation.timed(samples=instrumentation.n_samples)
 def detect_peaks_neurokit2(signal, fs):
     """
     Detecta los picos R en una señal ECG usando NeuroKit2.
@@ -18,6 +23,9 @@ def detect_peaks_neurokit2(signal, fs):
     if signal is None or len(signal) == 0:
         return np.array([])
 
+    # Importación diferida: NeuroKit2 tarda segundos en importarse y muchos caminos no lo usan
+    import neurokit2 as nk
+
     try:
         # Procesar la señal ECG para obtener los picos R
         _, info = nk.ecg_peaks(signal, sampling_rate=fs)
@@ -29,6 +37,8 @@ def detect_peaks_neurokit2(signal, fs):
         return qrs_indices
 
     except Exception as e:
+        import streamlit as st
+
         st.error(f"Error interno en NeuroKit2 durante la detección de picos R: {e}")
         st.exception(e) # Muestra el traceback para depuración
         return np.array([]) # Retorna un array vacío en caso de error
@@ -44,7 +54,9 @@ def calculate_heart_rate(qrs_indices, fs):
         fs (int): Frecuencia de muestreo de la señal en Hz.
 
     Returns:
-        float: Frecuencia cardíaca promedio en bpm. Retorna None si no se puede calcular.
+        float: Frecuencia cardíaca promedio en bpm. Retorna None si no se puede calcular
+               (menos de dos picos, o picos repetidos o desordenados: RR medio <= 0). El
+               aviso al usuario lo muestra quien llama (la aplicación).
         np.ndarray: Intervalos RR en milisegundos. Retorna un array vacío si no se puede calcular.
     """
     if qrs_indices is None or len(qrs_indices) < 2:
@@ -66,5 +78,714 @@ def calculate_heart_rate(qrs_indices, fs):
         heart_rate_bpm = 60 / mean_rr_sec
         return heart_rate_bpm, rr_intervals_ms
     else:
-        st.warning("El intervalo RR promedio es cero o negativo, no se puede calcular una frecuencia cardíaca válida.")
-        return None, rr_intervals_ms
\ No newline at end of file
+        # RR medio cero o negativo: sin frecuencia cardíaca válida (sin llamadas a la interfaz aquí)
+        return None, rr_intervals_ms
+
+
+def _qrs_energy(ecg_data, fs):
+    """
+    Calcula la señal filtrada (5-15 Hz) y la energía QRS estilo Pan-Tompkins
+    para todas las derivaciones a la vez.
+
+    Args:
+        ecg_data (np.ndarray): Array NumPy 2-D (muestras x derivaciones).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+
+    Returns:
+        np.ndarray: Señal filtrada pasa banda (muestras x derivaciones).
+        np.ndarray: Energía QRS integrada (muestras x derivaciones).
+    """
+    # Importación diferida: scipy tarda en importarse y listar o leer registros no lo usa
+    from scipy.ndimage import uniform_filter1d
+    from scipy.signal import sosfiltfilt
+
+    # Filtro pasa banda 5-15 Hz en forma SOS, de fase cero y a lo largo del eje de muestras
+    sos = design_sos('bandpass', (5.0, 15.0), float(fs), 2).copy()  # escribible para scipy
+    filtered = sosfiltfilt(sos, ecg_data, axis=0)
+
+    # Derivada, cuadrado e integración en ventana móvil de 150 ms (centrada)
+    derivative = np.gradient(filtered, axis=0)
+    window = max(1, int(round(0.150 * fs)))
+    energy = uniform_filter1d(derivative ** 2, size=window, axis=0, mode='nearest')
+
+    return filtered, energy
+
+
+# Calidad mínima (``lead_quality``) para que una derivación participe en el consenso
+MIN_LEAD_QUALITY = 0.2
+
+
+def lead_quality(ecg_data, fs, filtered=None, energy=None):
+    """
+    Índice de calidad (0-1) de cada derivación, calculado para todas a la vez.
+
+    Combina dos medidas sobre la banda del QRS (5-15 Hz): la prominencia de la energía
+    QRS (percentil 99 frente a la mediana: los latidos destacan sobre el fondo) y la
+    curtosis de la señal filtrada (un ECG limpio es muy apuntado; el ruido es gaussiano).
+    Las derivaciones planas o sin señal valen 0.
+
+    Args:
+        ecg_data (np.ndarray): Array NumPy 2-D (muestras x derivaciones).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        filtered (np.ndarray): Señal filtrada de ``_qrs_energy``, si ya se ha calculado.
+        energy (np.ndarray): Energía QRS de ``_qrs_energy``, si ya se ha calculado.
+
+    Returns:
+        np.ndarray: Calidad de cada derivación.
+    """
+    if filtered is None or energy is None:
+        ecg_data = np.nan_to_num(np.asarray(ecg_data, dtype=float))
+        if ecg_data.ndim == 1:
+            ecg_data = ecg_data[:, np.newaxis]
+        filtered, energy = _qrs_energy(ecg_data, fs)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Prominencia: ~20 en derivaciones limpias, ~5 con ruido fuerte, 1 en ruido puro
+        prominence = np.percentile(energy, 99, axis=0) / np.median(energy, axis=0)
+        prominence_score = np.clip((prominence - 2) / 13, 0, 1)
+
+        # Curtosis en exceso (0 para ruido gaussiano, ~3 en derivaciones limpias)
+        # (x**2)**2 en lugar de x**4: np.power con exponente 4 no usa el camino rápido del cuadrado
+        squared = np.square(filtered - filtered.mean(axis=0))
+        variance = squared.mean(axis=0)
+        kurtosis = np.square(squared).mean(axis=0) / variance ** 2 - 3
+        kurtosis_score = np.clip(kurtosis / 3, 0, 1)
+
+        quality = np.sqrt(prominence_score * kurtosis_score)
+    return np.nan_to_num(quality)
+
+
+def _dedupe_peaks(peaks, min_distance):
+    """
+    Ordena los picos de una derivación y descarta los que caen dentro del
+    periodo refractario del pico anterior.
+    """
+    peaks = np.unique(peaks)
+    if len(peaks) < 2:
+        return peaks
+
+    keep = np.ones(len(peaks), dtype=bool)
+    last = peaks[0]
+    for i in range(1, len(peaks)):
+        if peaks[i] - last < min_distance:
+            keep[i] = False
+        else:
+            last = peaks[i]
+    return peaks[keep]
+
+
+def fuse_peaks(per_lead_peaks, fs, tolerance_ms=50, min_leads=None):
+    """
+    Fusiona los picos R de varias derivaciones en un conjunto de consenso.
+
+    Los picos de todas las derivaciones se ordenan y se agrupan cuando están a
+    menos de ``tolerance_ms`` entre sí. Un grupo se acepta como latido si
+    aparece en al menos ``min_leads`` derivaciones distintas; su posición es la
+    mediana del grupo.
+
+    Args:
+        per_lead_peaks (list of np.ndarray): Índices de picos R por derivación.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        tolerance_ms (float): Distancia máxima entre picos del mismo latido, en ms.
+        min_leads (int): Número mínimo de derivaciones que deben coincidir.
+                         Por defecto, la mitad de las derivaciones.
+
+    Returns:
+        np.ndarray: Índices de los picos R de consenso.
+    """
+    n_leads = len(per_lead_peaks)
+    if n_leads == 0:
+        return np.array([], dtype=int)
+    if min_leads is None:
+        min_leads = max(1, n_leads // 2)
+
+    all_peaks, _, starts, counts, distinct = _group_peaks(per_lead_peaks, fs, tolerance_ms)
+    if len(all_peaks) == 0:
+        return np.array([], dtype=int)
+    n_distinct = distinct.sum(axis=1)
+
+    # Mediana del grupo: el array ya está ordenado
+    medians = all_peaks[starts + (counts - 1) // 2]
+
+    return medians[n_distinct >= min_leads].astype(int)
+
+
+def _group_peaks(per_lead_peaks, fs, tolerance_ms):
+    """
+    Mezcla los picos de todas las derivaciones en orden y los agrupa por latido.
+
+    Returns:
+        np.ndarray: Picos de todas las derivaciones, ordenados.
+        np.ndarray: Derivación de cada pico.
+        np.ndarray: Posición de inicio de cada grupo.
+        np.ndarray: Número de picos de cada grupo.
+        np.ndarray: Matriz booleana (grupos x derivaciones) de derivaciones presentes en cada grupo.
+    """
+    n_leads = len(per_lead_peaks)
+    all_peaks = np.concatenate([np.asarray(p, dtype=int) for p in per_lead_peaks] or [np.array([], dtype=int)])
+    lead_ids = np.repeat(np.arange(n_leads), [len(p) for p in per_lead_peaks])
+    if len(all_peaks) == 0:
+        empty = np.array([], dtype=int)
+        return all_peaks, lead_ids, empty, empty, np.zeros((0, n_leads), dtype=bool)
+
+    # Cada derivación ya está ordenada: la ordenación estable (timsort) detecta esas k
+    # secuencias y las mezcla en O(N log k), como una mezcla con montículo
+    order = np.argsort(all_peaks, kind='stable')
+    all_peaks = all_peaks[order]
+    lead_ids = lead_ids[order]
+
+    # Un nuevo grupo empieza donde el salto entre picos consecutivos supera la tolerancia
+    tolerance = tolerance_ms * fs / 1000
+    starts = np.flatnonzero(np.diff(all_peaks, prepend=all_peaks[0] - tolerance - 1) > tolerance)
+    counts = np.diff(np.append(starts, len(all_peaks)))
+
+    # Derivaciones distintas por grupo (cada derivación cuenta una sola vez)
+    group_ids = np.repeat(np.arange(len(starts)), counts)
+    distinct = np.zeros((len(starts), n_leads), dtype=bool)
+    distinct[group_ids, lead_ids] = True
+    return all_peaks, lead_ids, starts, counts, distinct
+
+
+def fuse_peaks_weighted(per_lead_peaks, fs, weights, tolerance_ms=50, min_support=0.5,
+                        min_quality=MIN_LEAD_QUALITY):
+    """
+    Fusiona los picos R de varias derivaciones ponderando cada derivación por su calidad.
+
+    Las derivaciones con calidad menor que ``min_quality`` no participan (sus picos de
+    ruido no pueden encadenar grupos ni crear latidos). Un grupo se acepta como latido
+    si la suma de las calidades de sus derivaciones alcanza ``min_support`` veces la
+    calidad total de las derivaciones participantes; su posición es la mediana
+    ponderada del grupo.
+
+    Args:
+        per_lead_peaks (list of np.ndarray): Índices de picos R por derivación (ordenados).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        weights (np.ndarray): Calidad de cada derivación (0-1), p. ej. ``lead_quality``.
+        tolerance_ms (float): Distancia máxima entre picos del mismo latido, en ms.
+        min_support (float): Fracción de la calidad total necesaria para aceptar un latido.
+        min_quality (float): Calidad mínima para que una derivación participe.
+
+    Returns:
+        np.ndarray: Índices de los picos R de consenso.
+        np.ndarray: Matriz booleana (latidos x derivaciones) con las derivaciones que
+                    contribuyeron a cada latido.
+    """
+    n_leads = len(per_lead_peaks)
+    weights = np.asarray(weights, dtype=float)
+    used = weights >= min_quality
+    empty = np.array([], dtype=int), np.zeros((0, n_leads), dtype=bool)
+    if not used.any():
+        return empty
+
+    participating = [p if use else np.array([], dtype=int) for p, use in zip(per_lead_peaks, used)]
+    all_peaks, lead_ids, starts, counts, distinct = _group_peaks(participating, fs, tolerance_ms)
+    if len(all_peaks) == 0:
+        return empty
+
+    support = distinct @ weights
+    accepted = support >= min_support * weights[used].sum()
+
+    # Mediana ponderada de cada grupo: primer pico cuya calidad acumulada alcanza la mitad del grupo
+    cumulative = np.cumsum(weights[lead_ids])
+    before = cumulative[starts] - weights[lead_ids[starts]]
+    half = before + np.add.reduceat(weights[lead_ids], starts) / 2
+    median_pos = np.clip(np.searchsorted(cumulative, half, side='left'), starts, starts + counts - 1)
+
+    return all_peaks[median_pos[accepted]].astype(int), distinct[accepted]
+
+
+@instrumentation.timed(samples=instrumentation.n_samples)
+def detect_peaks_batch(ecg_data, fs, refractory_ms=200, threshold=0.3, tolerance_ms=50, min_leads=None):
+    """
+    Detecta los picos R en todas las derivaciones de un registro en una sola pasada
+    vectorizada (filtro pasa banda, energía QRS y selección de máximos locales).
+
+    Args:
+        ecg_data (np.ndarray): Array NumPy 2-D (muestras x derivaciones), p. ej. ``record.p_signal``.
+                               Un array 1-D se trata como una única derivación.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        refractory_ms (float): Distancia mínima entre dos picos R de una misma derivación, en ms.
+        threshold (float): Fracción del percentil 99 de la energía QRS usada como umbral.
+        tolerance_ms (float): Tolerancia temporal para la fusión de consenso, en ms.
+        min_leads (int): Derivaciones mínimas para aceptar un latido de consenso.
+
+    Returns:
+        list of np.ndarray: Índices de los picos R detectados en cada derivación.
+        np.ndarray: Índices de los picos R de consenso entre derivaciones.
+    """
+    if ecg_data is None or len(ecg_data) == 0:
+        return [], np.array([], dtype=int)
+
+    per_lead_peaks, _, _ = _detect_per_lead(ecg_data, fs, refractory_ms, threshold)
+    consensus = fuse_peaks(per_lead_peaks, fs, tolerance_ms=tolerance_ms, min_leads=min_leads)
+
+    return per_lead_peaks, consensus
+
+
+@instrumentation.timed(samples=instrumentation.n_samples)
+def detect_peaks_consensus(ecg_data, fs, refractory_ms=200, threshold=0.3, tolerance_ms=50,
+                           min_support=0.5, min_quality=MIN_LEAD_QUALITY):
+    """
+    Detección automática en todas las derivaciones, sin elegir una a mano: se detectan
+    los picos de cada derivación en una pasada vectorizada, se puntúa la calidad de
+    cada derivación con las mismas señales intermedias y se fusionan los picos
+    ponderando por calidad (``fuse_peaks_weighted``).
+
+    Args:
+        ecg_data (np.ndarray): Array NumPy 2-D (muestras x derivaciones), p. ej. ``record.p_signal``.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        refractory_ms (float): Distancia mínima entre dos picos R de una misma derivación, en ms.
+        threshold (float): Fracción del percentil 99 de la energía QRS usada como umbral.
+        tolerance_ms (float): Tolerancia temporal para la fusión de consenso, en ms.
+        min_support (float): Fracción de la calidad total necesaria para aceptar un latido.
+        min_quality (float): Calidad mínima para que una derivación participe en la fusión.
+
+    Returns:
+        dict: ``peaks`` (picos R de consenso), ``per_lead_peaks`` (list of np.ndarray),
+              ``quality`` (calidad por derivación), ``contributing`` (matriz booleana
+              latidos x derivaciones) y ``lead_support`` (latidos a los que contribuyó
+              cada derivación).
+    """
+    if ecg_data is None or len(ecg_data) == 0:
+        empty = np.array([], dtype=int)
+        return {"peaks": empty, "per_lead_peaks": [], "quality": np.array([]),
+                "contributing": np.zeros((0, 0), dtype=bool), "lead_support": empty}
+
+    per_lead_peaks, filtered, energy = _detect_per_lead(ecg_data, fs, refractory_ms, threshold)
+    n_leads = len(per_lead_peaks)
+    if filtered is None:
+        quality = np.zeros(n_leads)
+    else:
+        quality = lead_quality(None, fs, filtered=filtered, energy=energy)
+
+    peaks, contributing = fuse_peaks_weighted(per_lead_peaks, fs, quality, tolerance_ms=tolerance_ms,
+                                              min_support=min_support, min_quality=min_quality)
+    return {
+        "peaks": peaks,
+        "per_lead_peaks": per_lead_peaks,
+        "quality": quality,
+        "contributing": contributing,
+        "lead_support": contributing.sum(axis=0),
+    }
+
+
+def _qrs_candidates(energy, fs, refractory_ms, threshold):
+    """
+    Candidatos a QRS de todas las derivaciones: máximos locales de la energía QRS dentro
+    del periodo refractario que superan el umbral adaptativo de su derivación.
+
+    Returns:
+        np.ndarray: Derivación de cada candidato (ordenados por derivación).
+        np.ndarray: Muestra de cada candidato.
+    """
+    from scipy.ndimage import maximum_filter1d  # importación diferida (ver ``_qrs_energy``)
+
+    # Umbral adaptativo por derivación
+    lead_threshold = threshold * np.percentile(energy, 99, axis=0)
+
+    # Máximos locales dentro del periodo refractario, para todas las derivaciones a la vez
+    refractory = max(1, int(round(refractory_ms * fs / 1000)))
+    local_max = maximum_filter1d(energy, size=2 * refractory + 1, axis=0, mode='nearest')
+    rising = np.empty_like(energy, dtype=bool)
+    rising[0] = False
+    rising[1:] = energy[1:] > energy[:-1]  # evita duplicados en mesetas
+    is_peak = (energy == local_max) & rising & (energy > lead_threshold) & (lead_threshold > 0)
+
+    return np.nonzero(is_peak.T)
+
+
+def _split_by_lead(lead_idx, peaks, n_leads, refractory):
+    """Separa los picos por derivación (``lead_idx`` ordenado) y aplica el periodo refractario."""
+    bounds = np.searchsorted(lead_idx, np.arange(n_leads + 1))
+    return [_dedupe_peaks(peaks[bounds[i]:bounds[i + 1]], refractory).astype(int) for i in range(n_leads)]
+
+
+def _detect_per_lead(ecg_data, fs, refractory_ms, threshold):
+    """
+    Picos R de cada derivación (ver ``detect_peaks_batch``).
+
+    Returns:
+        list of np.ndarray: Picos R por derivación.
+        np.ndarray: Señal filtrada (muestras x derivaciones), o None si la señal es demasiado corta.
+        np.ndarray: Energía QRS (muestras x derivaciones), o None si la señal es demasiado corta.
+    """
+    ecg_data = np.asarray(ecg_data, dtype=float)
+    if ecg_data.ndim == 1:
+        ecg_data = ecg_data[:, np.newaxis]
+
+    n_samples, n_leads = ecg_data.shape
+    # sosfiltfilt necesita una longitud mínima para el relleno de los bordes
+    if n_samples < int(fs):
+        return [np.array([], dtype=int) for _ in range(n_leads)], None, None
+
+    # Los NaN (derivaciones sin señal) se tratan como cero
+    ecg_data = np.nan_to_num(ecg_data)
+
+    filtered, energy = _qrs_energy(ecg_data, fs)
+    lead_idx, sample_idx = _qrs_candidates(energy, fs, refractory_ms, threshold)
+
+    # Refinar cada candidato al máximo absoluto de la señal filtrada en +/- 75 ms
+    half = max(1, int(round(0.075 * fs)))
+    padded = np.pad(np.abs(filtered), ((half, half), (0, 0)), mode='constant')
+    windows = sliding_window_view(padded, 2 * half + 1, axis=0)  # vista, sin copia
+    offsets = windows[sample_idx, lead_idx].argmax(axis=1) - half
+    refined = np.clip(sample_idx + offsets, 0, n_samples - 1)
+
+    # Separar por derivación (np.nonzero sobre la traspuesta ya agrupa por derivación)
+    refractory = max(1, int(round(refractory_ms * fs / 1000)))
+    per_lead_peaks = _split_by_lead(lead_idx, refined, n_leads, refractory)
+    return per_lead_peaks, filtered, energy
+
+
+def compare_peaks(detected, reference, fs, tolerance_ms=50):
+    """
+    Compara dos listas de picos R emparejándolos uno a uno dentro de una tolerancia.
+
+    Args:
+        detected (np.ndarray): Índices de los picos R a evaluar.
+        reference (np.ndarray): Índices de los picos R de referencia.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        tolerance_ms (float): Distancia máxima para considerar que dos picos coinciden, en ms.
+
+    Returns:
+        dict: Verdaderos positivos (``tp``), falsos positivos (``fp``), falsos negativos
+              (``fn``), sensibilidad, valor predictivo positivo (``ppv``) y error
+              absoluto medio de posición (``mean_error_ms``) de los picos emparejados.
+    """
+    detected = np.sort(np.asarray(detected, dtype=int))
+    reference = np.sort(np.asarray(reference, dtype=int))
+    tolerance = tolerance_ms * fs / 1000
+
+    matched_ref = np.zeros(len(reference), dtype=bool)
+    errors = []
+    if len(reference):
+        # Para cada pico detectado, el pico de referencia más cercano (búsqueda binaria)
+        pos = np.searchsorted(reference, detected)
+        for d, p in zip(detected, pos):
+            best = None
+            for j in (p - 1, p):
+                if 0 <= j < len(reference) and not matched_ref[j] and abs(reference[j] - d) <= tolerance:
+                    if best is None or abs(reference[j] - d) < abs(reference[best] - d):
+                        best = j
+            if best is not None:
+                matched_ref[best] = True
+                errors.append(abs(reference[best] - d))
+
+    tp = len(errors)
+    fp = len(detected) - tp
+    fn = len(reference) - tp
+    return {
+        "tp": tp,
+        "fp": fp,
+        "fn": fn,
+        "sensitivity": tp / len(reference) if len(reference) else None,
+        "ppv": tp / len(detected) if len(detected) else None,
+        "mean_error_ms": float(np.mean(errors)) * 1000 / fs if errors else None,
+    }
+
+
+def _detect_chunk(detector, chunk, fs, keep_start, keep_stop, offset):
+    """
+    Detecta picos en un bloque extendido y conserva solo los de su zona central
+    (una lista por derivación si el bloque es 2-D).
+    """
+    chunk = np.asarray(chunk, dtype=float)
+    if chunk.ndim == 2:
+        return [_detect_chunk(detector, chunk[:, i], fs, keep_start, keep_stop, offset)
+                for i in range(chunk.shape[1])]
+    peaks = np.asarray(detector(chunk, fs), dtype=int)
+    peaks = peaks[(peaks >= keep_start) & (peaks < keep_stop)]
+    return peaks + offset
+
+
+@instrumentation.timed(samples=instrumentation.n_samples)
+def detect_peaks_chunked(signal, fs, chunk_s=60, overlap_s=5, detector=detect_peaks_neurokit2,
+                         workers=1, use_processes=False, refractory_ms=200):
+    """
+    Detecta los picos R de registros largos (Holter de 24-48 h) por bloques con solapamiento
+    (overlap-save), de modo que la memoria máxima depende del tamaño del bloque y no de la
+    longitud del registro.
+
+    Cada bloque de ``chunk_s`` segundos se amplía ``overlap_s`` segundos por ambos lados para
+    cubrir los transitorios del filtro y la anchura del QRS; de cada bloque solo se conservan
+    los picos de su zona central, y los duplicados en las uniones se eliminan con el periodo
+    refractario.
+
+    El resultado es equivalente al de una sola llamada sobre toda la señal salvo en la
+    tolerancia del solapamiento y del periodo refractario, no idéntico en general: el
+    detector de NeuroKit2 usa umbrales calculados sobre la señal que recibe, de modo que
+    un latido cercano al umbral puede detectarse en un caso y no en el otro.
+
+    Args:
+        signal (np.ndarray): Array 1-D con la señal, o 2-D (muestras x derivaciones). Basta con
+                             que admita ``len()`` y cortes por muestras (``np.memmap``, una
+                             vista o un lector que lea cada bloque bajo demanda).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        chunk_s (float): Duración de la zona central de cada bloque, en segundos.
+        overlap_s (float): Solapamiento a cada lado del bloque, en segundos.
+        detector (callable): Detector ``detector(signal, fs) -> np.ndarray`` aplicado a cada bloque.
+        workers (int): Número de hilos o procesos que procesan bloques en paralelo.
+        use_processes (bool): Usa procesos en lugar de hilos (el detector debe ser serializable).
+        refractory_ms (float): Distancia mínima entre picos al unir los bloques, en ms.
+
+    Returns:
+        np.ndarray: Índices de los picos R detectados en toda la señal (para una señal 2-D,
+                    una lista con los de cada derivación).
+    """
+    multi_lead = len(getattr(signal, "shape", ())) == 2
+    if signal is None or len(signal) == 0:
+        return [np.array([], dtype=int) for _ in range(signal.shape[1])] if multi_lead else np.array([], dtype=int)
+
+    n = len(signal)
+    chunk = max(1, int(round(chunk_s * fs)))
+    overlap = int(round(overlap_s * fs))
+    if n <= chunk + 2 * overlap:
+        return _detect_chunk(detector, signal[0:n], fs, 0, n, 0)
+
+    def tasks():
+        for core_start in range(0, n, chunk):
+            core_stop = min(core_start + chunk, n)
+            start = max(0, core_start - overlap)
+            stop = min(n, core_stop + overlap)
+            # El bloque se copia aquí: solo hay ``workers`` bloques en memoria a la vez
+            yield (detector, np.array(signal[start:stop], dtype=float), fs,
+                   core_start - start, core_stop - start, start)
+
+    results = []
+    if workers <= 1:
+        results = [_detect_chunk(*task) for task in tasks()]
+    else:
+        pool = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool(max_workers=workers) as executor:
+            pending = iter(tasks())
+            in_flight = set()
+            while True:
+                # Número acotado de bloques en vuelo para mantener la memoria limitada
+                while len(in_flight) < 2 * workers:
+                    task = next(pending, None)
+                    if task is None:
+                        break
+                    in_flight.add(executor.submit(_detect_chunk, *task))
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in finished)
+
+    # Un mismo latido cerca de una unión puede detectarse en dos bloques con posiciones distintas
+    refractory = max(1, int(round(refractory_ms * fs / 1000)))
+    if multi_lead:
+        return [_dedupe_peaks(np.concatenate([result[i] for result in results]), refractory).astype(int)
+                for i in range(signal.shape[1])]
+    return _dedupe_peaks(np.concatenate(results), refractory).astype(int)
+
+
+# Confianza mínima (``peak_confidence``) para aceptar los picos de la vía rápida
+MIN_FAST_CONFIDENCE = 0.8
+
+
+# Frecuencia aproximada (Hz) a la que la vía rápida calcula la energía QRS (Pan-Tompkins usaba 200 Hz)
+FAST_ENERGY_FS = 125
+
+
+def detect_peaks_fast(ecg_data, fs, refractory_ms=200, threshold=0.3, qrs_ms=50):
+    """
+    Vía rápida de la detección por niveles: Pan-Tompkins vectorizado sobre todas las
+    derivaciones a la vez.
+
+    La energía QRS y los candidatos (como en ``detect_peaks_batch``) se calculan sobre la
+    señal diezmada a ~``FAST_ENERGY_FS`` Hz (media de bloques de muestras), y el pico R se
+    sitúa a la frecuencia original en el máximo de la señal suavizada (media móvil de 20 ms,
+    como la limpieza de NeuroKit2) a +/- ``qrs_ms`` de cada candidato, leyendo solo esas
+    ventanas.
+
+    Args:
+        ecg_data (np.ndarray): Array NumPy 2-D (muestras x derivaciones). Un array 1-D se
+                               trata como una única derivación.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        refractory_ms (float): Distancia mínima entre dos picos R de una misma derivación, en ms.
+        threshold (float): Fracción del percentil 99 de la energía QRS usada como umbral.
+        qrs_ms (float): Semiancho de la búsqueda del pico R alrededor de cada candidato, en ms.
+
+    Returns:
+        dict: ``per_lead_peaks`` (list of np.ndarray), ``quality`` (``lead_quality`` de cada
+              derivación) y ``amplitudes`` (energía QRS de cada pico, por derivación).
+    """
+    ecg_data = np.asarray(ecg_data, dtype=float)
+    if ecg_data.ndim == 1:
+        ecg_data = ecg_data[:, np.newaxis]
+    n_samples, n_leads = ecg_data.shape
+    if n_samples < int(fs):
+        empty = [np.array([], dtype=int) for _ in range(n_leads)]
+        return {"per_lead_peaks": empty, "quality": np.zeros(n_leads), "amplitudes": [np.array([])] * n_leads}
+
+    factor = max(1, int(fs // FAST_ENERGY_FS))
+    n_coarse = n_samples // factor
+    # Los NaN (derivaciones sin señal) se tratan como cero, solo en la señal diezmada y en las ventanas
+    coarse = np.nan_to_num(ecg_data[:n_coarse * factor].reshape(n_coarse, factor, n_leads).mean(axis=1))
+    filtered, energy = _qrs_energy(coarse, fs / factor)
+    lead_idx, coarse_idx = _qrs_candidates(energy, fs / factor, refractory_ms, threshold)
+
+    # Ventanas de +/- qrs_ms (más el ancho de la media móvil) alrededor de cada candidato
+    center = coarse_idx * factor + factor // 2
+    half = max(1, int(round(qrs_ms * fs / 1000)))
+    smooth = max(1, int(fs / 50))
+    positions = center[:, np.newaxis] + np.arange(-half - smooth // 2, half + (smooth + 1) // 2)
+    windows = np.nan_to_num(ecg_data[np.clip(positions, 0, n_samples - 1), lead_idx[:, np.newaxis]])
+    cumulative = np.cumsum(windows, axis=1)
+    smoothed = cumulative[:, smooth - 1:] - np.pad(cumulative, ((0, 0), (1, 0)))[:, :-smooth]
+    refined = np.clip(center + smoothed.argmax(axis=1) - half, 0, n_samples - 1)
+
+    refractory = max(1, int(round(refractory_ms * fs / 1000)))
+    per_lead_peaks = _split_by_lead(lead_idx, refined, n_leads, refractory)
+    amplitudes = [energy[np.minimum(peaks // factor, n_coarse - 1), lead] for lead, peaks in enumerate(per_lead_peaks)]
+    return {
+        "per_lead_peaks": per_lead_peaks,
+        "quality": lead_quality(None, fs / factor, filtered=filtered, energy=energy),
+        "amplitudes": amplitudes,
+    }
+
+
+def _nearest(reference, peaks):
+    """Posición en ``reference`` (ordenado, no vacío) del pico más cercano a cada pico."""
+    pos = np.searchsorted(reference, peaks)
+    left = np.clip(pos - 1, 0, len(reference) - 1)
+    right = np.clip(pos, 0, len(reference) - 1)
+    return np.where(np.abs(peaks - reference[left]) <= np.abs(reference[right] - peaks), left, right)
+
+
+def _match_fraction(peaks, reference, tolerance):
+    """F1 del emparejamiento uno a uno (vectorizado) de ``peaks`` con ``reference``."""
+    if len(peaks) == 0 or len(reference) == 0:
+        return 0.0
+    nearest = _nearest(reference, peaks)
+    matched = np.unique(nearest[np.abs(peaks - reference[nearest]) <= tolerance])
+    return 2 * len(matched) / (len(peaks) + len(reference))
+
+
+def peak_confidence(per_lead_peaks, fs, amplitudes=None, reference=None, tolerance_ms=30):
+    """
+    Confianza (0-1) en los picos R de cada derivación, sin volver a detectarlos.
+
+    Es el producto de:
+
+    - Regularidad RR: fracción de intervalos RR entre 0.5 y 1.6 veces la mediana (un
+      latido perdido duplica el intervalo y un falso positivo lo parte). Una fibrilación
+      auricular no baja de forma apreciable esta medida. Si la frecuencia mediana está
+      fuera de 30-220 bpm, o hay menos de 3 picos, la confianza es 0.
+    - Consistencia de amplitud: fracción de picos cuya amplitud (p. ej. la energía QRS)
+      está entre 0.3 y 3 veces la mediana (ondas T o artefactos detectados como QRS). Sin
+      ``amplitudes``, este término vale 1.
+    - Acuerdo con ``reference`` (p. ej. el consenso de todas las derivaciones), si se
+      indica: F1 del emparejamiento a ``tolerance_ms`` tras restar el retardo mediano de
+      la derivación, que no es un error (el pico R no cae en el mismo instante en todas).
+
+    Args:
+        per_lead_peaks (list of np.ndarray): Índices de los picos R por derivación.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        amplitudes (list of np.ndarray): Amplitud de cada pico R, por derivación, o None.
+        reference (np.ndarray): Picos R de referencia, o None.
+        tolerance_ms (float): Tolerancia del emparejamiento con la referencia, en ms.
+
+    Returns:
+        np.ndarray: Confianza de cada derivación.
+    """
+    confidence = np.zeros(len(per_lead_peaks))
+    if reference is not None:
+        reference = np.sort(np.asarray(reference, dtype=int))
+    for lead, peaks in enumerate(per_lead_peaks):
+        if len(peaks) < 3:
+            continue
+        rr = np.diff(peaks)
+        median_rr = np.median(rr)
+        if not 60 / 220 * fs <= median_rr <= 60 / 30 * fs:
+            continue
+        ratio = rr / median_rr
+        rr_score = np.mean((ratio >= 0.5) & (ratio <= 1.6))
+
+        score = rr_score
+        if amplitudes is not None:
+            amplitude = amplitudes[lead]
+            amplitude_ratio = amplitude / max(np.median(amplitude), np.finfo(float).tiny)
+            score *= np.mean((amplitude_ratio >= 0.3) & (amplitude_ratio <= 3.0))
+        if reference is not None and len(reference):
+            delay = np.median(peaks - reference[_nearest(reference, peaks)])
+            score *= _match_fraction(peaks - delay, reference, tolerance_ms * fs / 1000)
+        confidence[lead] = score
+    return confidence
+
+
+def _detect_peaks_neurokit2_clean(signal, fs):
+    """``detect_peaks_neurokit2`` tras la limpieza de NeuroKit2 (``nk.ecg_clean``), como en ``nk.ecg_process``."""
+    import neurokit2 as nk
+
+    return detect_peaks_neurokit2(nk.ecg_clean(signal, sampling_rate=fs), fs)
+
+
+@instrumentation.timed(samples=instrumentation.n_samples)
+def detect_peaks_tiered(ecg_data, fs, min_confidence=MIN_FAST_CONFIDENCE, fallback=None, refractory_ms=200,
+                        threshold=0.3):
+    """
+    Detección por niveles: la vía rápida (``detect_peaks_fast``, todas las derivaciones en
+    una pasada) y, solo para las derivaciones cuya confianza (``peak_confidence``, frente
+    al consenso ponderado por calidad) es menor que ``min_confidence``, NeuroKit2. Si los
+    picos de NeuroKit2 tienen aún menos confianza (p. ej. con ruido fuerte), se conservan
+    los de la vía rápida.
+
+    ``"fast"`` indica qué detector dio los picos, no que sean fiables: una derivación
+    escalada en la que se conservan los de la vía rápida (``escalated`` True) sigue
+    marcada como ``"fast"`` con una confianza menor que ``min_confidence`` (en JS00001, la
+    derivación I se escala, conserva la vía rápida y tiene un VPP de 0.68 frente a
+    NeuroKit2). La fiabilidad la indican ``confidence`` y ``escalated``.
+
+    Args:
+        ecg_data (np.ndarray): Array NumPy 2-D (muestras x derivaciones). Un array 1-D se
+                               trata como una única derivación (sin consenso).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        min_confidence (float): Confianza mínima para aceptar la vía rápida (0 la acepta
+                                siempre; más de 1 ejecuta siempre NeuroKit2).
+        fallback (callable): Detector ``fallback(signal, fs)`` de una derivación. Por defecto,
+                             NeuroKit2 por bloques (``detect_peaks_chunked``) sobre la señal
+                             limpiada con ``nk.ecg_clean``.
+        refractory_ms (float): Distancia mínima entre dos picos R de una misma derivación, en ms.
+        threshold (float): Fracción del percentil 99 de la energía QRS usada como umbral.
+
+    Returns:
+        dict: ``per_lead_peaks`` (list of np.ndarray), ``tier`` (detector de los picos de cada
+              derivación: ``"fast"`` o ``"neurokit"``; ver arriba), ``confidence`` (de esos picos, por
+              derivación), ``escalated`` (derivaciones en las que se ejecutó NeuroKit2) y
+              ``record_tier`` (``"fast"``, ``"neurokit"`` o ``"mixed"``).
+    """
+    ecg_data = np.asarray(ecg_data, dtype=float)
+    if ecg_data.ndim == 1:
+        ecg_data = ecg_data[:, np.newaxis]
+    if fallback is None:
+        def fallback(signal, fs):
+            return detect_peaks_chunked(signal, fs, detector=_detect_peaks_neurokit2_clean)
+
+    fast = detect_peaks_fast(ecg_data, fs, refractory_ms, threshold)
+    per_lead_peaks = fast["per_lead_peaks"]
+    reference = None
+    if len(per_lead_peaks) > 1:
+        reference, _ = fuse_peaks_weighted(per_lead_peaks, fs, fast["quality"])
+    confidence = peak_confidence(per_lead_peaks, fs, fast["amplitudes"], reference=reference)
+
+    tier = ["fast"] * len(per_lead_peaks)
+    # Registros de menos de 1 s: tampoco NeuroKit2 encontraría latidos
+    escalated = (confidence < min_confidence) & (len(ecg_data) >= int(fs))
+    for lead in np.flatnonzero(escalated):
+        signal = np.nan_to_num(ecg_data[:, lead])
+        if np.ptp(signal) == 0:  # derivación plana o sin señal
+            escalated[lead] = False
+            continue
+        peaks = np.asarray(fallback(signal, fs), dtype=int)
+        # Sin energía QRS para los picos de NeuroKit2, su confianza omite el término de amplitud
+        slow_confidence = peak_confidence([peaks], fs, reference=reference)[0]
+        if slow_confidence >= confidence[lead]:
+            per_lead_peaks[lead], confidence[lead], tier[lead] = peaks, slow_confidence, "neurokit"
+
+    n_slow = tier.count("neurokit")
+    record_tier = "fast" if n_slow == 0 else "neurokit" if n_slow == len(tier) else "mixed"
+    instrumentation.count("ecg_detection_records_total", tier=record_tier)
+    instrumentation.count("ecg_detection_escalated_leads_total", int(escalated.sum()))
+    return {"per_lead_peaks": per_lead_peaks, "tier": tier, "confidence": confidence, "escalated": escalated,
+            "record_tier": record_tier}
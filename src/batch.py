@@ -0,0 +1,394 @@
+"""
+Análisis por lotes, sin interfaz, de directorios completos de registros WFDB (.hea/.mat).
+
+Los registros se reparten en bloques entre los procesos de un ``ProcessPoolExecutor``;
+los resultados (una fila por registro y derivación) se escriben a medida que termina
+cada bloque, en CSV o Parquet. Un archivo de progreso permite reanudar una ejecución
+interrumpida sin volver a procesar los registros ya terminados.
+
+La entrada también puede ser un almacén creado con ``src.signal_store``; en ese caso se
+puede limitar el análisis a una cohorte (``--dx``, ``--age-min``, ``--age-max``, ``--sex``)
+sin abrir ningún registro.
+
+Uso:
+    python -m src.batch data/raw_data -o resultados.csv
+    python -m src.batch /datos/chapman -o resultados_parquet --format parquet --workers 8
+    python -m src.batch almacen_ecg -o fa_mayores.csv --dx 164889003 --age-min 80
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from src import analysis, data_preprocessing, instrumentation, record_reader, signal_store, utils
+
+RESULT_COLUMNS = [
+    "record", "lead", "fs", "n_samples", "n_peaks", "heart_rate_bpm", "mean_rr_ms",
+    "tier", "record_tier", "confidence", "age", "sex", "dx", "error",
+]
+
+
+def find_records(input_dir, cohort=None):
+    """
+    Busca recursivamente los pares .hea/.mat de un directorio.
+
+    Args:
+        input_dir (str): Directorio raíz con los registros WFDB, o un almacén de ``signal_store``.
+        cohort (dict): Criterios de ``SignalStore.query`` (solo para almacenes).
+
+    Returns:
+        list of str: Rutas de los registros sin extensión, relativas a ``input_dir`` y ordenadas
+                     (en un almacén, sus nombres en el orden del almacén).
+    """
+    if signal_store.is_store(input_dir):
+        store = signal_store.open_store(input_dir)
+        return store.names[store.query(**(cohort or {}))].tolist()
+    if cohort:
+        raise ValueError("Los filtros de cohorte requieren un almacén creado con src.signal_store.")
+    records = []
+    for dirpath, _, filenames in os.walk(input_dir):
+        names = set(filenames)
+        for filename in filenames:
+            base, ext = os.path.splitext(filename)
+            if ext == ".hea" and f"{base}.mat" in names:
+                records.append(os.path.relpath(os.path.join(dirpath, base), input_dir))
+    return sorted(records)
+
+
+class _RecordWindows:
+    """
+    Señal de un registro (muestras x derivaciones, float64) que solo lee, y preprocesa, los
+    intervalos que se le piden: ``detect_peaks_chunked`` recorre así un Holter con la memoria
+    acotada por el tamaño del bloque. ``read(start, stop)`` devuelve la ventana en mV.
+    """
+
+    def __init__(self, read, n_samples, n_sig, fs, pipeline=None):
+        self._read, self._fs, self._pipeline = read, fs, pipeline
+        self.shape = (n_samples, n_sig)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(self.shape[0])
+        window = self._read(start, stop)
+        if self._pipeline is not None:
+            # El solapamiento entre bloques cubre los transitorios del filtro
+            window = self._pipeline.apply(window, self._fs, dtype=window.dtype, out=window)
+        return window
+
+
+def _open_record(input_dir, record):
+    """
+    Abre un registro sin decodificar sus muestras.
+
+    Returns:
+        record_reader.MappedRecord: Registro (del almacén, solo con la cabecera).
+        int: Número de muestras.
+        callable: ``read(start, stop)``, que devuelve la ventana en mV (float64: mismos valores
+                  que ``wfdb.rdrecord(...).p_signal``).
+    """
+    if signal_store.is_store(input_dir):
+        store = signal_store.open_store(input_dir)
+        rec = store.record(record, 0, 0)  # solo la cabecera; las muestras se leen por bloques
+        n_samples = int(store.index["n_samples"][store.position(record)])
+        return rec, n_samples, lambda start, stop: store.record(record, start, stop).window(dtype=np.float64)
+    rec = record_reader.read_record(os.path.join(input_dir, record))
+    return rec, rec.n_samples, lambda start, stop: rec.window(start, stop, dtype=np.float64)
+
+
+@instrumentation.timed("batch.analyze_record")
+def analyze_record(input_dir, record, method="neurokit", pipeline=None):
+    """
+    Analiza todas las derivaciones de un registro: picos R y frecuencia cardíaca.
+
+    Args:
+        input_dir (str): Directorio raíz de los registros, o un almacén de ``signal_store``.
+        record (str): Ruta del registro sin extensión, relativa a ``input_dir``.
+        method (str): ``"neurokit"`` (``detect_peaks_neurokit2`` por derivación y por bloques,
+                      leyendo el registro bloque a bloque), ``"tiered"`` (``detect_peaks_tiered``:
+                      vía rápida y NeuroKit2 solo en las derivaciones de baja confianza) o
+                      ``"batch"`` (``detect_peaks_batch`` sobre todas las derivaciones).
+        pipeline (data_preprocessing.Pipeline): Preprocesado aplicado antes de la detección, o None.
+
+    Returns:
+        list of dict: Una fila por derivación con las columnas de ``RESULT_COLUMNS``.
+                      Si el registro no se puede leer o analizar, una única fila con el error
+                      (un registro defectuoso no interrumpe el lote).
+    """
+    try:
+        rec, n_samples, read = _open_record(input_dir, record)
+        return _analyze_signal(record, rec, n_samples, read, method, pipeline)
+    except Exception as e:
+        return [{**dict.fromkeys(RESULT_COLUMNS), "record": record, "error": str(e)}]
+
+
+def _analyze_signal(record, rec, n_samples, read, method, pipeline):
+    """Preprocesado, detección y frecuencia cardíaca de un registro abierto (ver ``analyze_record``)."""
+    metadata = utils.parse_header_comments(rec.comments)
+    fs = rec.fs
+    n_leads = rec.n_sig
+    tiers, record_tier, confidence = [method] * n_leads, method, [None] * n_leads
+    if method == "neurokit":
+        # Por bloques con solapamiento, leyendo cada bloque bajo demanda: la memoria depende
+        # del tamaño del bloque y no de la duración del registro (Holter)
+        per_lead_peaks = analysis.detect_peaks_chunked(_RecordWindows(read, n_samples, n_leads, fs, pipeline), fs)
+    else:
+        ecg_data = read(0, n_samples)
+        if pipeline is not None:
+            # Todas las derivaciones en una sola llamada, sobrescribiendo ecg_data
+            ecg_data = pipeline.apply(ecg_data, fs, dtype=ecg_data.dtype, out=ecg_data)
+        if method == "tiered":
+            result = analysis.detect_peaks_tiered(ecg_data, fs)
+            per_lead_peaks, tiers, record_tier = result["per_lead_peaks"], result["tier"], result["record_tier"]
+            confidence = result["confidence"].tolist()
+        else:
+            per_lead_peaks, _ = analysis.detect_peaks_batch(ecg_data, fs)
+
+    rows = []
+    for lead_name, qrs_indices, tier, lead_confidence in zip(rec.sig_name, per_lead_peaks, tiers, confidence):
+        heart_rate, rr_intervals_ms = analysis.calculate_heart_rate(qrs_indices, fs)
+        rows.append({
+            "record": record,
+            "lead": lead_name,
+            "fs": fs,
+            "n_samples": n_samples,
+            "n_peaks": len(qrs_indices),
+            "heart_rate_bpm": heart_rate,
+            "mean_rr_ms": float(np.mean(rr_intervals_ms)) if len(rr_intervals_ms) else None,
+            "tier": tier,
+            "record_tier": record_tier,
+            "confidence": lead_confidence,
+            "age": metadata.get("age"),
+            "sex": metadata.get("sex"),
+            "dx": ",".join(metadata.get("dx", [])),
+            "error": None,
+        })
+    return rows
+
+
+def _analyze_chunk(input_dir, records, method, pipeline=None):
+    """Analiza un bloque de registros dentro de un proceso del pool (con sus métricas, si están activadas)."""
+    rows = [row for record in records for row in analyze_record(input_dir, record, method, pipeline)]
+    return records, rows, instrumentation.take()
+
+
+class CsvResultWriter:
+    """
+    Escribe las filas de resultados en un único archivo CSV (añadiendo si ``append`` es True).
+    Al añadir, la cabecera del archivo debe coincidir con ``RESULT_COLUMNS``: un archivo de
+    otra versión quedaría con columnas desplazadas.
+    """
+
+    def __init__(self, path, append=True):
+        new_file = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new_file:
+            with open(path, newline="", encoding="utf-8") as f:
+                header = next(csv.reader(f), [])
+            if header != RESULT_COLUMNS:
+                raise ValueError(f"Las columnas de {path} no coinciden con las actuales "
+                                 f"({', '.join(header)}); usa --no-resume o otro archivo de salida.")
+        self._file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=RESULT_COLUMNS)
+        if new_file:
+            self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """
+    Escribe cada bloque terminado como un archivo Parquet independiente dentro de un
+    directorio, de modo que un fallo nunca deja un archivo a medio escribir. Al añadir,
+    los bloques existentes deben tener el mismo esquema.
+    """
+
+    def __init__(self, path, append=True):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("El formato Parquet requiere pyarrow: pip install pyarrow") from e
+        self._pa, self._pq = pa, pq
+        self._dir = path
+        self._schema = pa.schema([
+            ("record", pa.string()), ("lead", pa.string()), ("fs", pa.int32()),
+            ("n_samples", pa.int64()), ("n_peaks", pa.int32()),
+            ("heart_rate_bpm", pa.float64()), ("mean_rr_ms", pa.float64()),
+            ("tier", pa.string()), ("record_tier", pa.string()), ("confidence", pa.float64()),
+            ("age", pa.int32()), ("sex", pa.string()), ("dx", pa.string()),
+            ("error", pa.string()),
+        ])
+        os.makedirs(path, exist_ok=True)
+        if not append:
+            # Sin reanudar, los bloques de ejecuciones anteriores duplicarían filas
+            for name in os.listdir(path):
+                if name.startswith("part-") and name.endswith((".parquet", ".parquet.tmp")):
+                    os.remove(os.path.join(path, name))
+        else:
+            parts = sorted(name for name in os.listdir(path) if name.startswith("part-") and name.endswith(".parquet"))
+            if parts and not pq.read_schema(os.path.join(path, parts[0])).equals(self._schema):
+                raise ValueError(f"El esquema de los bloques de {path} no coincide con el actual; "
+                                 f"usa --no-resume o otro directorio de salida.")
+        self._prefix = f"part-{int(time.time())}-{os.getpid()}"
+        self._seq = 0
+
+    def write(self, rows):
+        table = self._pa.Table.from_pylist(rows, schema=self._schema)
+        path = os.path.join(self._dir, f"{self._prefix}-{self._seq:06d}.parquet")
+        self._pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)  # escritura atómica
+        self._seq += 1
+
+    def close(self):
+        pass
+
+
+def _read_progress(progress_path):
+    """Devuelve el conjunto de registros ya terminados según el archivo de progreso."""
+    if not os.path.exists(progress_path):
+        return set()
+    with open(progress_path, encoding="utf-8") as f:
+        # La última línea puede estar incompleta si el proceso se interrumpió al escribirla
+        return {line.rstrip("\n") for line in f if line.endswith("\n")}
+
+
+def _ends_with_partial_line(path):
+    """Indica si el archivo termina sin salto de línea (escritura interrumpida)."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def run_batch(input_dir, output, fmt="csv", workers=None, chunk_size=32, method="neurokit",
+              progress_path=None, resume=True, pipeline=None, cohort=None):
+    """
+    Analiza todos los registros de ``input_dir`` en paralelo y escribe los resultados.
+
+    Args:
+        input_dir (str): Directorio raíz con los pares .hea/.mat.
+        output (str): Archivo CSV de salida, o directorio de salida para Parquet.
+        fmt (str): ``"csv"`` o ``"parquet"``.
+        workers (int): Número de procesos. Por defecto, ``os.cpu_count()``.
+        chunk_size (int): Registros por tarea enviada al pool.
+        method (str): Método de detección (ver ``analyze_record``).
+        progress_path (str): Archivo de progreso. Por defecto, ``<output>.progress``.
+        resume (bool): Si es False, se ignora el progreso previo.
+        pipeline (data_preprocessing.Pipeline): Preprocesado de cada registro, o None.
+        cohort (dict): Criterios de ``SignalStore.query`` si ``input_dir`` es un almacén.
+
+    Returns:
+        dict: Registros totales, omitidos (ya terminados), procesados, filas escritas y tiempo (s).
+    """
+    progress_path = progress_path or f"{output.rstrip(os.sep)}.progress"
+    records = find_records(input_dir, cohort)
+    done = _read_progress(progress_path) if resume else set()
+    pending = [record for record in records if record not in done]
+
+    if fmt == "parquet":
+        writer = ParquetResultWriter(output, append=resume)
+    else:
+        writer = CsvResultWriter(output, append=resume)
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    processed = rows_written = 0
+    try:
+        with open(progress_path, "a" if resume else "w", encoding="utf-8") as progress, \
+                ProcessPoolExecutor(max_workers=workers) as executor:
+            if resume and _ends_with_partial_line(progress_path):
+                progress.write("\n")  # cierra la línea incompleta de una ejecución interrumpida
+            chunk_iter = iter(chunks)
+            in_flight = set()
+            while True:
+                # Mantener un número acotado de bloques en vuelo para no cargar toda la lista en memoria
+                while len(in_flight) < 2 * workers:
+                    chunk = next(chunk_iter, None)
+                    if chunk is None:
+                        break
+                    in_flight.add(executor.submit(_analyze_chunk, input_dir, chunk, method, pipeline))
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    chunk_records, rows, metrics = future.result()
+                    instrumentation.merge(metrics)
+                    # Primero los resultados, después el progreso: un fallo entre ambos
+                    # solo provoca que el bloque se repita al reanudar
+                    if rows:
+                        writer.write(rows)
+                    progress.writelines(f"{record}\n" for record in chunk_records)
+                    progress.flush()
+                    os.fsync(progress.fileno())
+
+                    processed += len(chunk_records)
+                    rows_written += len(rows)
+                    elapsed = time.perf_counter() - start
+                    print(f"[{processed}/{len(pending)}] {processed / elapsed:.1f} registros/s",
+                          file=sys.stderr, flush=True)
+    finally:
+        writer.close()
+        instrumentation.dump()  # solo si ECG_METRICS_FILE está definido
+
+    return {
+        "total": len(records),
+        "skipped": len(records) - len(pending),
+        "processed": processed,
+        "rows": rows_written,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_dir", help="Directorio con los registros WFDB (.hea/.mat)")
+    parser.add_argument("-o", "--output", required=True, help="Archivo CSV o directorio Parquet de salida")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Formato de salida")
+    parser.add_argument("--workers", type=int, default=None, help="Número de procesos (por defecto, núcleos de CPU)")
+    parser.add_argument("--chunk-size", type=int, default=32, help="Registros por tarea")
+    parser.add_argument("--method", choices=["neurokit", "tiered", "batch"], default="neurokit",
+                        help="Método de detección de picos R")
+    parser.add_argument("--progress", default=None, help="Archivo de progreso (por defecto, <output>.progress)")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Filtrar antes de la detección (línea base, red eléctrica y pasa banda)")
+    parser.add_argument("--powerline", type=float, default=50.0, help="Frecuencia de la red eléctrica en Hz (50 o 60)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignorar el progreso previo y empezar de cero")
+    parser.add_argument("--dx", nargs="+", default=None, help="Cohorte: códigos de diagnóstico SNOMED (solo almacenes)")
+    parser.add_argument("--age-min", type=int, default=None, help="Cohorte: edad mínima (solo almacenes)")
+    parser.add_argument("--age-max", type=int, default=None, help="Cohorte: edad máxima (solo almacenes)")
+    parser.add_argument("--sex", default=None, help="Cohorte: sexo, Male/Female (solo almacenes)")
+    args = parser.parse_args(argv)
+    instrumentation.serve_from_env()  # solo si ECG_METRICS_PORT está definido
+
+    cohort = {key: value for key, value in
+              {"dx": args.dx, "age_min": args.age_min, "age_max": args.age_max, "sex": args.sex}.items()
+              if value is not None}
+
+    summary = run_batch(
+        args.input_dir, args.output, fmt=args.format, workers=args.workers, chunk_size=args.chunk_size,
+        method=args.method, progress_path=args.progress, resume=not args.no_resume,
+        pipeline=data_preprocessing.default_pipeline(args.powerline) if args.preprocess else None,
+        cohort=cohort,
+    )
+    print(
+        f"Registros: {summary['total']} (omitidos {summary['skipped']}, procesados {summary['processed']}), "
+        f"filas: {summary['rows']}, tiempo: {summary['seconds']:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
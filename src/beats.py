@@ -0,0 +1,293 @@
+"""
+Segmentación de latidos y agrupación por morfología (plantillas).
+
+Los latidos se extraen como ventanas de longitud fija alrededor de cada pico R, en
+todas las derivaciones a la vez: ``sliding_window_view`` da una vista (posiciones x
+derivaciones x muestras) de la señal sin copiarla y la indexación avanzada de esa
+vista con las posiciones de los picos copia solo esas ventanas a una matriz float32
+contigua (latidos x derivaciones x muestras).
+
+``cluster_beats`` agrupa los latidos frente a plantillas que se actualizan sobre la
+marcha (media de los latidos asignados) usando la correlación con cada plantilla, de
+modo que un registro Holter de 100 000 latidos se resume en unas pocas clases
+morfológicas (latido normal, extrasístoles ventriculares, latidos aberrantes...) con
+su número de latidos. Los latidos se procesan por bloques: la memoria es la de un
+bloque más las plantillas, independiente de la duración del registro.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src import instrumentation
+
+
+# Latidos copiados por operación: acota el temporal de la indexación avanzada
+_GATHER_BEATS = 4096
+
+
+def _gather(windows, starts, out):
+    """
+    Copia las ventanas que empiezan en ``starts`` en ``out`` (convirtiendo a su tipo).
+
+    La indexación avanzada de la vista solo lee las ventanas pedidas; ``np.take`` sobre
+    una vista de ``sliding_window_view`` copiaría antes la vista entera a un array
+    contiguo (todas las ventanas posibles de la señal).
+    """
+    out[...] = windows[starts]
+
+
+def _window(fs, pre_s, post_s):
+    """Muestras antes y después del pico R."""
+    return int(round(pre_s * fs)), int(round(post_s * fs))
+
+
+def _as_2d(signal):
+    signal = np.asarray(signal)
+    if signal.ndim == 1:
+        signal = signal[:, np.newaxis]
+    return signal
+
+
+def complete_beats(qrs_indices, n_samples, fs, pre_s=0.25, post_s=0.4):
+    """
+    Picos R cuya ventana cabe entera en la señal.
+
+    Args:
+        qrs_indices (np.ndarray): Índices de los picos R.
+        n_samples (int): Longitud de la señal.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        pre_s (float): Duración de la ventana antes del pico R, en segundos.
+        post_s (float): Duración de la ventana después del pico R, en segundos.
+
+    Returns:
+        np.ndarray: Índices de los picos R con ventana completa.
+    """
+    pre, post = _window(fs, pre_s, post_s)
+    qrs_indices = np.asarray(qrs_indices, dtype=np.intp)
+    return qrs_indices[(qrs_indices - pre >= 0) & (qrs_indices + post <= n_samples)]
+
+
+@instrumentation.timed(samples=instrumentation.n_samples)
+def extract_beats(signal, qrs_indices, fs, pre_s=0.25, post_s=0.4, out=None):
+    """
+    Extrae la ventana de cada latido en todas las derivaciones.
+
+    Args:
+        signal (np.ndarray): Señal 1-D o 2-D (muestras x derivaciones), p. ej. ``record.p_signal``.
+        qrs_indices (np.ndarray): Índices de los picos R.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        pre_s (float): Duración de la ventana antes del pico R, en segundos.
+        post_s (float): Duración de la ventana después del pico R, en segundos.
+        out (np.ndarray): Matriz float32 (latidos x derivaciones x muestras) donde escribir los latidos.
+
+    Returns:
+        np.ndarray: Picos R extraídos (los que tienen ventana completa).
+        np.ndarray: Matriz float32 contigua (latidos x derivaciones x muestras).
+    """
+    signal = _as_2d(signal)
+    pre, post = _window(fs, pre_s, post_s)
+    peaks = complete_beats(qrs_indices, signal.shape[0], fs, pre_s, post_s)
+    if out is None:
+        out = np.empty((len(peaks), signal.shape[1], pre + post), dtype=np.float32)
+    if len(peaks):
+        # Vista (posiciones x derivaciones x muestras) sin copiar la señal
+        windows = sliding_window_view(signal, pre + post, axis=0)
+        for start in range(0, len(peaks), _GATHER_BEATS):
+            _gather(windows, peaks[start:start + _GATHER_BEATS] - pre, out[start:start + _GATHER_BEATS])
+    return peaks, out
+
+
+def iter_beats(signal, qrs_indices, fs, pre_s=0.25, post_s=0.4, chunk_beats=4096):
+    """
+    Extrae los latidos por bloques de ``chunk_beats`` sobre un único buffer float32.
+
+    El bloque devuelto se reutiliza en la siguiente iteración: se debe copiar si se
+    quiere conservar.
+
+    Args:
+        signal (np.ndarray): Señal 1-D o 2-D (muestras x derivaciones).
+        qrs_indices (np.ndarray): Índices de los picos R.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        pre_s (float): Duración de la ventana antes del pico R, en segundos.
+        post_s (float): Duración de la ventana después del pico R, en segundos.
+        chunk_beats (int): Latidos por bloque.
+
+    Yields:
+        np.ndarray: Picos R del bloque.
+        np.ndarray: Latidos del bloque (latidos x derivaciones x muestras), float32.
+    """
+    signal = _as_2d(signal)
+    pre, post = _window(fs, pre_s, post_s)
+    peaks = complete_beats(qrs_indices, signal.shape[0], fs, pre_s, post_s)
+    if len(peaks) == 0:
+        return
+    windows = sliding_window_view(signal, pre + post, axis=0)
+    buffer = np.empty((min(chunk_beats, len(peaks)), signal.shape[1], pre + post), dtype=np.float32)
+    for start in range(0, len(peaks), chunk_beats):
+        block_peaks = peaks[start:start + chunk_beats]
+        block = buffer[:len(block_peaks)]
+        _gather(windows, block_peaks - pre, block)
+        yield block_peaks, block
+
+
+def _normalize(beats):
+    """
+    Normaliza los latidos: media cero por derivación y norma unitaria por latido, de
+    modo que el producto escalar entre latidos es su correlación.
+
+    Args:
+        beats (np.ndarray): Latidos (... x derivaciones x muestras), float32.
+
+    Returns:
+        np.ndarray: Latidos normalizados y aplanados (... x derivaciones·muestras), contiguos.
+        np.ndarray: Máscara de latidos sin señal (norma nula).
+    """
+    flat = beats - beats.mean(axis=-1, keepdims=True)
+    # Los NaN (derivaciones sin señal) se tratan como cero
+    np.nan_to_num(flat, copy=False)
+    flat = flat.reshape(*beats.shape[:-2], -1)
+    norms = np.sqrt(np.einsum('...i,...i->...', flat, flat))
+    empty = norms < 1e-6
+    flat /= np.where(empty, 1.0, norms)[..., np.newaxis]
+    return flat, empty
+
+
+@instrumentation.timed(samples=instrumentation.n_samples)
+def cluster_beats(signal, qrs_indices, fs, threshold=0.9, max_templates=32, pre_s=0.1, post_s=0.15,
+                  align_ms=10, chunk_beats=1024):
+    """
+    Agrupa los latidos por morfología frente a plantillas actualizadas sobre la marcha.
+
+    Cada latido se compara (correlación sobre todas las derivaciones) con las plantillas
+    existentes y se asigna a la más parecida si la correlación alcanza ``threshold``;
+    si no, crea una plantilla nueva. Las plantillas son la media de sus latidos y se
+    actualizan después de cada bloque. Al llegar a ``max_templates``, los latidos que
+    no se parecen a ninguna se asignan a la más cercana (su correlación lo indica).
+
+    La correlación se toma en el mejor desplazamiento dentro de ±``align_ms``: el
+    error de unas pocas muestras del detector en la posición del pico R bastaría para
+    separar latidos idénticos en varias clases. La ventana por defecto cubre el QRS y
+    el inicio del ST: con ventanas del latido completo, a frecuencias altas o con RR
+    irregular entran en la ventana partes de los latidos vecinos y latidos de igual
+    morfología dejan de correlacionar.
+
+    Args:
+        signal (np.ndarray): Señal 1-D o 2-D (muestras x derivaciones).
+        qrs_indices (np.ndarray): Índices de los picos R (ordenados).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        threshold (float): Correlación mínima para asignar un latido a una plantilla.
+        max_templates (int): Número máximo de plantillas.
+        pre_s (float): Duración de la ventana antes del pico R, en segundos.
+        post_s (float): Duración de la ventana después del pico R, en segundos.
+        align_ms (float): Desplazamiento máximo para alinear cada latido con la plantilla, en ms.
+        chunk_beats (int): Latidos por bloque (limita la memoria usada).
+
+    Returns:
+        dict: ``peaks`` (picos R agrupados), ``labels`` (clase de cada latido, -1 si no
+              tiene señal), ``correlation`` (correlación de cada latido con su plantilla),
+              ``shift`` (desplazamiento del latido respecto a su plantilla, en muestras),
+              ``templates`` (clases x derivaciones x muestras, normalizadas) y ``counts``
+              (latidos por clase). Las clases se ordenan de más a menos frecuente.
+    """
+    signal = _as_2d(signal)
+    pre, post = _window(fs, pre_s, post_s)
+    lag = int(round(align_ms * fs / 1000))
+    margin_s = lag / fs
+    # Ventana ampliada en ``lag`` muestras por cada lado para los desplazamientos
+    peaks = complete_beats(qrs_indices, signal.shape[0], fs, pre_s + margin_s, post_s + margin_s)
+    n_features = signal.shape[1] * (pre + post)
+
+    # Suma de los latidos (normalizados y alineados) de cada plantilla, en float64 para no acumular error
+    sums = np.zeros((max_templates, n_features))
+    counts = np.zeros(max_templates, dtype=np.int64)
+    n_templates = 0
+    labels = np.full(len(peaks), -1, dtype=np.int32)
+    correlation = np.zeros(len(peaks), dtype=np.float32)
+    shifts = np.zeros(len(peaks), dtype=np.int8 if lag < 128 else np.int32)
+
+    position = 0
+    for block_peaks, block in iter_beats(signal, peaks, fs, pre_s + margin_s, post_s + margin_s, chunk_beats):
+        n = len(block)
+        # Cada latido en los 2·lag+1 desplazamientos (desplazamientos x latidos x características)
+        lagged = sliding_window_view(block, pre + post, axis=2).transpose(2, 0, 1, 3)
+        flat, empty = _normalize(lagged)
+        empty = empty[lag]
+        rows = np.arange(n)
+        block_labels = np.full(n, -1, dtype=np.int32)
+        block_corr = np.zeros(n, dtype=np.float32)
+        block_lag = np.full(n, lag)
+
+        # Todos los latidos del bloque frente a las plantillas existentes en una multiplicación por desplazamiento
+        templates = _unit_templates(sums[:n_templates])
+        if n_templates:
+            corr = flat @ templates.T
+            best_lag = corr.argmax(axis=0)
+            corr = corr.max(axis=0)
+            best = corr.argmax(axis=1)
+            block_corr = corr[rows, best]
+            matched = (block_corr >= threshold) & ~empty
+            block_labels[matched] = best[matched]
+            block_lag[matched] = best_lag[rows, best][matched]
+
+        # Los latidos sin plantilla crean plantillas nuevas, una a una
+        pending = np.flatnonzero((block_labels < 0) & ~empty)
+        new_templates = []
+        while len(pending) and n_templates < max_templates:
+            template = flat[lag, pending[0]]
+            corr_new = flat[:, pending] @ template
+            best_lag = corr_new.argmax(axis=0)
+            corr_new = corr_new.max(axis=0)
+            matched = corr_new >= threshold
+            matched[0] = True
+            best_lag[0] = lag
+            block_labels[pending[matched]] = n_templates
+            block_corr[pending[matched]] = corr_new[matched]
+            block_lag[pending[matched]] = best_lag[matched]
+            new_templates.append(template)
+            n_templates += 1
+            pending = pending[~matched]
+
+        if len(pending):
+            # Sin plantillas libres: a la más cercana, con su correlación real
+            templates = np.vstack([templates, *new_templates]) if new_templates else templates
+            corr = flat[:, pending] @ templates.T
+            best_lag = corr.argmax(axis=0)
+            corr = corr.max(axis=0)
+            best = corr.argmax(axis=1)
+            block_labels[pending] = best
+            block_corr[pending] = corr[np.arange(len(pending)), best]
+            block_lag[pending] = best_lag[np.arange(len(pending)), best]
+
+        # Actualización de las plantillas con los latidos alineados (suma y número de latidos de cada clase)
+        aligned = flat[block_lag, rows]
+        assigned = block_labels >= 0
+        for label in np.unique(block_labels[assigned]):
+            sums[label] += aligned[block_labels == label].sum(axis=0, dtype=np.float64)
+        counts += np.bincount(block_labels[assigned], minlength=max_templates)
+
+        labels[position:position + n] = block_labels
+        correlation[position:position + n] = block_corr
+        shifts[position:position + n] = block_lag - lag
+        position += n
+
+    # Clases ordenadas por número de latidos
+    order = np.argsort(-counts[:n_templates], kind='stable')
+    relabel = np.empty(n_templates + 1, dtype=np.int32)
+    relabel[order] = np.arange(n_templates)
+    relabel[-1] = -1
+    labels = relabel[labels]
+
+    templates = _unit_templates(sums[order])
+    return {
+        "peaks": peaks,
+        "labels": labels,
+        "correlation": correlation,
+        "shift": shifts,
+        "templates": templates.reshape(n_templates, signal.shape[1], pre + post),
+        "counts": counts[order],
+    }
+
+
+def _unit_templates(sums):
+    """Plantillas de norma unitaria a partir de las sumas de sus latidos."""
+    norms = np.linalg.norm(sums, axis=1, keepdims=True)
+    return (sums / np.where(norms > 0, norms, 1.0)).astype(np.float32)
@@ -1,36 +1,323 @@
-import openai
+"""
+Interpretación de los resultados del ECG mediante un modelo de lenguaje (OpenAI).
+
+Las llamadas se hacen de forma asíncrona en un bucle de eventos compartido por todo
+el proceso (en un hilo en segundo plano), de modo que la interfaz puede mostrar el
+análisis de inmediato y rellenar la interpretación cuando llega. Las respuestas se
+guardan en una caché (TTL + LRU) indexada por el resumen normalizado; las peticiones
+simultáneas con el mismo resumen comparten una única llamada, con un límite de
+concurrencia y un tiempo máximo por llamada.
+
+El backend es configurable con ``ECG_LLM_BACKEND``:
+
+- ``openai`` (por defecto): API de OpenAI. ``OPENAI_API_BASE`` permite apuntar a un
+  servidor compatible, p. ej. el servidor de prueba local
+  (``python -m src.chatgpt_integration --stub-server``).
+- ``stub``: respuesta fija en el propio proceso, sin red.
+"""
+import argparse
+import asyncio
+import json
 import os
-from dotenv import load_dotenv
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src import instrumentation, utils
+
+SYSTEM_PROMPT = "Eres un cardiólogo experto que interpreta resultados de ECG."
+
+
+def normalize_summary(ecg_summary):
+    """
+    Normaliza un resumen para usarlo como clave de caché: elimina la sangría y los
+    espacios redundantes, de modo que dos resúmenes con el mismo contenido coinciden.
+
+    Args:
+        ecg_summary (str): Resumen de los resultados del ECG.
+
+    Returns:
+        str: Resumen normalizado.
+    """
+    lines = (re.sub(r"\s+", " ", line).strip() for line in ecg_summary.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _configure_openai():
+    """Configura las credenciales de OpenAI la primera vez que se usa el backend."""
+    import openai
+
+    if os.getenv("STREAMLIT_ENV") != "cloud":
+        # Cargar las claves desde el archivo .env (para entorno local)
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+    else:
+        # Cargar las claves desde Streamlit Secrets (para Streamlit Cloud)
+        import streamlit as st
+
+        openai.api_key = st.secrets["OPENAI_API_KEY"]
+        openai.organization = st.secrets.get("OPENAI_ORGANIZATION", None)
+    return openai
+
+
+class OpenAIBackend:
+    """
+    Backend asíncrono sobre la API de chat de OpenAI (``openai==0.28``).
+
+    Args:
+        model (str): Modelo de chat.
+        api_base (str): URL base de la API. Por defecto, ``OPENAI_API_BASE`` o la de OpenAI.
+        max_tokens (int): Máximo de tokens de la respuesta.
+        temperature (float): Temperatura de muestreo.
+    """
+
+    def __init__(self, model="gpt-4", api_base=None, max_tokens=100, temperature=0.7):
+        self.model = model
+        self.api_base = api_base or os.getenv("OPENAI_API_BASE")
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self._openai = None
+
+    async def complete(self, messages):
+        if self._openai is None:
+            self._openai = _configure_openai()
+        kwargs = {"api_base": self.api_base} if self.api_base else {}
+        response = await self._openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            **kwargs,
+        )
+        return response['choices'][0]['message']['content']
+
+
+class StubBackend:
+    """
+    Backend local para pruebas: devuelve una respuesta fija tras un retardo opcional.
+
+    Args:
+        delay_s (float): Retardo simulado de la llamada, en segundos.
+        response (str): Texto devuelto.
+    """
+
+    def __init__(self, delay_s=0.0, response="Interpretación de prueba (backend local, sin modelo de lenguaje)."):
+        self.delay_s = delay_s
+        self.response = response
+        self.calls = 0
+
+    async def complete(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.delay_s)
+        return self.response
+
+
+class InterpretationClient:
+    """
+    Cliente asíncrono con caché de respuestas, agrupación de peticiones en vuelo,
+    límite de concurrencia y tiempo máximo por llamada.
+
+    Args:
+        backend: Objeto con un método asíncrono ``complete(messages) -> str``.
+        ttl_s (float): Tiempo de vida de las respuestas en caché, en segundos.
+        max_entries (int): Número máximo de respuestas en caché.
+        max_concurrency (int): Llamadas simultáneas máximas al backend.
+        timeout_s (float): Tiempo máximo de cada llamada, en segundos.
+    """
+
+    def __init__(self, backend, ttl_s=3600, max_entries=256, max_concurrency=4, timeout_s=30):
+        self.backend = backend
+        self.cache = utils.ResultCache(max_entries=max_entries, ttl_s=ttl_s)
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self.backend_calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._semaphore = None
+
+        # Bucle de eventos propio en un hilo en segundo plano, compartido por todas las sesiones
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+
+    async def _call_backend(self, summary):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": summary},
+        ]
+        async with self._semaphore:
+            self.backend_calls += 1
+            with instrumentation.timer("llm.backend"):
+                return await asyncio.wait_for(self.backend.complete(messages), timeout=self.timeout_s)
+
+    async def interpret(self, ecg_summary):
+        """
+        Interpreta un resumen (corrutina, se ejecuta en el bucle del cliente).
+
+        Args:
+            ecg_summary (str): Resumen de los resultados del ECG.
+
+        Returns:
+            str: Interpretación, o un mensaje de error si la llamada falla.
+        """
+        key = utils.content_hash(normalize_summary(ecg_summary).encode("utf-8"))
+        cached = self.cache.get(key)
+        if cached is not None:
+            instrumentation.count("ecg_llm_requests_total", result="cache")
+            return cached
+
+        # Agrupar peticiones idénticas en vuelo: todas esperan la misma tarea
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._loop.create_task(self._call_backend(ecg_summary))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            instrumentation.count("ecg_llm_requests_total", result="backend")
+        else:
+            self.coalesced += 1
+            instrumentation.count("ecg_llm_requests_total", result="coalesced")
+
+        try:
+            response = await asyncio.shield(task)
+        except asyncio.TimeoutError:
+            return f"Error al comunicarse con la API de OpenAI: sin respuesta en {self.timeout_s} s"
+        except Exception as e:
+            return f"Error al comunicarse con la API de OpenAI: {e}"
+
+        # Solo se guardan en caché las respuestas correctas
+        self.cache.put(key, response)
+        return response
+
+    def submit(self, ecg_summary):
+        """
+        Lanza la interpretación sin bloquear.
+
+        Args:
+            ecg_summary (str): Resumen de los resultados del ECG.
+
+        Returns:
+            concurrent.futures.Future: Futuro con la interpretación (str).
+        """
+        return asyncio.run_coroutine_threadsafe(self.interpret(ecg_summary), self._loop)
+
+    def stats(self):
+        """
+        Devuelve los contadores del cliente.
+
+        Returns:
+            dict: Llamadas al backend, peticiones agrupadas, peticiones en vuelo y contadores de la caché.
+        """
+        return {
+            "backend_calls": self.backend_calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "cache": self.cache.stats(),
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Devuelve el cliente compartido por el proceso, creándolo la primera vez con el
+    backend indicado por ``ECG_LLM_BACKEND``.
+
+    Returns:
+        InterpretationClient: Cliente compartido.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            backend = StubBackend() if os.getenv("ECG_LLM_BACKEND") == "stub" else OpenAIBackend()
+            _client = InterpretationClient(
+                backend,
+                ttl_s=float(os.getenv("ECG_LLM_CACHE_TTL", "3600")),
+                max_concurrency=int(os.getenv("ECG_LLM_MAX_CONCURRENCY", "4")),
+                timeout_s=float(os.getenv("ECG_LLM_TIMEOUT", "30")),
+            )
+        return _client
+
+
+def interpret_ecg_results_async(ecg_summary):
+    """
+    Lanza la interpretación de un resumen de ECG sin bloquear.
+
+    Args:
+        ecg_summary (str): Resumen de los resultados del ECG.
+
+    Returns:
+        concurrent.futures.Future: Futuro con la respuesta interpretada por ChatGPT.
+    """
+    return get_client().submit(ecg_summary)
 
-# Cargar las claves desde el archivo .env (para entorno local)
-if os.getenv("STREAMLIT_ENV") != "cloud":
-    load_dotenv()
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-else:
-    # Cargar las claves desde Streamlit Secrets (para Streamlit Cloud)
-    openai.api_key = st.secrets["OPENAI_API_KEY"]
-    openai.organization = st.secrets.get("OPENAI_ORGANIZATION", None)
 
 def interpret_ecg_results(ecg_summary):
     """
     Envía un resumen de los resultados del ECG a la API de OpenAI para obtener una interpretación.
-    
+
     Args:
         ecg_summary (str): Resumen de los resultados del ECG.
 
     Returns:
         str: Respuesta interpretada por ChatGPT.
     """
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Eres un cardiólogo experto que interpreta resultados de ECG."},
-                {"role": "user", "content": ecg_summary}
-            ],
-            max_tokens=100,
-            temperature=0.7
-        )
-        return response['choices'][0]['message']['content']
-    except Exception as e:
-        return f"Error al comunicarse con la API de OpenAI: {e}"
\ No newline at end of file
+    return interpret_ecg_results_async(ecg_summary).result()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Servidor HTTP mínimo compatible con ``/chat/completions`` de OpenAI, para pruebas."""
+
+    delay_s = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.delay_s:
+            threading.Event().wait(self.delay_s)
+        summary = request.get("messages", [{}])[-1].get("content", "")
+        body = json.dumps({
+            "id": "stub",
+            "object": "chat.completion",
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": f"Interpretación de prueba ({len(summary)} caracteres recibidos)."},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local compatible con la API de OpenAI, para pruebas.")
+    parser.add_argument("--stub-server", action="store_true", help="Inicia el servidor de prueba")
+    parser.add_argument("--port", type=int, default=8765, help="Puerto del servidor")
+    parser.add_argument("--delay", type=float, default=0.5, help="Retardo simulado por respuesta, en segundos")
+    args = parser.parse_args(argv)
+    if not args.stub_server:
+        parser.print_help()
+        return
+
+    _StubHandler.delay_s = args.delay
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _StubHandler)
+    print(f"Servidor de prueba en http://127.0.0.1:{args.port} "
+          f"(OPENAI_API_BASE=http://127.0.0.1:{args.port}, OPENAI_API_KEY=cualquiera)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
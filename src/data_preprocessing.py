@@ -1,12 +1,267 @@
+"""
+Preprocesado de señales ECG: diseño de filtros en caché y canalización de etapas.
+
+Los filtros se diseñan en forma de secciones de segundo orden (SOS), numéricamente
+estables a órdenes altos, y se guardan en caché por (tipo, frecuencias de corte,
+orden, fs), de modo que no se rediseñan en cada llamada. Una ``Pipeline`` encadena
+etapas (eliminación de la deriva de la línea base, filtro de red eléctrica y pasa
+banda), concatena sus SOS y filtra todas las derivaciones de un ``p_signal`` 2-D con
+una sola llamada a ``sosfiltfilt`` a lo largo del eje de muestras, opcionalmente en
+float32 y devolviendo el resultado en el propio array de entrada (``sosfiltfilt``
+sigue reservando su propio array de salida, que después se copia en ``out``).
+
+La misma canalización sirve para la aplicación de Streamlit y para los trabajos por
+lotes (``default_pipeline``).
+"""
+from functools import lru_cache
+
 import numpy as np
-from scipy.signal import butter, filtfilt
+
+from src import instrumentation
+
 
 def butter_lowpass(cutoff, fs, order=5):
+    from scipy.signal import butter  # importación diferida: scipy.signal tarda en importarse
+
     nyquist = 0.5 * fs
     normal_cutoff = cutoff / nyquist
     b, a = butter(order, normal_cutoff, btype='low', analog=False)
     return b, a
 
-def filter_ecg(ecg_data, fs, cutoff=0.5):
-    b, a = butter_lowpass(cutoff, fs)
-    return filtfilt(b, a, ecg_data)
+
+@lru_cache(maxsize=128)
+def design_sos(btype, cutoff, fs, order=2):
+    """
+    Diseña (una sola vez por combinación de parámetros) un filtro Butterworth en forma SOS.
+
+    Args:
+        btype (str): ``'lowpass'``, ``'highpass'``, ``'bandpass'`` o ``'bandstop'``.
+        cutoff (float or tuple): Frecuencia de corte en Hz, o (baja, alta) para los filtros de banda.
+        fs (float): Frecuencia de muestreo en Hz.
+        order (int): Orden del filtro.
+
+    Returns:
+        np.ndarray: Coeficientes SOS de solo lectura, compartidos entre llamadas. Las
+                    funciones de ``scipy.signal`` exigen un buffer escribible: se pasa una copia.
+    """
+    from scipy.signal import butter  # importación diferida: scipy.signal tarda en importarse
+
+    sos = butter(order, cutoff, btype=btype, fs=fs, output='sos')
+    sos.setflags(write=False)  # el mismo array se devuelve a todos los llamantes
+    return sos
+
+
+@lru_cache(maxsize=32)
+def design_notch(freq, fs, quality=30.0):
+    """
+    Diseña (una sola vez por combinación de parámetros) un filtro de muesca en forma SOS.
+
+    Args:
+        freq (float): Frecuencia a eliminar en Hz (p. ej. 50 o 60 Hz de la red eléctrica).
+        fs (float): Frecuencia de muestreo en Hz.
+        quality (float): Factor de calidad (anchura de la muesca = ``freq / quality``).
+
+    Returns:
+        np.ndarray: Coeficientes SOS de solo lectura, compartidos entre llamadas. Las
+                    funciones de ``scipy.signal`` exigen un buffer escribible: se pasa una copia.
+    """
+    from scipy.signal import iirnotch, tf2sos  # importación diferida
+
+    sos = tf2sos(*iirnotch(freq, quality, fs=fs))
+    sos.setflags(write=False)  # el mismo array se devuelve a todos los llamantes
+    return sos
+
+
+class BaselineWanderRemoval:
+    """
+    Elimina la deriva de la línea base (respiración, movimiento) con un pasa altos.
+
+    Args:
+        cutoff (float): Frecuencia de corte en Hz.
+        order (int): Orden del filtro.
+    """
+
+    def __init__(self, cutoff=0.5, order=2):
+        self.cutoff = cutoff
+        self.order = order
+
+    def sos(self, fs):
+        return design_sos('highpass', float(self.cutoff), float(fs), self.order)
+
+
+class PowerlineNotch:
+    """
+    Elimina la interferencia de la red eléctrica con un filtro de muesca. La etapa se
+    omite si la frecuencia no está por debajo de la de Nyquist.
+
+    Args:
+        freq (float): Frecuencia de la red en Hz (50 en Europa, 60 en América).
+        quality (float): Factor de calidad de la muesca.
+    """
+
+    def __init__(self, freq=50.0, quality=30.0):
+        self.freq = freq
+        self.quality = quality
+
+    def sos(self, fs):
+        if self.freq >= fs / 2:
+            return None
+        return design_notch(float(self.freq), float(fs), float(self.quality))
+
+
+class BandPass:
+    """
+    Filtro pasa banda. Si ``high`` no está por debajo de la frecuencia de Nyquist se
+    aplica solo el pasa altos; si ``low`` es None, solo el pasa bajos.
+
+    Args:
+        low (float): Frecuencia de corte inferior en Hz, o None.
+        high (float): Frecuencia de corte superior en Hz, o None.
+        order (int): Orden del filtro.
+    """
+
+    def __init__(self, low=0.5, high=40.0, order=4):
+        self.low = low
+        self.high = high
+        self.order = order
+
+    def sos(self, fs):
+        high = self.high if self.high is not None and self.high < fs / 2 else None
+        if self.low is not None and high is not None:
+            return design_sos('bandpass', (float(self.low), float(high)), float(fs), self.order)
+        if self.low is not None:
+            return design_sos('highpass', float(self.low), float(fs), self.order)
+        if high is not None:
+            return design_sos('lowpass', float(high), float(fs), self.order)
+        return None
+
+
+class Pipeline:
+    """
+    Cadena de etapas de filtrado aplicada con una sola pasada de fase cero.
+
+    Cada etapa es cualquier objeto con un método ``sos(fs)`` que devuelve coeficientes
+    SOS (o None para omitirla), lo que permite añadir etapas propias.
+
+    Args:
+        stages (list): Etapas en el orden en que se aplican.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self._sos = {}
+
+    def sos(self, fs, dtype=np.float64):
+        """
+        SOS concatenadas de todas las etapas para ``fs`` (en caché por fs y tipo).
+
+        Returns:
+            np.ndarray: Coeficientes SOS (secciones x 6), o None si no hay etapas activas.
+        """
+        key = (float(fs), np.dtype(dtype).str)
+        if key not in self._sos:
+            sections = [s for s in (stage.sos(fs) for stage in self.stages) if s is not None]
+            self._sos[key] = np.vstack(sections).astype(dtype) if sections else None
+        return self._sos[key]
+
+    @instrumentation.timed(samples=lambda self, signal, fs, axis=0, *args, **kwargs: np.shape(signal)[axis])
+    def apply(self, signal, fs, axis=0, dtype=np.float32, out=None):
+        """
+        Filtra una señal 1-D, o todas las derivaciones de una señal 2-D a la vez.
+
+        Args:
+            signal (np.ndarray): Señal (por defecto, muestras en el eje 0, como ``p_signal``).
+            fs (float): Frecuencia de muestreo en Hz.
+            axis (int): Eje de las muestras.
+            dtype: Tipo de cálculo y de salida. En float32 los coeficientes también se
+                   convierten, de modo que no se crean temporales float64.
+            out (np.ndarray): Array de salida con la forma de ``signal`` y tipo ``dtype``;
+                              puede ser ``signal`` para sobrescribir la entrada. No evita
+                              el array temporal que reserva ``sosfiltfilt``.
+
+        Returns:
+            np.ndarray: Señal filtrada (``out`` si se indica).
+        """
+        dtype = np.dtype(dtype)
+        signal = np.asarray(signal)
+        sos = self.sos(fs, dtype)
+        if sos is None:
+            filtered = signal.astype(dtype, copy=out is None)
+        else:
+            from scipy.signal import sosfiltfilt  # importación diferida
+
+            filtered = sosfiltfilt(sos, signal.astype(dtype, copy=False), axis=axis)
+        if out is None:
+            return filtered
+        out[...] = filtered
+        return out
+
+
+def default_pipeline(powerline_hz=50.0, low=0.5, high=100.0):
+    """
+    Canalización estándar para ECG diagnóstico: deriva de la línea base (pasa altos de
+    ``low`` Hz), muesca de red y pasa bajos de ``high`` Hz (el pasa banda). Con cortes
+    de 40 Hz (ancho de banda de monitorización) el QRS pierde pendiente y la detección
+    de NeuroKit2 omite latidos en derivaciones de baja amplitud.
+
+    Args:
+        powerline_hz (float): Frecuencia de la red eléctrica, o None para omitir la muesca.
+        low (float): Corte del pasa altos en Hz.
+        high (float): Corte del pasa bajos en Hz.
+
+    Returns:
+        Pipeline: Canalización compartida para esos parámetros.
+    """
+    return _default_pipeline(powerline_hz, low, high)
+
+
+@lru_cache(maxsize=8)
+def _default_pipeline(powerline_hz, low, high):
+    stages = [BaselineWanderRemoval(low)]
+    if powerline_hz:
+        stages.append(PowerlineNotch(powerline_hz))
+    stages.append(BandPass(None, high))
+    return Pipeline(stages)
+
+
+def preprocess(signal, fs, axis=0, dtype=np.float32, out=None, pipeline=None):
+    """
+    Aplica la canalización de preprocesado (por defecto, ``default_pipeline()``).
+
+    Args:
+        signal (np.ndarray): Señal 1-D o 2-D (muestras x derivaciones).
+        fs (float): Frecuencia de muestreo en Hz.
+        axis (int): Eje de las muestras.
+        dtype: Tipo de cálculo y de salida.
+        out (np.ndarray): Array de salida (puede ser ``signal`` para sobrescribir la entrada).
+        pipeline (Pipeline): Canalización a usar.
+
+    Returns:
+        np.ndarray: Señal filtrada.
+    """
+    return (pipeline or default_pipeline()).apply(signal, fs, axis=axis, dtype=dtype, out=out)
+
+
+def filter_ecg(ecg_data, fs, cutoff=0.5, order=5, axis=-1):
+    """
+    Filtro pasa bajos Butterworth de fase cero (interfaz original).
+
+    El diseño SOS se guarda en caché y el filtrado es estable a orden alto. Ojo: con el
+    corte por defecto de 0.5 Hz solo se conserva la línea base (el QRS se elimina);
+    para limpiar la señal antes del análisis se usa ``preprocess``.
+
+    Args:
+        ecg_data (np.ndarray): Señal.
+        fs (float): Frecuencia de muestreo en Hz.
+        cutoff (float): Frecuencia de corte en Hz.
+        order (int): Orden del filtro.
+        axis (int): Eje de las muestras (el último por defecto, como ``filtfilt``).
+
+    Returns:
+        np.ndarray: Señal filtrada.
+    """
+    sos = design_sos('lowpass', float(cutoff), float(fs), order).copy()  # escribible para scipy
+    from scipy.signal import sosfiltfilt  # importación diferida
+
+    return sosfiltfilt(sos, ecg_data, axis=axis)
+
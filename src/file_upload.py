@@ -1,11 +1,17 @@
 import os
+import shutil
+import time
 
-def upload_files(uploaded_files):
+# Extensiones de un registro WFDB completo
+RECORD_EXTENSIONS = (".hea", ".mat")
+
+
+def upload_files(uploaded_files, directory="temp_data"):
     mat_file = None
     hea_file = None
 
     for uploaded_file in uploaded_files:
-        file_path = os.path.join("temp_data", uploaded_file.name)
+        file_path = os.path.join(directory, uploaded_file.name)
         with open(file_path, "wb") as f:
             f.write(uploaded_file.getbuffer())
 
@@ -15,3 +21,106 @@ def upload_files(uploaded_files):
             hea_file = file_path
 
     return mat_file, hea_file
+
+
+def pair_record_files(uploaded_files):
+    """
+    Agrupa los archivos subidos por nombre de registro.
+
+    Args:
+        uploaded_files (list): Archivos devueltos por ``st.file_uploader``.
+
+    Returns:
+        dict: Registros completos, nombre -> {".hea": archivo, ".mat": archivo}.
+        list: Nombres de los registros a los que les falta el .hea o el .mat (ordenados).
+    """
+    groups = {}
+    for uploaded_file in uploaded_files:
+        name, ext = os.path.splitext(os.path.basename(uploaded_file.name))
+        if ext in RECORD_EXTENSIONS:
+            groups.setdefault(name, {})[ext] = uploaded_file
+
+    pairs = {name: files for name, files in groups.items() if len(files) == len(RECORD_EXTENSIONS)}
+    incomplete = sorted(name for name in groups if name not in pairs)
+    return pairs, incomplete
+
+
+def session_directory(session_id, base_dir="temp_data"):
+    """
+    Crea (si no existe) el directorio de archivos de una sesión de la aplicación.
+
+    Args:
+        session_id (str): Identificador de la sesión.
+        base_dir (str): Directorio raíz de los archivos temporales.
+
+    Returns:
+        str: Ruta del directorio de la sesión.
+    """
+    directory = os.path.join(base_dir, "sessions", session_id)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _write_atomic(file_path, data):
+    """Escribe ``data`` en un temporal y lo renombra: un lector nunca ve un archivo a medias."""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+
+
+def save_record_files(pairs, directory, hashes=None):
+    """
+    Guarda los archivos de cada registro en ``directory``. Con ``hashes``, junto a cada
+    registro se guarda su hash de contenido (``<nombre>.sha256``) y, si coincide, los
+    archivos no se vuelven a escribir (la página se ejecuta en cada interacción). El
+    tamaño no sirve para esto: todos los .mat de Chapman ocupan lo mismo.
+
+    Args:
+        pairs (dict): Registros completos devueltos por ``pair_record_files``.
+        directory (str): Directorio de destino (p. ej. el de la sesión).
+        hashes (dict): Nombre del registro -> hash de contenido (``utils.hash_uploaded_files``),
+                       o None para escribir siempre.
+
+    Returns:
+        dict: Nombre del registro -> ruta sin extensión (como en ``wfdb.rdrecord``).
+    """
+    paths = {}
+    for name, files in pairs.items():
+        paths[name] = os.path.join(directory, name)
+        record_hash = hashes.get(name) if hashes else None
+        hash_path = os.path.join(directory, f"{name}.sha256")
+        if record_hash is not None and os.path.exists(hash_path):
+            with open(hash_path, encoding="utf-8") as f:
+                if f.read() == record_hash and all(
+                        os.path.exists(os.path.join(directory, f"{name}{ext}")) for ext in files):
+                    continue
+        for ext, uploaded_file in files.items():
+            _write_atomic(os.path.join(directory, f"{name}{ext}"), uploaded_file.getbuffer())
+        if record_hash is not None:
+            # Después de los archivos: si la escritura se interrumpe, se repite en la siguiente ejecución
+            _write_atomic(hash_path, record_hash.encode("utf-8"))
+    return paths
+
+
+def cleanup_sessions(base_dir="temp_data", max_age_s=24 * 3600):
+    """
+    Elimina los directorios de sesión que no se han modificado en ``max_age_s`` segundos.
+
+    Args:
+        base_dir (str): Directorio raíz de los archivos temporales.
+        max_age_s (float): Antigüedad máxima en segundos.
+
+    Returns:
+        int: Número de directorios eliminados.
+    """
+    sessions_dir = os.path.join(base_dir, "sessions")
+    if not os.path.isdir(sessions_dir):
+        return 0
+    removed = 0
+    now = time.time()
+    for entry in os.scandir(sessions_dir):
+        if entry.is_dir() and now - entry.stat().st_mtime > max_age_s:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
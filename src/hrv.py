@@ -0,0 +1,224 @@
+"""
+Análisis vectorizado de intervalos RR y variabilidad de la frecuencia cardíaca (HRV).
+
+Todas las métricas se calculan con sumas acumuladas (sin bucles de Python), de modo
+que escalan a series RR de registros Holter. ``RRStats`` precalcula las sumas
+prefijas una vez; después, las estadísticas de cualquier rango de tiempo (p. ej. el
+rango visible del gráfico) cuestan O(log n).
+
+Los intervalos RR no se filtran: latidos ectópicos o picos mal detectados afectan a
+SDNN, RMSSD y pNN50.
+"""
+import numpy as np
+
+
+def rr_intervals(qrs_indices, fs):
+    """
+    Calcula los intervalos RR en milisegundos.
+
+    Args:
+        qrs_indices (np.ndarray): Índices de los picos R (ordenados).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+
+    Returns:
+        np.ndarray: Intervalos RR en ms (longitud ``len(qrs_indices) - 1``).
+    """
+    qrs_indices = np.asarray(qrs_indices)
+    if len(qrs_indices) < 2:
+        return np.array([])
+    return np.diff(qrs_indices) * (1000 / fs)
+
+
+def instantaneous_hr(qrs_indices, fs):
+    """
+    Frecuencia cardíaca instantánea latido a latido.
+
+    Args:
+        qrs_indices (np.ndarray): Índices de los picos R (ordenados).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+
+    Returns:
+        np.ndarray: Tiempo (ms) de cada latido que cierra un intervalo RR.
+        np.ndarray: Frecuencia cardíaca instantánea (bpm) en esos latidos.
+    """
+    rr_ms = rr_intervals(qrs_indices, fs)
+    if len(rr_ms) == 0:
+        return np.array([]), np.array([])
+    times_ms = np.asarray(qrs_indices[1:]) * (1000 / fs)
+    with np.errstate(divide='ignore'):
+        return times_ms, 60000 / rr_ms
+
+
+def hrv_summary(rr_ms):
+    """
+    Métricas HRV en el dominio del tiempo de una serie RR completa.
+
+    Args:
+        rr_ms (np.ndarray): Intervalos RR en ms.
+
+    Returns:
+        dict: ``n_beats`` (intervalos RR), ``mean_rr_ms``, ``heart_rate_bpm``, ``sdnn_ms``,
+              ``rmssd_ms`` y ``pnn50`` (fracción de diferencias sucesivas > 50 ms).
+              Las métricas que no se pueden calcular valen None.
+    """
+    rr_ms = np.asarray(rr_ms, dtype=float)
+    n = len(rr_ms)
+    summary = dict.fromkeys(["mean_rr_ms", "heart_rate_bpm", "sdnn_ms", "rmssd_ms", "pnn50"])
+    summary["n_beats"] = n
+    if n == 0:
+        return summary
+
+    mean_rr = rr_ms.mean()
+    summary["mean_rr_ms"] = float(mean_rr)
+    summary["heart_rate_bpm"] = float(60000 / mean_rr) if mean_rr > 0 else None
+    if n > 1:
+        summary["sdnn_ms"] = float(rr_ms.std(ddof=1))
+        successive = np.diff(rr_ms)
+        summary["rmssd_ms"] = float(np.sqrt(np.mean(successive ** 2)))
+        summary["pnn50"] = float(np.mean(np.abs(successive) > 50))
+    return summary
+
+
+def _prefix(values):
+    """Suma prefija con un cero inicial: sum(values[i:j]) = p[j] - p[i]."""
+    prefix = np.zeros(len(values) + 1)
+    np.cumsum(values, out=prefix[1:])
+    return prefix
+
+
+class RRStats:
+    """
+    Sumas prefijas sobre la serie RR para consultar estadísticas de cualquier rango
+    de tiempo en O(log n).
+
+    Args:
+        qrs_indices (np.ndarray): Índices de los picos R (ordenados).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        time_ms (np.ndarray): Eje de tiempo de la señal (ms). Si se indica, los tiempos de
+                              los picos se toman de él (como hace ``app.py``); si no,
+                              se usa ``índice / fs``.
+    """
+
+    def __init__(self, qrs_indices, fs, time_ms=None):
+        self.qrs_indices = np.asarray(qrs_indices, dtype=int)
+        self.fs = fs
+        self.peak_times_ms = (np.asarray(time_ms)[self.qrs_indices] if time_ms is not None
+                              else self.qrs_indices * (1000 / fs))
+
+        rr_ms = rr_intervals(self.qrs_indices, fs)
+        successive = np.diff(rr_ms)
+        # Se centra respecto a la media global para evitar la cancelación numérica en la varianza
+        self._center = rr_ms.mean() if len(rr_ms) else 0.0
+        centered = rr_ms - self._center
+        self._rr_sum = _prefix(centered)
+        self._rr_sq = _prefix(centered ** 2)
+        self._succ_sq = _prefix(successive ** 2)
+        self._nn50 = _prefix(np.abs(successive) > 50)
+
+    def range_indices(self, start_ms, end_ms):
+        """
+        Devuelve los índices [i, j) de los picos R cuyo tiempo está en [start_ms, end_ms].
+
+        Args:
+            start_ms (float): Inicio del rango (ms).
+            end_ms (float): Fin del rango (ms).
+
+        Returns:
+            tuple: Índices (i, j) dentro de ``qrs_indices``.
+        """
+        i = int(np.searchsorted(self.peak_times_ms, start_ms, side='left'))
+        j = int(np.searchsorted(self.peak_times_ms, end_ms, side='right'))
+        return i, max(i, j)
+
+    def peaks_in_range(self, start_ms, end_ms):
+        """Índices de muestra de los picos R dentro de [start_ms, end_ms] (vista, sin copia)."""
+        i, j = self.range_indices(start_ms, end_ms)
+        return self.qrs_indices[i:j]
+
+    def summary(self, start_ms=None, end_ms=None):
+        """
+        Métricas HRV de los latidos dentro de [start_ms, end_ms], en O(log n).
+
+        Se usan solo los intervalos RR entre picos consecutivos del rango, igual que
+        ``analysis.calculate_heart_rate`` sobre los picos visibles.
+
+        Args:
+            start_ms (float): Inicio del rango (ms). Por defecto, el inicio del registro.
+            end_ms (float): Fin del rango (ms). Por defecto, el final del registro.
+
+        Returns:
+            dict: Mismas claves que ``hrv_summary`` más ``n_peaks`` (picos R en el rango).
+        """
+        i, j = self.range_indices(-np.inf if start_ms is None else start_ms,
+                                  np.inf if end_ms is None else end_ms)
+        summary = dict.fromkeys(["mean_rr_ms", "heart_rate_bpm", "sdnn_ms", "rmssd_ms", "pnn50"])
+        summary["n_peaks"] = j - i
+
+        # Intervalos RR k = i .. j-2 y diferencias sucesivas k = i .. j-3
+        n = max(0, j - i - 1)
+        summary["n_beats"] = n
+        if n == 0:
+            return summary
+
+        total = self._rr_sum[j - 1] - self._rr_sum[i]
+        mean_rr = self._center + total / n
+        summary["mean_rr_ms"] = float(mean_rr)
+        summary["heart_rate_bpm"] = float(60000 / mean_rr) if mean_rr > 0 else None
+        if n > 1:
+            sq = self._rr_sq[j - 1] - self._rr_sq[i]
+            variance = max(0.0, (sq - total ** 2 / n) / (n - 1))
+            summary["sdnn_ms"] = float(np.sqrt(variance))
+            m = n - 1
+            summary["rmssd_ms"] = float(np.sqrt((self._succ_sq[j - 2] - self._succ_sq[i]) / m))
+            summary["pnn50"] = float((self._nn50[j - 2] - self._nn50[i]) / m)
+        return summary
+
+
+def rolling_hrv(qrs_indices, fs, window_s=300):
+    """
+    Series de frecuencia cardíaca y HRV en una ventana temporal deslizante (hacia atrás),
+    evaluadas en cada latido, en O(n) sumas acumuladas más una búsqueda binaria vectorizada.
+
+    Args:
+        qrs_indices (np.ndarray): Índices de los picos R (ordenados).
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        window_s (float): Duración de la ventana, en segundos (p. ej. 300 s para HRV de 5 min).
+
+    Returns:
+        dict: ``time_ms`` (tiempo del latido que cierra cada intervalo RR), ``heart_rate_bpm``,
+              ``sdnn_ms``, ``rmssd_ms`` y ``pnn50`` para la ventana que termina en cada latido
+              (NaN donde la ventana no tiene suficientes intervalos).
+    """
+    rr_ms = rr_intervals(qrs_indices, fs)
+    n = len(rr_ms)
+    if n == 0:
+        empty = np.array([])
+        return {"time_ms": empty, "heart_rate_bpm": empty, "sdnn_ms": empty, "rmssd_ms": empty, "pnn50": empty}
+
+    times_ms = np.asarray(qrs_indices[1:]) * (1000 / fs)
+    # Primer intervalo RR que cae completamente dentro de la ventana que termina en cada latido
+    interval_start_ms = np.asarray(qrs_indices[:-1]) * (1000 / fs)
+    first = np.searchsorted(interval_start_ms, times_ms - window_s * 1000, side='left')
+    last = np.arange(1, n + 1)  # exclusivo
+    count = last - first
+
+    center = rr_ms.mean()
+    centered = rr_ms - center
+    rr_sum, rr_sq = _prefix(centered), _prefix(centered ** 2)
+    successive = np.diff(rr_ms)
+    succ_sq, nn50 = _prefix(successive ** 2), _prefix(np.abs(successive) > 50)
+
+    total = rr_sum[last] - rr_sum[first]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_rr = center + total / count
+        heart_rate = 60000 / mean_rr
+        variance = np.maximum(0.0, (rr_sq[last] - rr_sq[first] - total ** 2 / count) / (count - 1))
+        sdnn = np.where(count > 1, np.sqrt(variance), np.nan)
+
+        # Diferencias sucesivas dentro de la ventana: k = first .. last-2
+        m = count - 1
+        succ_last = np.maximum(last - 1, first)
+        rmssd = np.where(m > 0, np.sqrt((succ_sq[succ_last] - succ_sq[first]) / m), np.nan)
+        pnn50 = np.where(m > 0, (nn50[succ_last] - nn50[first]) / m, np.nan)
+
+    return {"time_ms": times_ms, "heart_rate_bpm": heart_rate, "sdnn_ms": sdnn, "rmssd_ms": rmssd, "pnn50": pnn50}
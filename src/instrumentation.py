@@ -0,0 +1,452 @@
+"""
+Métricas de rendimiento de las etapas del análisis: latencia, muestras procesadas y errores.
+
+Las funciones costosas se marcan con el decorador ``timed`` (o un bloque ``with timer(...)``)
+y cada llamada registra, por etapa:
+
+- Un histograma de latencia (``ecg_stage_seconds``) con buckets fijos, más las últimas
+  ``RECENT_SIZE`` duraciones para los percentiles del panel de depuración.
+- Las muestras procesadas (``ecg_stage_samples_total``), si la etapa las indica.
+- Los errores por tipo de excepción (``ecg_stage_errors_total``); la excepción se propaga.
+
+Las métricas se exportan en el formato de texto de Prometheus: ``render_prometheus()``,
+un archivo (``ECG_METRICS_FILE``, escrito de forma atómica, válido para el textfile
+collector de node_exporter) o un endpoint HTTP ``/metrics`` (``ECG_METRICS_PORT``, que
+la aplicación y ``src.batch`` inician con ``serve_from_env``). Ni el endpoint ni el archivo
+se usan en los procesos de un pool: solo el proceso principal escucha en el puerto y
+escribe el archivo.
+
+Desactivadas (por defecto), cada llamada instrumentada solo comprueba un booleano. Se
+activan con ``ECG_METRICS=1`` (o definiendo el archivo o el puerto) o con ``enable()``.
+Cada proceso tiene su propio registro: las etapas que se ejecutan en un pool de procesos
+se envían al proceso principal con ``take`` y ``merge`` (como hace ``src.batch``).
+"""
+import atexit
+import bisect
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Límites superiores de los buckets del histograma de latencia, en segundos
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Duraciones recientes por etapa para los percentiles del panel de depuración
+RECENT_SIZE = 1024
+
+_enabled = any(os.getenv(name, "") not in ("", "0") for name in ("ECG_METRICS", "ECG_METRICS_FILE", "ECG_METRICS_PORT"))
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_gauges = {}
+_server = None
+
+
+class _Stage:
+    """Histograma de latencia, muestras y errores de una etapa."""
+
+    __slots__ = ("buckets", "count", "sum", "max", "samples", "errors", "recent")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = 0
+        self.errors = {}
+        self.recent = deque(maxlen=RECENT_SIZE)
+
+
+def enabled():
+    """True si las métricas se están registrando."""
+    return _enabled
+
+
+def enable(flag=True):
+    """
+    Activa o desactiva el registro de métricas en este proceso.
+
+    Args:
+        flag (bool): True para activar, False para desactivar.
+    """
+    global _enabled
+    _enabled = bool(flag)
+
+
+def reset():
+    """Borra todas las métricas registradas (los indicadores registrados se mantienen)."""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def take():
+    """
+    Devuelve y borra las métricas registradas en este proceso, para enviarlas al
+    proceso principal desde un proceso del pool (que las suma con ``merge``).
+
+    Returns:
+        dict: Etapas y contadores (serializable con pickle), o None si no hay nada registrado.
+    """
+    with _lock:
+        if not _stages and not _counters:
+            return None
+        state = {"stages": dict(_stages), "counters": dict(_counters)}
+        _stages.clear()
+        _counters.clear()
+    return state
+
+
+def merge(state):
+    """
+    Suma a este proceso las métricas devueltas por ``take`` en otro proceso.
+
+    Args:
+        state (dict): Resultado de ``take`` (None no hace nada).
+    """
+    if not state or not _enabled:
+        return
+    with _lock:
+        for stage, other in state["stages"].items():
+            entry = _stages.get(stage)
+            if entry is None:
+                entry = _stages[stage] = _Stage()
+            entry.buckets = [a + b for a, b in zip(entry.buckets, other.buckets)]
+            entry.count += other.count
+            entry.sum += other.sum
+            entry.max = max(entry.max, other.max)
+            entry.samples += other.samples
+            entry.recent.extend(other.recent)
+            for error, n in other.errors.items():
+                entry.errors[error] = entry.errors.get(error, 0) + n
+        for key, value in state["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(stage, seconds, samples=0, error=None):
+    """
+    Registra una ejecución de una etapa (lo que hacen ``timed`` y ``timer``).
+
+    Args:
+        stage (str): Nombre de la etapa, p. ej. ``"analysis.detect_peaks_consensus"``.
+        seconds (float): Duración en segundos.
+        samples (int): Muestras procesadas.
+        error (str): Tipo de la excepción si la ejecución falló, o None.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        entry = _stages.get(stage)
+        if entry is None:
+            entry = _stages[stage] = _Stage()
+        entry.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        entry.count += 1
+        entry.sum += seconds
+        entry.max = max(entry.max, seconds)
+        entry.samples += samples
+        entry.recent.append(seconds)
+        if error is not None:
+            entry.errors[error] = entry.errors.get(error, 0) + 1
+
+
+def count(name, value=1, **labels):
+    """
+    Incrementa un contador (p. ej. ``count("ecg_llm_requests_total", result="cache")``).
+
+    Args:
+        name (str): Nombre de la métrica en formato Prometheus (terminado en ``_total``).
+        value (float): Incremento.
+        **labels: Etiquetas de la serie.
+    """
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def record_error(stage, exc):
+    """
+    Cuenta un error capturado y mostrado al usuario (p. ej. con ``st.error``) sin medir
+    la duración.
+
+    Args:
+        stage (str): Etapa o lugar donde se capturó.
+        exc (BaseException): Excepción capturada.
+    """
+    count("ecg_errors_total", stage=stage, exception=type(exc).__name__)
+
+
+def register_gauges(prefix, collect):
+    """
+    Registra indicadores que se leen al exportar (p. ej. los contadores de una caché).
+
+    Args:
+        prefix (str): Prefijo de las métricas (``"ecg_result_cache"``).
+        collect (callable): Función sin argumentos que devuelve un dict nombre -> número.
+    """
+    with _lock:
+        _gauges[prefix] = collect
+
+
+class _Timer:
+    """Bloque ``with`` de ``timer`` con las métricas activadas."""
+
+    __slots__ = ("stage", "samples", "_start")
+
+    def __init__(self, stage, samples):
+        self.stage = stage
+        self.samples = samples
+        self._start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.stage, time.perf_counter() - self._start, self.samples,
+                None if exc_type is None else exc_type.__name__)
+        return False
+
+
+class _NullTimer:
+    """Bloque ``with`` compartido que no mide nada (métricas desactivadas)."""
+
+    samples = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(stage, samples=0):
+    """
+    Bloque ``with`` que mide una etapa.
+
+    Args:
+        stage (str): Nombre de la etapa.
+        samples (int): Muestras procesadas (se puede fijar dentro del bloque con ``.samples``).
+
+    Returns:
+        Gestor de contexto; con las métricas desactivadas, uno compartido que no hace nada.
+
+    Ejemplo:
+        with instrumentation.timer("llm.backend"):
+            response = await backend.complete(messages)
+    """
+    return _Timer(stage, samples) if _enabled else _NULL_TIMER
+
+
+def timed(stage=None, samples=None):
+    """
+    Decorador que mide cada llamada a la función como una etapa.
+
+    Args:
+        stage (str): Nombre de la etapa. Por defecto, ``<módulo>.<función>`` sin ``src.``.
+        samples (callable): Función que recibe los mismos argumentos y devuelve las muestras
+                            procesadas (solo se evalúa con las métricas activadas).
+
+    Returns:
+        callable: Decorador.
+    """
+    def decorator(func):
+        module = func.__module__
+        module = module[len("src."):] if module.startswith("src.") else module
+        name = stage or f"{module}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                observe(name, time.perf_counter() - start, error=type(e).__name__)
+                raise
+            n = samples(*args, **kwargs) if samples is not None else 0
+            observe(name, time.perf_counter() - start, n)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def n_samples(signal, *args, **kwargs):
+    """Muestras de la señal del primer argumento (``samples=`` de ``timed``)."""
+    return len(signal)
+
+
+def snapshot():
+    """
+    Resumen por etapa para el panel de depuración.
+
+    Returns:
+        dict: Columnas (etapa, llamadas, errores, media, p50, p95 y máximo en ms, muestras/s),
+              ordenadas por tiempo total.
+    """
+    with _lock:
+        rows = [(stage, entry.count, sum(entry.errors.values()), entry.sum, entry.max, entry.samples,
+                 np.array(entry.recent)) for stage, entry in _stages.items()]
+    rows.sort(key=lambda row: -row[3])
+    return {
+        "stage": [row[0] for row in rows],
+        "calls": [row[1] for row in rows],
+        "errors": [row[2] for row in rows],
+        "total_s": [row[3] for row in rows],
+        "mean_ms": [1000 * row[3] / row[1] if row[1] else None for row in rows],
+        "p50_ms": [1000 * float(np.percentile(row[6], 50)) if len(row[6]) else None for row in rows],
+        "p95_ms": [1000 * float(np.percentile(row[6], 95)) if len(row[6]) else None for row in rows],
+        "max_ms": [1000 * row[4] for row in rows],
+        "samples_per_s": [row[5] / row[3] if row[5] and row[3] else None for row in rows],
+    }
+
+
+def _labels(**labels):
+    """Etiquetas en formato Prometheus, con los valores escapados."""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_prometheus():
+    """
+    Todas las métricas en el formato de texto de Prometheus (versión 0.0.4).
+
+    Returns:
+        str: Texto de exposición.
+    """
+    with _lock:
+        stages = {stage: (list(entry.buckets), entry.count, entry.sum, entry.samples, dict(entry.errors))
+                  for stage, entry in sorted(_stages.items())}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    lines = ["# HELP ecg_stage_seconds Duración de cada etapa del análisis.",
+             "# TYPE ecg_stage_seconds histogram"]
+    for stage, (buckets, n, total, _, _) in stages.items():
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+            cumulative += bucket
+            lines.append(f"ecg_stage_seconds_bucket{_labels(stage=stage, le=bound)} {cumulative}")
+        lines.append(f"ecg_stage_seconds_sum{_labels(stage=stage)} {total!r}")
+        lines.append(f"ecg_stage_seconds_count{_labels(stage=stage)} {n}")
+
+    lines += ["# HELP ecg_stage_samples_total Muestras procesadas por cada etapa.",
+              "# TYPE ecg_stage_samples_total counter"]
+    lines += [f"ecg_stage_samples_total{_labels(stage=stage)} {values[3]}"
+              for stage, values in stages.items() if values[3]]
+
+    lines += ["# HELP ecg_stage_errors_total Ejecuciones de cada etapa terminadas con una excepción.",
+              "# TYPE ecg_stage_errors_total counter"]
+    for stage, values in stages.items():
+        lines += [f"ecg_stage_errors_total{_labels(stage=stage, exception=exception)} {n}"
+                  for exception, n in sorted(values[4].items())]
+
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        lines += [f"{name}{_labels(**dict(labels))} {value}"
+                  for (series, labels), value in sorted(counters.items()) if series == name]
+
+    for prefix, collect in sorted(gauges.items()):
+        try:
+            values = collect()
+        except Exception:
+            continue
+        for name, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def dump(path=None):
+    """
+    Escribe las métricas en un archivo de forma atómica (``.tmp`` + ``os.replace``).
+
+    Args:
+        path (str): Archivo de destino. Por defecto, ``ECG_METRICS_FILE``.
+
+    Returns:
+        str: Ruta escrita, o None si no hay archivo configurado o las métricas están desactivadas.
+    """
+    path = path or os.getenv("ECG_METRICS_FILE")
+    if not path or not _enabled:
+        return None
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+    return path
+
+
+def serve(port, host="127.0.0.1"):
+    """
+    Inicia (una sola vez por proceso) el endpoint ``GET /metrics`` con el texto de
+    ``render_prometheus`` en un hilo en segundo plano.
+
+    Args:
+        port (int): Puerto TCP.
+        host (str): Dirección de escucha.
+
+    Returns:
+        ThreadingHTTPServer: Servidor en marcha.
+    """
+    # http.server solo se importa si se usa el endpoint
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
+
+
+def serve_from_env():
+    """
+    Inicia el endpoint ``/metrics`` en ``ECG_METRICS_PORT`` (y ``ECG_METRICS_HOST``) si está
+    definido. No hace nada en los procesos de un pool (``spawn`` reimporta este módulo en
+    cada proceso y todos intentarían escuchar en el mismo puerto).
+
+    Returns:
+        ThreadingHTTPServer: Servidor en marcha, o None.
+    """
+    port = os.getenv("ECG_METRICS_PORT")
+    if not port or multiprocessing.parent_process() is not None:
+        return None
+    return serve(int(port), os.getenv("ECG_METRICS_HOST", "127.0.0.1"))
+
+
+if os.getenv("ECG_METRICS_FILE") and multiprocessing.parent_process() is None:
+    # Los procesos de un pool envían sus métricas con ``take``: no sobrescriben el archivo
+    atexit.register(dump)
@@ -0,0 +1,254 @@
+"""
+Clasificación de arritmias latido a latido con inferencia por lotes en CPU.
+
+Los registros se segmentan en ventanas de longitud fija alrededor de cada pico R;
+las ventanas se copian directamente en un buffer de entrada preasignado y se
+clasifican en lotes grandes. El modelo se carga una sola vez por proceso
+(``load_classifier``) y se elige el backend según la extensión del archivo:
+
+- ``.npz``: perceptrón multicapa en NumPy (formato del modelo de prueba incluido).
+- ``.onnx``: ONNX Runtime (``pip install onnxruntime``).
+- ``.keras`` / ``.h5`` / directorio SavedModel: TensorFlow.
+
+Los modelos ONNX y TensorFlow necesitan un archivo JSON junto al modelo
+(``<modelo>.json``) con ``fs``, ``pre_s``, ``post_s``, ``n_leads`` y ``labels``.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from src import instrumentation
+
+# Modelo de prueba incluido en el repositorio: pesos aleatorios deterministas, sin valor
+# clínico. Sirve para ejercitar la segmentación, los lotes y los benchmarks sin conexión.
+TEST_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "models", "tiny_beat_classifier.npz")
+
+_classifiers = {}
+_classifiers_lock = threading.Lock()
+
+
+class _NumpyBackend:
+    """Perceptrón multicapa (ReLU + softmax) cuyos pesos se guardan en un .npz."""
+
+    def __init__(self, weights, num_threads):
+        self.layers = []
+        i = 0
+        while f"W{i}" in weights:
+            self.layers.append((weights[f"W{i}"].astype(np.float32), weights[f"b{i}"].astype(np.float32)))
+            i += 1
+        self.num_threads = num_threads
+        self._scratch = {}
+
+        # Límite de hilos de BLAS mediante threadpoolctl (opcional); el controlador se crea una
+        # sola vez porque inspeccionar las bibliotecas cargadas es costoso
+        self._controller = None
+        if num_threads:
+            try:
+                from threadpoolctl import ThreadpoolController
+            except ImportError:
+                pass
+            else:
+                self._controller = ThreadpoolController()
+
+    def _run(self, batch):
+        x = batch.reshape(len(batch), -1)
+        for k, (w, b) in enumerate(self.layers):
+            # Buffers intermedios reutilizados entre lotes del mismo tamaño
+            out = self._scratch.get((k, len(x)))
+            if out is None:
+                out = self._scratch[(k, len(x))] = np.empty((len(x), w.shape[1]), dtype=np.float32)
+            np.matmul(x, w, out=out)
+            out += b
+            if k < len(self.layers) - 1:
+                np.maximum(out, 0, out=out)
+            x = out
+        x = x - x.max(axis=1, keepdims=True)
+        np.exp(x, out=x)
+        x /= x.sum(axis=1, keepdims=True)
+        return x
+
+    def predict(self, batch):
+        if self._controller is not None:
+            with self._controller.limit(limits=self.num_threads):
+                return self._run(batch)
+        return self._run(batch)
+
+
+class _OnnxBackend:
+    """Sesión de ONNX Runtime en CPU con número de hilos configurable."""
+
+    def __init__(self, path, num_threads):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("Los modelos .onnx requieren onnxruntime: pip install onnxruntime") from e
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class _TensorflowBackend:
+    """Modelo Keras/SavedModel de TensorFlow ejecutado en CPU."""
+
+    def __init__(self, path, num_threads):
+        import tensorflow as tf
+
+        if num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+                tf.config.threading.set_inter_op_parallelism_threads(1)
+            except RuntimeError:
+                pass  # TensorFlow ya inicializado en este proceso: se mantiene la configuración existente
+        self.model = tf.keras.models.load_model(path, compile=False)
+
+    def predict(self, batch):
+        return np.asarray(self.model(batch, training=False))
+
+
+class BeatClassifier:
+    """
+    Clasificador de latidos con segmentación alrededor de los picos R e inferencia por lotes.
+
+    Args:
+        model_path (str): Ruta del modelo (.npz, .onnx, .keras/.h5 o directorio SavedModel).
+        batch_size (int): Latidos por lote de inferencia.
+        num_threads (int): Hilos de CPU para la inferencia. None usa el valor del backend.
+    """
+
+    def __init__(self, model_path=TEST_MODEL_PATH, batch_size=1024, num_threads=None):
+        self.model_path = model_path
+        self.batch_size = batch_size
+
+        if model_path.endswith(".npz"):
+            with np.load(model_path, allow_pickle=False) as data:
+                weights = dict(data)
+            metadata = json.loads(str(weights.pop("metadata")))
+            self._backend = _NumpyBackend(weights, num_threads)
+        else:
+            with open(f"{model_path.rstrip(os.sep)}.json", encoding="utf-8") as f:
+                metadata = json.load(f)
+            if model_path.endswith(".onnx"):
+                self._backend = _OnnxBackend(model_path, num_threads)
+            else:
+                self._backend = _TensorflowBackend(model_path, num_threads)
+
+        self.fs = metadata["fs"]
+        self.n_leads = metadata.get("n_leads", 1)
+        self.labels = list(metadata["labels"])
+        self.label_names = metadata.get("label_names", self.labels)
+        pre = int(round(metadata["pre_s"] * self.fs))
+        post = int(round(metadata["post_s"] * self.fs))
+        self._model_offsets = np.arange(-pre, post)
+        self.window = pre + post
+
+        # Buffer de entrada preasignado: (lote, derivaciones, muestras)
+        self._buffer = np.empty((batch_size, self.n_leads, self.window), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def _offsets(self, fs):
+        """Desplazamientos de la ventana en muestras del registro (remuestreo al vecino más cercano)."""
+        if fs == self.fs:
+            return self._model_offsets
+        return np.round(self._model_offsets * (fs / self.fs)).astype(int)
+
+    def predict_proba(self, signal, qrs_indices, fs):
+        """
+        Probabilidades por latido para los picos R cuya ventana cabe entera en la señal.
+
+        Args:
+            signal (np.ndarray): Señal 1-D o 2-D (muestras x derivaciones, ``n_leads`` columnas).
+            qrs_indices (np.ndarray): Índices de los picos R.
+            fs (int): Frecuencia de muestreo de la señal en Hz.
+
+        Returns:
+            np.ndarray: Índices de los picos R clasificados.
+            np.ndarray: Probabilidades (latidos x etiquetas).
+        """
+        signal = np.asarray(signal, dtype=np.float32)
+        if signal.ndim == 1:
+            signal = signal[:, np.newaxis]
+        if signal.shape[1] != self.n_leads:
+            raise ValueError(f"El modelo espera {self.n_leads} derivación(es) y la señal tiene {signal.shape[1]}.")
+        # Traspuesta contigua (derivaciones x muestras): np.take recoge las ventanas directamente en el buffer
+        leads_first = np.ascontiguousarray(signal.T)
+
+        offsets = self._offsets(fs)
+        qrs_indices = np.asarray(qrs_indices, dtype=int)
+        valid = (qrs_indices + offsets[0] >= 0) & (qrs_indices + offsets[-1] < signal.shape[0])
+        beats = qrs_indices[valid]
+
+        probs = np.empty((len(beats), len(self.labels)), dtype=np.float32)
+        with self._lock:
+            for start in range(0, len(beats), self.batch_size):
+                batch_peaks = beats[start:start + self.batch_size]
+                n = len(batch_peaks)
+                buffer = self._buffer[:n]
+                positions = batch_peaks[:, np.newaxis] + offsets[np.newaxis, :]
+                for lead in range(self.n_leads):
+                    np.take(leads_first[lead], positions, out=buffer[:, lead, :])
+
+                # Normalización por latido (media cero, desviación unitaria), en el sitio
+                buffer -= buffer.mean(axis=2, keepdims=True)
+                buffer /= buffer.std(axis=2, keepdims=True) + 1e-6
+
+                probs[start:start + n] = self._backend.predict(buffer)
+        return beats, probs
+
+    @instrumentation.timed(samples=lambda self, signal, qrs_indices, fs: len(signal))
+    def classify_record(self, signal, qrs_indices, fs):
+        """
+        Clasifica cada latido y el registro completo (media de las probabilidades por latido).
+
+        Args:
+            signal (np.ndarray): Señal 1-D o 2-D (muestras x derivaciones).
+            qrs_indices (np.ndarray): Índices de los picos R.
+            fs (int): Frecuencia de muestreo de la señal en Hz.
+
+        Returns:
+            dict: ``beat_indices``, ``beat_labels`` y ``beat_probs`` por latido;
+                  ``record_label`` y ``record_probs`` (dict etiqueta -> probabilidad)
+                  para el registro. ``record_label`` es None si no hay latidos clasificables.
+        """
+        beats, probs = self.predict_proba(signal, qrs_indices, fs)
+        labels = np.asarray(self.labels)
+        result = {
+            "beat_indices": beats,
+            "beat_labels": labels[probs.argmax(axis=1)] if len(beats) else np.array([], dtype=labels.dtype),
+            "beat_probs": probs,
+            "record_label": None,
+            "record_probs": {},
+        }
+        if len(beats):
+            record_probs = probs.mean(axis=0)
+            result["record_label"] = self.labels[int(record_probs.argmax())]
+            result["record_probs"] = dict(zip(self.labels, record_probs.tolist()))
+        return result
+
+
+def load_classifier(model_path=None, batch_size=1024, num_threads=None):
+    """
+    Devuelve el clasificador de ``model_path``, cargándolo una sola vez por proceso.
+
+    Args:
+        model_path (str): Ruta del modelo. Por defecto, ``ECG_MODEL_PATH`` o el modelo de prueba.
+        batch_size (int): Latidos por lote de inferencia.
+        num_threads (int): Hilos de CPU para la inferencia.
+
+    Returns:
+        BeatClassifier: Clasificador compartido.
+    """
+    model_path = model_path or os.getenv("ECG_MODEL_PATH") or TEST_MODEL_PATH
+    key = (os.path.abspath(model_path), batch_size, num_threads)
+    with _classifiers_lock:
+        if key not in _classifiers:
+            _classifiers[key] = BeatClassifier(model_path, batch_size=batch_size, num_threads=num_threads)
+        return _classifiers[key]
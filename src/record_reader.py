@@ -0,0 +1,285 @@
+"""
+Lector de registros WFDB de 16 bits (.hea/.mat) sin copias.
+
+La cabecera .hea se interpreta directamente (ganancia, línea base, nombres de las
+derivaciones, formato ``16+<offset>``) y la carga útil del .mat se expone como una
+vista int16 (``np.memmap`` sobre el archivo, o ``np.frombuffer`` sobre los bytes
+subidos). Las muestras se escalan a mV de forma perezosa, solo para la derivación o
+la ventana solicitada, y en float32.
+"""
+import os
+import re
+
+import numpy as np
+
+from src import instrumentation
+
+# Formatos WFDB soportados: 16 bits con signo, little-endian
+_SUPPORTED_FORMATS = {"16": "<i2"}
+
+# Ganancia con línea base opcional y unidades, p. ej. "1000/mV", "200(-12)/mV" o "1000"
+_GAIN_RE = re.compile(r"^(?P<gain>[-+0-9.eE]+)(?:\((?P<baseline>[-+0-9]+)\))?(?:/(?P<units>.+))?$")
+
+
+def parse_header(text):
+    """
+    Interpreta el contenido de una cabecera WFDB (.hea) de un solo segmento.
+
+    Args:
+        text (str): Contenido del archivo .hea.
+
+    Returns:
+        dict: ``record_name``, ``n_sig``, ``fs``, ``n_samples``, ``file_name``, ``fmt``,
+              ``byte_offset``, ``sig_name``, ``gain``, ``baseline``, ``units`` y ``comments``.
+
+    Raises:
+        ValueError: Si la cabecera está incompleta o usa un formato no soportado.
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    comments = [line.lstrip("#").strip() for line in lines if line.startswith("#")]
+    lines = [line for line in lines if line and not line.startswith("#")]
+    if not lines:
+        raise ValueError("Cabecera WFDB vacía.")
+
+    record_line = lines[0].split()
+    if len(record_line) < 2 or "/" in record_line[0]:
+        raise ValueError(f"Línea de registro no válida o multisegmento: {lines[0]!r}")
+    n_sig = int(record_line[1])
+    fs = float(record_line[2].split("/")[0]) if len(record_line) > 2 else 250.0
+    n_samples = int(record_line[3]) if len(record_line) > 3 else None
+
+    signal_lines = lines[1:1 + n_sig]
+    if len(signal_lines) != n_sig:
+        raise ValueError(f"La cabecera declara {n_sig} señales pero describe {len(signal_lines)}.")
+
+    file_names, formats, offsets = set(), set(), set()
+    sig_name, gain, baseline, units = [], [], [], []
+    for i, line in enumerate(signal_lines):
+        fields = line.split()
+        file_names.add(fields[0])
+
+        fmt, _, offset = fields[1].partition("+")
+        fmt = fmt.split("x")[0].split(":")[0]
+        formats.add(fmt)
+        offsets.add(int(offset) if offset else 0)
+
+        # Ganancia y línea base (por defecto, la línea base es el cero del ADC)
+        match = _GAIN_RE.match(fields[2]) if len(fields) > 2 else None
+        adc_zero = int(fields[4]) if len(fields) > 4 else 0
+        signal_gain = float(match.group("gain")) if match else 200.0
+        gain.append(signal_gain if signal_gain != 0 else 200.0)
+        baseline.append(int(match.group("baseline")) if match and match.group("baseline") else adc_zero)
+        units.append(match.group("units") if match and match.group("units") else "mV")
+
+        sig_name.append(" ".join(fields[8:]) if len(fields) > 8 else f"ch{i + 1}")
+
+    if len(file_names) != 1 or len(formats) != 1 or len(offsets) != 1:
+        raise ValueError("Solo se soportan registros con todas las señales en un único archivo y formato.")
+    fmt = formats.pop()
+    if fmt not in _SUPPORTED_FORMATS:
+        raise ValueError(f"Formato WFDB no soportado: {fmt} (soportados: {sorted(_SUPPORTED_FORMATS)}).")
+
+    return {
+        "record_name": record_line[0],
+        "n_sig": n_sig,
+        "fs": int(fs) if fs.is_integer() else fs,
+        "n_samples": n_samples,
+        "file_name": file_names.pop(),
+        "fmt": fmt,
+        "byte_offset": offsets.pop(),
+        "sig_name": sig_name,
+        "gain": np.asarray(gain, dtype=np.float64),
+        "baseline": np.asarray(baseline, dtype=np.float64),
+        "units": units,
+        "comments": comments,
+    }
+
+
+class MappedRecord:
+    """
+    Registro WFDB cuyas muestras digitales se mantienen como una vista int16
+    (``n_samples x n_sig``) sobre el archivo o los bytes originales.
+
+    Args:
+        header (dict): Cabecera interpretada por ``parse_header``.
+        digital (np.ndarray): Vista int16 de las muestras (muestras x derivaciones).
+    """
+
+    def __init__(self, header, digital):
+        self.header = header
+        self.record_name = header["record_name"]
+        self.fs = header["fs"]
+        self.sig_name = header["sig_name"]
+        self.units = header["units"]
+        self.comments = header["comments"]
+        self.gain = header["gain"]
+        self.baseline = header["baseline"]
+        self.digital = digital
+
+    @property
+    def n_samples(self):
+        return self.digital.shape[0]
+
+    @property
+    def n_sig(self):
+        return self.digital.shape[1]
+
+    def _lead_index(self, lead):
+        return self.sig_name.index(lead) if isinstance(lead, str) else int(lead)
+
+    def lead(self, lead, start=0, stop=None, dtype=np.float32):
+        """
+        Devuelve una derivación en unidades físicas (mV), solo para ``[start, stop)``.
+
+        Args:
+            lead (int or str): Índice o nombre de la derivación.
+            start (int): Primera muestra.
+            stop (int): Muestra final (exclusiva). Por defecto, el final del registro.
+            dtype: Tipo de salida (float32 por defecto).
+
+        Returns:
+            np.ndarray: Array 1-D con la señal escalada.
+        """
+        i = self._lead_index(lead)
+        values = self.digital[start:stop, i].astype(dtype)
+        values -= self.baseline[i]
+        values /= self.gain[i]
+        return values
+
+    def window(self, start=0, stop=None, leads=None, dtype=np.float32):
+        """
+        Devuelve una ventana de varias derivaciones en unidades físicas (mV).
+
+        Args:
+            start (int): Primera muestra.
+            stop (int): Muestra final (exclusiva). Por defecto, el final del registro.
+            leads (list): Índices o nombres de las derivaciones. Por defecto, todas.
+            dtype: Tipo de salida (float32 por defecto).
+
+        Returns:
+            np.ndarray: Array 2-D (muestras x derivaciones) con la señal escalada.
+        """
+        if leads is None:
+            columns = slice(None)
+            baseline, gain = self.baseline, self.gain
+        else:
+            columns = [self._lead_index(lead) for lead in leads]
+            baseline, gain = self.baseline[columns], self.gain[columns]
+
+        values = self.digital[start:stop, columns].astype(dtype)
+        # Los parámetros se convierten al tipo de salida para operar en el sitio sin temporales
+        values -= baseline.astype(dtype)
+        values /= gain.astype(dtype)
+        return values
+
+    @property
+    def p_signal(self):
+        """Señal completa en mV (float32), equivalente a ``wfdb.rdrecord(...).p_signal``."""
+        return self.window()
+
+    def __getstate__(self):
+        # Las vistas sobre memmap/bytes no se pueden serializar: se copian las muestras
+        return {"header": self.header, "digital": np.array(self.digital)}
+
+    def __setstate__(self, state):
+        self.__init__(state["header"], state["digital"])
+
+
+def _digital_view(header, buffer_or_path, payload_size):
+    """Crea la vista int16 (muestras x derivaciones) sobre un archivo o un buffer."""
+    dtype = np.dtype(_SUPPORTED_FORMATS[header["fmt"]])
+    n_sig, offset = header["n_sig"], header["byte_offset"]
+    available = (payload_size - offset) // (dtype.itemsize * n_sig)
+    n_samples = header["n_samples"] if header["n_samples"] is not None else available
+    if n_samples > available:
+        raise ValueError(
+            f"El archivo de señal contiene {available} muestras por derivación, "
+            f"pero la cabecera declara {n_samples}."
+        )
+
+    if isinstance(buffer_or_path, (str, os.PathLike)):
+        return np.memmap(buffer_or_path, dtype=dtype, mode="r", offset=offset, shape=(n_samples, n_sig))
+    flat = np.frombuffer(buffer_or_path, dtype=dtype, count=n_samples * n_sig, offset=offset)
+    return flat.reshape(n_samples, n_sig)
+
+
+def open_record(record_name):
+    """
+    Abre un registro WFDB desde disco mapeando en memoria su archivo de señal.
+
+    Args:
+        record_name (str): Ruta del registro sin extensión (como en ``wfdb.rdrecord``).
+
+    Returns:
+        MappedRecord: Registro con las muestras mapeadas en memoria (sin leerlas).
+    """
+    with open(f"{record_name}.hea", encoding="utf-8") as f:
+        header = parse_header(f.read())
+    signal_path = os.path.join(os.path.dirname(record_name), header["file_name"])
+    return MappedRecord(header, _digital_view(header, signal_path, os.path.getsize(signal_path)))
+
+
+@instrumentation.timed()
+def read_record(record_name):
+    """
+    Abre un registro WFDB desde disco con ``open_record`` y, si el formato no está
+    soportado, recurre a wfdb (que solo se importa en ese caso).
+
+    Args:
+        record_name (str): Ruta del registro sin extensión.
+
+    Returns:
+        MappedRecord: Registro abierto.
+    """
+    try:
+        return open_record(record_name)
+    except ValueError:
+        import wfdb
+
+        with instrumentation.timer("record_reader.wfdb_rdrecord"):
+            return from_wfdb(wfdb.rdrecord(record_name, physical=False))
+
+
+@instrumentation.timed()
+def open_record_bytes(hea_bytes, mat_buffer):
+    """
+    Abre un registro WFDB a partir de los bytes en memoria (p. ej. archivos subidos
+    con Streamlit), sin copiar la carga útil del .mat.
+
+    Args:
+        hea_bytes (bytes): Contenido del archivo .hea.
+        mat_buffer (bytes or memoryview): Contenido del archivo .mat (p. ej. ``uploaded_file.getbuffer()``).
+
+    Returns:
+        MappedRecord: Registro cuyas muestras son una vista sobre ``mat_buffer``.
+    """
+    header = parse_header(bytes(hea_bytes).decode("utf-8"))
+    return MappedRecord(header, _digital_view(header, mat_buffer, memoryview(mat_buffer).nbytes))
+
+
+def from_wfdb(record):
+    """
+    Adapta un registro leído con ``wfdb.rdrecord(..., physical=False)`` a la interfaz
+    de ``MappedRecord``, para los formatos que este lector no soporta.
+
+    Args:
+        record (wfdb.Record): Registro con ``d_signal`` cargado.
+
+    Returns:
+        MappedRecord: Registro con las muestras digitales de wfdb.
+    """
+    header = {
+        "record_name": record.record_name,
+        "n_sig": record.n_sig,
+        "fs": record.fs,
+        "n_samples": record.sig_len,
+        "file_name": record.file_name[0] if record.file_name else None,
+        "fmt": record.fmt[0] if record.fmt else None,
+        "byte_offset": 0,
+        "sig_name": list(record.sig_name),
+        "gain": np.asarray(record.adc_gain, dtype=np.float64),
+        "baseline": np.asarray(record.baseline, dtype=np.float64),
+        "units": list(record.units),
+        "comments": list(record.comments),
+    }
+    return MappedRecord(header, record.d_signal)
@@ -0,0 +1,225 @@
+"""
+Sesiones con varios registros: todos los registros subidos se analizan en segundo
+plano en un pool compartido por todo el proceso, y la aplicación muestra el progreso
+y una tabla resumen (frecuencia cardíaca, picos R y alertas por registro) mientras el
+usuario revisa cualquiera de ellos en detalle.
+
+El tipo de pool se elige con ``ECG_SESSION_EXECUTOR`` (``thread`` por defecto, o
+``process``) y su tamaño con ``ECG_SESSION_WORKERS`` (por defecto, núcleos de CPU).
+Los resúmenes se guardan en ``utils.result_cache`` por hash de contenido, de modo que
+el mismo registro subido en otra sesión no se vuelve a analizar.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from src import analysis, data_preprocessing, hrv, instrumentation, record_reader, utils
+
+SUMMARY_COLUMNS = [
+    "record", "status", "heart_rate_bpm", "n_peaks", "sdnn_ms", "rmssd_ms", "alerts",
+    "duration_s", "n_leads", "age", "sex", "dx", "error",
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Devuelve el pool compartido por el proceso, creándolo la primera vez.
+
+    Returns:
+        concurrent.futures.Executor: Pool de hilos o de procesos.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.getenv("ECG_SESSION_WORKERS", "0")) or os.cpu_count() or 1
+            if os.getenv("ECG_SESSION_EXECUTOR") == "process":
+                # "spawn": el servidor de Streamlit tiene hilos en marcha y fork no es seguro
+                _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ecg-session")
+        return _executor
+
+
+@instrumentation.timed()
+def summarize_record(record_path, powerline_hz=None):
+    """
+    Analiza un registro completo: picos R de consenso entre derivaciones (ponderado por
+    la calidad de cada derivación), frecuencia cardíaca, HRV y alertas.
+
+    Args:
+        record_path (str): Ruta del registro sin extensión.
+        powerline_hz (float): Si se indica, la señal se preprocesa con ``default_pipeline(powerline_hz)``.
+
+    Returns:
+        dict: Una fila con las columnas de ``SUMMARY_COLUMNS`` (``status`` = ``"ok"`` o ``"error"``).
+    """
+    name = os.path.basename(record_path)
+    try:
+        record = record_reader.read_record(record_path)
+        signal, fs = record.p_signal, record.fs
+        if powerline_hz:
+            data_preprocessing.preprocess(signal, fs, out=signal,
+                                          pipeline=data_preprocessing.default_pipeline(powerline_hz))
+
+        detection = analysis.detect_peaks_consensus(signal, fs)
+        per_lead_peaks, consensus = detection["per_lead_peaks"], detection["peaks"]
+        stats = hrv.RRStats(consensus, fs).summary()
+    except Exception as e:
+        return {**dict.fromkeys(SUMMARY_COLUMNS), "record": name, "status": "error", "error": str(e)}
+
+    alerts = []
+    heart_rate = stats["heart_rate_bpm"]
+    if heart_rate is None:
+        alerts.append("Picos R insuficientes")
+    elif heart_rate < 60:
+        alerts.append("Bradicardia")
+    elif heart_rate > 100:
+        alerts.append("Taquicardia")
+    missing = [lead for lead, peaks in zip(record.sig_name, per_lead_peaks) if len(peaks) == 0]
+    if missing:
+        alerts.append(f"Sin picos R en {', '.join(missing)}")
+    low_quality = [lead for lead, quality, peaks in zip(record.sig_name, detection["quality"], per_lead_peaks)
+                   if quality < analysis.MIN_LEAD_QUALITY and len(peaks) > 0]
+    if low_quality:
+        alerts.append(f"Baja calidad en {', '.join(low_quality)}")
+
+    metadata = utils.parse_header_comments(record.comments)
+    return {
+        "record": name,
+        "status": "ok",
+        "heart_rate_bpm": heart_rate,
+        "n_peaks": int(len(consensus)),
+        "sdnn_ms": stats["sdnn_ms"],
+        "rmssd_ms": stats["rmssd_ms"],
+        "alerts": "; ".join(alerts),
+        "duration_s": record.n_samples / fs,
+        "n_leads": record.n_sig,
+        "age": metadata.get("age"),
+        "sex": metadata.get("sex"),
+        "dx": ",".join(metadata.get("dx", [])),
+        "error": None,
+    }
+
+
+def _summarize_in_pool(record_path, powerline_hz, collect_metrics):
+    """
+    ``summarize_record`` dentro del pool. En un pool de procesos devuelve también las
+    métricas del proceso (``instrumentation.take``) para sumarlas en el principal, como
+    ``batch._analyze_chunk``; en un pool de hilos ya se registran en el propio proceso.
+    """
+    row = summarize_record(record_path, powerline_hz)
+    return row, instrumentation.take() if collect_metrics else None
+
+
+class SessionAnalysis:
+    """
+    Análisis en segundo plano de los registros de una sesión.
+
+    Args:
+        executor (concurrent.futures.Executor): Pool a usar. Por defecto, ``get_executor()``.
+        cache (utils.ResultCache): Caché de resúmenes. Por defecto, ``utils.result_cache``.
+    """
+
+    def __init__(self, executor=None, cache=None):
+        self.executor = executor or get_executor()
+        self.cache = cache or utils.result_cache
+        self._jobs = {}  # nombre del registro -> (clave de caché, futuro)
+
+    def submit(self, name, record_path, record_hash, powerline_hz=None):
+        """
+        Encola un registro (si no estaba ya encolado con el mismo contenido y parámetros).
+
+        Args:
+            name (str): Nombre del registro.
+            record_path (str): Ruta del registro sin extensión.
+            record_hash (str): Hash de contenido del registro.
+            powerline_hz (float): Preprocesado (ver ``summarize_record``).
+
+        Returns:
+            concurrent.futures.Future: Futuro con (fila resumen, métricas del proceso del pool o None).
+        """
+        key = utils.make_key(record_hash, "summary", powerline_hz=powerline_hz)
+        job = self._jobs.get(name)
+        if job is not None and job[0] == key:
+            return job[1]
+
+        missing = object()
+        cached = self.cache.get(key, missing)
+        if cached is not missing:
+            future = Future()
+            future.set_result((cached, None))
+        else:
+            collect_metrics = isinstance(self.executor, ProcessPoolExecutor)
+            future = self.executor.submit(_summarize_in_pool, record_path, powerline_hz, collect_metrics)
+            future.add_done_callback(lambda f: self._finished(key, f))
+        self._jobs[name] = (key, future)
+        return future
+
+    def _finished(self, key, future):
+        # Los futuros cancelados por ``retain`` no tienen resultado (``exception()`` lanzaría CancelledError)
+        if future.cancelled() or future.exception() is not None:
+            return
+        row, metrics = future.result()
+        instrumentation.merge(metrics)
+        self.cache.put(key, row)
+
+    def retain(self, names):
+        """Olvida los registros que ya no forman parte de la sesión (y cancela los pendientes)."""
+        for name in set(self._jobs) - set(names):
+            self._jobs.pop(name)[1].cancel()
+
+    def progress(self):
+        """
+        Returns:
+            tuple: (registros terminados, registros totales).
+        """
+        return sum(future.done() for _, future in self._jobs.values()), len(self._jobs)
+
+    def done(self):
+        finished, total = self.progress()
+        return finished == total
+
+    def summary(self):
+        """
+        Tabla resumen de la sesión, una fila por registro (ordenadas por nombre). Los
+        registros pendientes aparecen con ``status`` = ``"en cola"``.
+
+        Returns:
+            list of dict: Filas con las columnas de ``SUMMARY_COLUMNS``.
+        """
+        rows = []
+        for name in sorted(self._jobs):
+            future = self._jobs[name][1]
+            if not future.done():
+                rows.append({**dict.fromkeys(SUMMARY_COLUMNS), "record": name, "status": "en cola"})
+            elif future.cancelled() or future.exception() is not None:
+                error = "cancelado" if future.cancelled() else str(future.exception())
+                rows.append({**dict.fromkeys(SUMMARY_COLUMNS), "record": name, "status": "error", "error": error})
+            else:
+                rows.append(future.result()[0])
+        return rows
+
+
+def summary_arrays(rows):
+    """
+    Convierte la tabla resumen en columnas (dict de listas), el formato que aceptan
+    ``st.dataframe`` y ``pandas.DataFrame``. Los valores numéricos ausentes pasan a NaN
+    para que las columnas se puedan ordenar.
+
+    Args:
+        rows (list of dict): Filas devueltas por ``SessionAnalysis.summary``.
+
+    Returns:
+        dict: Columna -> lista de valores.
+    """
+    numeric = {"heart_rate_bpm", "sdnn_ms", "rmssd_ms", "duration_s"}
+    return {
+        column: [np.nan if column in numeric and row[column] is None else row[column] for row in rows]
+        for column in SUMMARY_COLUMNS
+    }
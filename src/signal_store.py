@@ -0,0 +1,488 @@
+"""
+Almacén columnar comprimido de registros WFDB para conjuntos de datos completos.
+
+``ingest`` convierte un directorio de pares .hea/.mat en un almacén con tres archivos:
+
+- ``signals.bin``: las muestras digitales (int16, sin pérdidas) de todos los registros,
+  uno detrás de otro, en bloques de ``chunk_samples`` muestras. Cada bloque se guarda
+  por derivaciones, con codificación delta y zlib: la señal ECG varía poco entre
+  muestras consecutivas y las diferencias se comprimen mucho mejor que las muestras.
+- ``index.npz``: la tabla de metadatos en columnas (nombre, fs, muestras, edad, sexo,
+  diagnósticos SNOMED en formato CSR...), los parámetros de cada derivación y la tabla
+  de bloques (posición y tamaño en ``signals.bin``).
+- ``store.json``: versión del formato y parámetros de la codificación.
+
+Las consultas de cohortes (``SignalStore.query``) son operaciones vectorizadas sobre
+las columnas, sin abrir ningún registro. Las lecturas leen de una vez los bloques
+contiguos de cada registro, y ``iter_records`` lee varios registros por operación en
+el orden del archivo: las lecturas masivas son secuenciales.
+
+Uso:
+    python -m src.signal_store ingest data/raw_data -o almacen_ecg --workers 4
+    python -m src.signal_store query almacen_ecg --dx 164889003 --age-min 80
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+
+import numpy as np
+
+from src import instrumentation, record_reader, utils
+
+FORMAT_VERSION = 1
+CODECS = ("zlib", "none")
+
+# Bytes leídos como máximo por operación en las lecturas masivas
+_READ_BLOCK_BYTES = 64 * 2**20
+
+
+def encode_chunk(digital, codec="zlib", level=1):
+    """
+    Codifica un bloque de muestras digitales (muestras x derivaciones, int16).
+
+    Returns:
+        bytes: Bloque codificado.
+    """
+    leads_first = np.ascontiguousarray(np.asarray(digital, dtype=np.int16).T)
+    if codec == "none":
+        return leads_first.tobytes()
+    # Delta por derivación (con desbordamiento modular de int16: es reversible)
+    delta = np.empty_like(leads_first)
+    delta[:, :1] = leads_first[:, :1]
+    np.subtract(leads_first[:, 1:], leads_first[:, :-1], out=delta[:, 1:])
+    return zlib.compress(delta, level)
+
+
+def decode_chunk(data, n_rows, n_sig, codec="zlib", out=None):
+    """
+    Decodifica un bloque de ``encode_chunk``.
+
+    Args:
+        data (bytes or memoryview): Bloque codificado.
+        n_rows (int): Muestras del bloque.
+        n_sig (int): Derivaciones.
+        codec (str): Codificación del almacén.
+        out (np.ndarray): Destino (muestras x derivaciones, int16); por defecto, un array nuevo.
+
+    Returns:
+        np.ndarray: Muestras digitales (muestras x derivaciones, int16).
+    """
+    if out is None:
+        out = np.empty((n_rows, n_sig), dtype=np.int16)
+    if codec == "none":
+        out[...] = np.frombuffer(data, dtype=np.int16).reshape(n_sig, n_rows).T
+        return out
+    delta = np.frombuffer(zlib.decompress(data), dtype=np.int16).reshape(n_sig, n_rows)
+    np.cumsum(delta, axis=1, dtype=np.int16, out=out.T)
+    return out
+
+
+def _encode_record(input_dir, record, chunk_samples, codec, level):
+    """Lee y codifica un registro dentro de un proceso del pool."""
+    try:
+        rec = record_reader.read_record(os.path.join(input_dir, record))
+        digital = rec.digital
+        chunks = [encode_chunk(digital[start:start + chunk_samples], codec, level)
+                  for start in range(0, rec.n_samples, chunk_samples)]
+    except Exception as e:
+        return record, None, str(e)
+    header = {
+        "fs": rec.fs,
+        "n_samples": rec.n_samples,
+        "sig_name": list(rec.sig_name),
+        "gain": np.asarray(rec.gain, dtype=np.float64),
+        "baseline": np.asarray(rec.baseline, dtype=np.float64),
+        "units": list(rec.units),
+        "comments": list(rec.comments or []),
+    }
+    return record, (header, chunks), None
+
+
+def ingest(input_dir, output, workers=None, chunk_samples=65536, codec="zlib", level=1, overwrite=False):
+    """
+    Convierte todos los registros WFDB de ``input_dir`` en un almacén.
+
+    Los registros se leen y codifican en paralelo en un ``ProcessPoolExecutor`` y se
+    escriben en orden en ``signals.bin``; el índice se escribe al final. Los registros
+    que no se pueden leer se omiten y se devuelven en ``errors``.
+
+    Args:
+        input_dir (str): Directorio raíz con los pares .hea/.mat.
+        output (str): Directorio del almacén.
+        workers (int): Número de procesos. Por defecto, ``os.cpu_count()``.
+        chunk_samples (int): Muestras por bloque.
+        codec (str): ``"zlib"`` o ``"none"`` (sin comprimir).
+        level (int): Nivel de compresión de zlib (1 = el más rápido).
+        overwrite (bool): Si es True, se reemplaza un almacén existente.
+
+    Returns:
+        dict: Registros guardados, errores (registro -> mensaje), bytes de entrada y
+              de salida, y tiempo (s).
+    """
+    from src.batch import find_records
+
+    if codec not in CODECS:
+        raise ValueError(f"Codificación no soportada: {codec} (soportadas: {CODECS}).")
+    if os.path.exists(output):
+        if not overwrite:
+            raise FileExistsError(f"El almacén {output} ya existe (usa overwrite=True para reemplazarlo).")
+        shutil.rmtree(output)
+    os.makedirs(output)
+
+    records = find_records(input_dir)
+    workers = workers or os.cpu_count() or 1
+    columns = {name: [] for name in ("record", "fs", "n_samples", "n_sig", "age", "sex", "comments")}
+    leads = {name: [] for name in ("sig_name", "gain", "baseline", "units")}
+    dx_codes, dx_index, dx_ptr = {}, [], [0]
+    chunk_offset, chunk_nbytes, chunk_rows, chunk_ptr = [], [], [], [0]
+    errors = {}
+    input_bytes = position = 0
+
+    start = time.perf_counter()
+    with open(os.path.join(output, "signals.bin"), "wb") as signals, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        record_iter = iter(records)
+        in_flight = {}
+        submitted = next_index = 0
+        results = {}
+        while True:
+            # Registros en vuelo acotados; se escriben en el orden de ``records``
+            while len(in_flight) < 2 * workers:
+                record = next(record_iter, None)
+                if record is None:
+                    break
+                future = executor.submit(_encode_record, input_dir, record, chunk_samples, codec, level)
+                in_flight[future] = submitted
+                submitted += 1
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[in_flight.pop(future)] = future.result()
+
+            while next_index in results:
+                record, encoded, error = results.pop(next_index)
+                next_index += 1
+                if error is not None:
+                    errors[record] = error
+                    continue
+                header, chunks = encoded
+                metadata = utils.parse_header_comments(header["comments"])
+                columns["record"].append(record)
+                columns["fs"].append(header["fs"])
+                columns["n_samples"].append(header["n_samples"])
+                columns["n_sig"].append(len(header["sig_name"]))
+                columns["age"].append(-1 if metadata.get("age") is None else metadata["age"])
+                columns["sex"].append(metadata.get("sex") or "")
+                columns["comments"].append("\n".join(header["comments"]))
+                for name in leads:
+                    leads[name].extend(header[name])
+                for code in metadata.get("dx", []):
+                    dx_index.append(dx_codes.setdefault(code, len(dx_codes)))
+                dx_ptr.append(len(dx_index))
+
+                for i, chunk in enumerate(chunks):
+                    signals.write(chunk)
+                    chunk_offset.append(position)
+                    chunk_nbytes.append(len(chunk))
+                    chunk_rows.append(min(chunk_samples, header["n_samples"] - i * chunk_samples))
+                    position += len(chunk)
+                chunk_ptr.append(len(chunk_offset))
+                input_bytes += header["n_samples"] * len(header["sig_name"]) * 2
+                elapsed = time.perf_counter() - start
+                print(f"[{next_index}/{len(records)}] {next_index / elapsed:.1f} registros/s",
+                      file=sys.stderr, flush=True)
+
+    n_sig = np.asarray(columns["n_sig"], dtype=np.int16)
+    index = {
+        "record": np.asarray(columns["record"], dtype=str),
+        "fs": np.asarray(columns["fs"], dtype=np.float64),
+        "n_samples": np.asarray(columns["n_samples"], dtype=np.int64),
+        "n_sig": n_sig,
+        "age": np.asarray(columns["age"], dtype=np.int16),
+        "sex": np.asarray(columns["sex"], dtype=str),
+        "comments": np.asarray(columns["comments"], dtype=str),
+        "lead_ptr": np.concatenate([[0], np.cumsum(n_sig, dtype=np.int64)]),
+        "sig_name": np.asarray(leads["sig_name"], dtype=str),
+        "gain": np.asarray(leads["gain"], dtype=np.float64),
+        "baseline": np.asarray(leads["baseline"], dtype=np.float64),
+        "units": np.asarray(leads["units"], dtype=str),
+        "dx_codes": np.asarray(list(dx_codes), dtype=str),
+        "dx_index": np.asarray(dx_index, dtype=np.int32),
+        "dx_ptr": np.asarray(dx_ptr, dtype=np.int64),
+        "chunk_offset": np.asarray(chunk_offset, dtype=np.int64),
+        "chunk_nbytes": np.asarray(chunk_nbytes, dtype=np.int64),
+        "chunk_rows": np.asarray(chunk_rows, dtype=np.int64),
+        "chunk_ptr": np.asarray(chunk_ptr, dtype=np.int64),
+    }
+    np.savez(os.path.join(output, "index.npz"), **index)
+    with open(os.path.join(output, "store.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": FORMAT_VERSION, "codec": codec, "level": level, "chunk_samples": chunk_samples}, f)
+
+    return {
+        "records": len(columns["record"]),
+        "errors": errors,
+        "input_bytes": input_bytes,
+        "output_bytes": position,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class SignalStore:
+    """
+    Almacén creado con ``ingest``: consultas de cohortes sobre la tabla de metadatos y
+    lecturas de señales por registro o masivas.
+
+    Args:
+        path (str): Directorio del almacén.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "store.json"), encoding="utf-8") as f:
+            self.config = json.load(f)
+        if self.config["version"] != FORMAT_VERSION:
+            raise ValueError(f"Versión de almacén no soportada: {self.config['version']}.")
+        self.codec = self.config["codec"]
+        with np.load(os.path.join(path, "index.npz"), allow_pickle=False) as index:
+            self.index = dict(index)
+        self.names = self.index["record"]
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        # Registro al que pertenece cada diagnóstico (para las consultas por diagnóstico)
+        self._dx_record = np.repeat(np.arange(len(self.names)), np.diff(self.index["dx_ptr"]))
+        self._signals_path = os.path.join(path, "signals.bin")
+
+    def __len__(self):
+        return len(self.names)
+
+    def position(self, record):
+        """Posición de un registro (nombre o posición) en el almacén."""
+        return self._positions[record] if isinstance(record, str) else int(record)
+
+    def query(self, dx=None, dx_match="any", age_min=None, age_max=None, sex=None, fs=None,
+              min_duration_s=None):
+        """
+        Registros que cumplen todos los criterios indicados, sin leer ninguna señal.
+
+        Args:
+            dx (str or list of str): Código(s) de diagnóstico SNOMED.
+            dx_match (str): ``"any"`` (alguno de los códigos) o ``"all"`` (todos).
+            age_min (int): Edad mínima (incluida). Los registros sin edad se excluyen.
+            age_max (int): Edad máxima (incluida). Los registros sin edad se excluyen.
+            sex (str): Sexo (``"Male"``/``"Female"``, sin distinguir mayúsculas).
+            fs (float): Frecuencia de muestreo exacta en Hz.
+            min_duration_s (float): Duración mínima en segundos.
+
+        Returns:
+            np.ndarray: Posiciones de los registros (ordenadas), p. ej. para ``self.names[ids]``.
+        """
+        index = self.index
+        mask = np.ones(len(self), dtype=bool)
+        if age_min is not None:
+            mask &= index["age"] >= age_min
+        if age_max is not None:
+            mask &= (index["age"] >= 0) & (index["age"] <= age_max)
+        if sex is not None:
+            mask &= np.char.lower(index["sex"]) == sex.lower()
+        if fs is not None:
+            mask &= index["fs"] == fs
+        if min_duration_s is not None:
+            mask &= index["n_samples"] >= min_duration_s * index["fs"]
+        if dx is not None:
+            codes = np.atleast_1d(np.asarray(dx, dtype=str))
+            wanted = np.flatnonzero(np.isin(index["dx_codes"], codes))
+            hits = np.bincount(self._dx_record[np.isin(index["dx_index"], wanted)], minlength=len(self))
+            mask &= hits >= (len(codes) if dx_match == "all" else 1)
+        return np.flatnonzero(mask)
+
+    def table(self, ids=None):
+        """
+        Tabla de metadatos en columnas (dict de listas), como ``session.summary_arrays``.
+
+        Args:
+            ids (np.ndarray): Posiciones de los registros. Por defecto, todos.
+
+        Returns:
+            dict: Columna -> lista de valores.
+        """
+        ids = np.arange(len(self)) if ids is None else np.asarray(ids)
+        index = self.index
+        dx_ptr, dx_codes = index["dx_ptr"], index["dx_codes"]
+        return {
+            "record": index["record"][ids].tolist(),
+            "age": [None if age < 0 else int(age) for age in index["age"][ids]],
+            "sex": index["sex"][ids].tolist(),
+            "dx": [",".join(dx_codes[index["dx_index"][dx_ptr[i]:dx_ptr[i + 1]]]) for i in ids],
+            "fs": index["fs"][ids].tolist(),
+            "n_sig": index["n_sig"][ids].tolist(),
+            "duration_s": (index["n_samples"][ids] / index["fs"][ids]).tolist(),
+        }
+
+    def _header(self, i):
+        """Cabecera con el formato de ``record_reader.parse_header``."""
+        index = self.index
+        leads = slice(index["lead_ptr"][i], index["lead_ptr"][i + 1])
+        fs = float(index["fs"][i])
+        comments = str(index["comments"][i])
+        return {
+            "record_name": str(self.names[i]),
+            "n_sig": int(index["n_sig"][i]),
+            "fs": int(fs) if fs.is_integer() else fs,
+            "n_samples": int(index["n_samples"][i]),
+            "file_name": "signals.bin",
+            "fmt": "16",
+            "byte_offset": 0,
+            "sig_name": index["sig_name"][leads].tolist(),
+            "gain": index["gain"][leads],
+            "baseline": index["baseline"][leads],
+            "units": index["units"][leads].tolist(),
+            "comments": comments.split("\n") if comments else [],
+        }
+
+    def _decode(self, i, data, data_offset, first, last, out):
+        """Decodifica los bloques ``[first, last)`` del registro ``i`` en ``out`` a partir de ``data``."""
+        index = self.index
+        n_sig = int(index["n_sig"][i])
+        row = 0
+        for chunk in range(first, last):
+            start = index["chunk_offset"][chunk] - data_offset
+            n_rows = int(index["chunk_rows"][chunk])
+            decode_chunk(data[start:start + index["chunk_nbytes"][chunk]], n_rows, n_sig, self.codec,
+                         out=out[row:row + n_rows])
+            row += n_rows
+        return out
+
+    @instrumentation.timed("signal_store.SignalStore.record")
+    def record(self, record, start=0, stop=None):
+        """
+        Lee un registro (o el intervalo ``[start, stop)``) leyendo solo los bloques necesarios.
+
+        Args:
+            record (str or int): Nombre o posición del registro.
+            start (int): Primera muestra.
+            stop (int): Muestra final (exclusiva). Por defecto, el final del registro.
+
+        Returns:
+            record_reader.MappedRecord: Registro con las muestras digitales del intervalo
+            (``p_signal``, ``lead``, ``window``... como los registros leídos de disco).
+        """
+        i = self.position(record)
+        header = self._header(i)
+        n_samples = header["n_samples"]
+        stop = n_samples if stop is None else min(stop, n_samples)
+        start = max(0, min(start, stop))
+
+        chunk_samples = self.config["chunk_samples"]
+        base = self.index["chunk_ptr"][i]
+        first = base + start // chunk_samples
+        last = base + -(-stop // chunk_samples) if stop > start else first
+        digital = np.empty(((last - first) * chunk_samples, header["n_sig"]), dtype=np.int16)
+        if last > first:
+            offset = self.index["chunk_offset"][first]
+            size = self.index["chunk_offset"][last - 1] + self.index["chunk_nbytes"][last - 1] - offset
+            with open(self._signals_path, "rb") as f:
+                data = os.pread(f.fileno(), int(size), int(offset))
+            self._decode(i, memoryview(data), offset, first, last, digital)
+        skip = start - (first - base) * chunk_samples
+        header["n_samples"] = stop - start
+        return record_reader.MappedRecord(header, digital[skip:skip + stop - start])
+
+    def iter_records(self, ids=None):
+        """
+        Lectura masiva: recorre los registros en el orden del archivo, leyendo varios
+        registros contiguos en cada operación (hasta 64 MiB).
+
+        Args:
+            ids (np.ndarray): Posiciones de los registros (p. ej. de ``query``). Por defecto, todos.
+
+        Yields:
+            record_reader.MappedRecord: Cada registro completo, en orden de posición.
+        """
+        index = self.index
+        ids = np.arange(len(self)) if ids is None else np.unique(np.asarray(ids, dtype=np.int64))
+        if len(ids) == 0:
+            return
+        chunk_ptr = index["chunk_ptr"]
+        starts = index["chunk_offset"][chunk_ptr[ids]]
+        ends = np.where(chunk_ptr[ids + 1] > chunk_ptr[ids],
+                        index["chunk_offset"][np.maximum(chunk_ptr[ids + 1] - 1, 0)]
+                        + index["chunk_nbytes"][np.maximum(chunk_ptr[ids + 1] - 1, 0)], starts)
+
+        with open(self._signals_path, "rb") as f:
+            group = 0
+            while group < len(ids):
+                # Registros consecutivos cuyo rango de bytes cabe en una lectura
+                stop = group + 1
+                while stop < len(ids) and ends[stop] - starts[group] <= _READ_BLOCK_BYTES \
+                        and ids[stop] == ids[stop - 1] + 1:
+                    stop += 1
+                data = memoryview(os.pread(f.fileno(), int(ends[stop - 1] - starts[group]), int(starts[group])))
+                for k in range(group, stop):
+                    i = ids[k]
+                    header = self._header(i)
+                    digital = np.empty((header["n_samples"], header["n_sig"]), dtype=np.int16)
+                    self._decode(i, data, starts[group], chunk_ptr[i], chunk_ptr[i + 1], digital)
+                    yield record_reader.MappedRecord(header, digital)
+                group = stop
+
+
+@lru_cache(maxsize=8)
+def open_store(path):
+    """Abre un almacén una sola vez por proceso (el índice se comparte entre llamadas)."""
+    return SignalStore(path)
+
+
+def is_store(path):
+    """True si ``path`` es un directorio de almacén creado con ``ingest``."""
+    return os.path.isfile(os.path.join(path, "store.json"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Convierte un directorio de registros WFDB en un almacén")
+    ingest_parser.add_argument("input_dir", help="Directorio con los registros WFDB (.hea/.mat)")
+    ingest_parser.add_argument("-o", "--output", required=True, help="Directorio del almacén")
+    ingest_parser.add_argument("--workers", type=int, default=None, help="Número de procesos (por defecto, núcleos de CPU)")
+    ingest_parser.add_argument("--chunk-samples", type=int, default=65536, help="Muestras por bloque")
+    ingest_parser.add_argument("--codec", choices=CODECS, default="zlib", help="Codificación de los bloques")
+    ingest_parser.add_argument("--level", type=int, default=1, help="Nivel de compresión de zlib (1-9)")
+    ingest_parser.add_argument("--overwrite", action="store_true", help="Reemplazar el almacén si existe")
+
+    query_parser = commands.add_parser("query", help="Lista los registros de una cohorte")
+    query_parser.add_argument("store", help="Directorio del almacén")
+    query_parser.add_argument("--dx", nargs="+", default=None, help="Códigos de diagnóstico SNOMED")
+    query_parser.add_argument("--dx-match", choices=["any", "all"], default="any",
+                              help="Alguno o todos los diagnósticos")
+    query_parser.add_argument("--age-min", type=int, default=None, help="Edad mínima")
+    query_parser.add_argument("--age-max", type=int, default=None, help="Edad máxima")
+    query_parser.add_argument("--sex", default=None, help="Sexo (Male/Female)")
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        summary = ingest(args.input_dir, args.output, workers=args.workers, chunk_samples=args.chunk_samples,
+                         codec=args.codec, level=args.level, overwrite=args.overwrite)
+        ratio = summary["input_bytes"] / summary["output_bytes"] if summary["output_bytes"] else 0
+        print(f"Registros: {summary['records']} (errores: {len(summary['errors'])}), "
+              f"{summary['input_bytes'] / 2**20:.1f} MiB -> {summary['output_bytes'] / 2**20:.1f} MiB "
+              f"(x{ratio:.1f}), tiempo: {summary['seconds']:.1f} s")
+        for record, error in summary["errors"].items():
+            print(f"  {record}: {error}", file=sys.stderr)
+    else:
+        store = SignalStore(args.store)
+        ids = store.query(dx=args.dx, dx_match=args.dx_match, age_min=args.age_min, age_max=args.age_max,
+                          sex=args.sex)
+        for row in zip(*store.table(ids).values()):
+            print("\t".join("" if value is None else str(value) for value in row))
+        print(f"{len(ids)} de {len(store)} registros", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
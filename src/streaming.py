@@ -0,0 +1,252 @@
+"""
+Detección de picos R en tiempo real para señales ECG recibidas por bloques
+(p. ej. monitores de cabecera).
+
+``StreamingPeakDetector`` es causal: conserva entre llamadas el estado del filtro
+(``sosfilt`` con ``zi``), la energía QRS reciente, los umbrales adaptativos estilo
+Pan-Tompkins y el periodo refractario, de modo que el resultado no depende del
+tamaño de los bloques. ``replay_record`` reproduce un registro almacenado bloque a
+bloque y mide la latencia y la concordancia con el detector offline.
+"""
+import time
+
+import numpy as np
+
+from src import analysis, instrumentation
+from src.data_preprocessing import design_sos
+
+
+class StreamingPeakDetector:
+    """
+    Detector incremental de picos R con latencia acotada.
+
+    Cada pico R se emite, como máximo, ``max_latency_s`` segundos después de que
+    llegue su muestra: retardo del filtro pasa banda causal + ventana de
+    integración + periodo refractario (tiempo que se espera para confirmar que no
+    hay un pico mayor). A esa cota hay que sumar el tamaño del bloque, ya que las
+    muestras solo se procesan cuando llega el bloque que las contiene.
+
+    Args:
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        refractory_ms (float): Distancia mínima entre dos picos R, en ms.
+        integration_ms (float): Ventana de integración de la energía QRS, en ms.
+        learning_s (float): Duración de la fase inicial de aprendizaje de umbrales, en s.
+        hr_beats (int): Número de intervalos RR recientes usados para la frecuencia cardíaca.
+    """
+
+    def __init__(self, fs, refractory_ms=200, integration_ms=150, learning_s=2.0, hr_beats=8):
+        self.fs = fs
+        self.refractory = max(1, int(round(refractory_ms * fs / 1000)))
+        self.window = max(1, int(round(integration_ms * fs / 1000)))
+        self.learning = max(self.window + 2, int(round(learning_s * fs)))
+        self.hr_beats = hr_beats
+
+        # Importación diferida: scipy.signal tarda en importarse y solo lo usa el detector
+        from scipy.signal import sosfilt, sosfiltfilt
+
+        self.sos = design_sos('bandpass', (5.0, 15.0), float(fs), 2).copy()  # escribible para scipy
+        # Retardo del filtro causal respecto al filtrado de fase cero, medido sobre un
+        # pulso gaussiano con la anchura típica de un QRS (sigma = 12 ms), en muestras
+        t = np.arange(int(fs)) - int(fs) // 2
+        pulse = np.exp(-0.5 * (t / (0.012 * fs)) ** 2)
+        self.delay = int(np.argmax(np.abs(sosfilt(self.sos, pulse))) - np.argmax(np.abs(sosfiltfilt(self.sos, pulse))))
+
+        self.reset()
+
+    @property
+    def max_latency_s(self):
+        """Latencia máxima (s) entre la llegada de la muestra del pico R y su emisión."""
+        return (self.delay + self.window + self.refractory + 1) / self.fs
+
+    def reset(self):
+        """Reinicia el estado interno (filtro, umbrales y picos detectados)."""
+        self._zi = None
+        self._last_bp = 0.0
+        self._sq_tail = np.zeros(self.window - 1)
+        # Historia reciente de la señal filtrada y de la energía; _offset es el índice global de su primera muestra
+        self._bp_hist = np.zeros(0)
+        self._energy_hist = np.zeros(0)
+        self._offset = 0
+        self._scan_from = 1
+        self._n = 0
+
+        self._spki = None
+        self._npki = None
+        self._candidate = None
+        self._last_energy_peak = -self.refractory - 1
+        self.peaks = []
+        self._rr = []
+
+    @property
+    def threshold(self):
+        """Umbral adaptativo actual sobre la energía QRS (None durante el aprendizaje)."""
+        if self._spki is None:
+            return None
+        return self._npki + 0.25 * (self._spki - self._npki)
+
+    @property
+    def heart_rate(self):
+        """Frecuencia cardíaca (bpm) de los últimos ``hr_beats`` intervalos RR, o None."""
+        if not self._rr:
+            return None
+        return 60 / np.mean(self._rr[-self.hr_beats:])
+
+    def _energy(self, chunk):
+        """Filtro pasa banda causal, derivada, cuadrado e integración móvil con estado."""
+        from scipy.signal import sosfilt, sosfilt_zi  # importación diferida (ya cargado en ``__init__``)
+
+        if self._zi is None:
+            self._zi = sosfilt_zi(self.sos) * chunk[0]
+        bp, self._zi = sosfilt(self.sos, chunk, zi=self._zi)
+
+        derivative = np.diff(bp, prepend=self._last_bp)
+        self._last_bp = bp[-1]
+
+        squared = np.concatenate((self._sq_tail, derivative ** 2))
+        if self.window > 1:
+            self._sq_tail = squared[-(self.window - 1):]
+        cumsum = np.cumsum(np.concatenate(([0.0], squared)))
+        energy = (cumsum[self.window:] - cumsum[:-self.window]) / self.window
+        return bp, energy
+
+    def _confirm(self, index):
+        """Emite el pico R asociado al máximo de energía en ``index`` (índice global)."""
+        value = self._energy_hist[index - self._offset]
+        self._spki = 0.125 * value + 0.875 * self._spki
+        self._last_energy_peak = index
+
+        # El pico R está en la ventana de integración previa, desplazado por el retardo del filtro
+        lo = max(index - self.window, self._offset)
+        segment = np.abs(self._bp_hist[lo - self._offset:index - self._offset + 1])
+        r_peak = max(0, lo + int(np.argmax(segment)) - self.delay)
+
+        if self.peaks:
+            self._rr.append((r_peak - self.peaks[-1]) / self.fs)
+            del self._rr[:-self.hr_beats]
+        self.peaks.append(r_peak)
+        return r_peak
+
+    @instrumentation.timed(samples=lambda self, chunk: len(chunk))
+    def process(self, chunk):
+        """
+        Procesa un bloque de muestras de tamaño arbitrario.
+
+        Args:
+            chunk (np.ndarray): Array 1-D con las nuevas muestras de la derivación.
+
+        Returns:
+            np.ndarray: Índices globales (desde el inicio del flujo) de los picos R
+                        confirmados durante esta llamada.
+        """
+        chunk = np.asarray(chunk, dtype=float).ravel()
+        if len(chunk) == 0:
+            return np.array([], dtype=int)
+
+        bp, energy = self._energy(chunk)
+        self._bp_hist = np.concatenate((self._bp_hist, bp))
+        self._energy_hist = np.concatenate((self._energy_hist, energy))
+        self._n += len(chunk)
+
+        emitted = []
+        if self._spki is None:
+            # Fase de aprendizaje: se inicializan los umbrales con los primeros segundos
+            if self._n < self.learning:
+                return np.array([], dtype=int)
+            learned = self._energy_hist[self.window:]
+            self._spki = learned.max() / 3
+            self._npki = learned.mean() / 2
+
+        # Máximos locales de energía con ambos vecinos disponibles
+        e = self._energy_hist
+        start = self._scan_from - self._offset
+        stop = len(e) - 1
+        if stop > start:
+            mid = e[start:stop]
+            is_max = (mid > e[start - 1:stop - 1]) & (mid >= e[start + 1:stop + 1])
+            for local in np.flatnonzero(is_max):
+                index = self._offset + start + local
+                value = e[start + local]
+
+                # Confirmar el candidato pendiente si ya pasó su periodo refractario
+                if self._candidate is not None and index - self._candidate > self.refractory:
+                    emitted.append(self._confirm(self._candidate))
+                    self._candidate = None
+
+                if value > self.threshold and index - self._last_energy_peak > self.refractory:
+                    if self._candidate is None or value > e[self._candidate - self._offset]:
+                        self._candidate = index
+                else:
+                    self._npki = 0.125 * value + 0.875 * self._npki
+            self._scan_from = self._offset + stop
+
+        # Candidato sin máximos posteriores: confirmar cuando se completa el periodo refractario
+        if self._candidate is not None and self._n - 1 - self._candidate > self.refractory:
+            emitted.append(self._confirm(self._candidate))
+            self._candidate = None
+
+        # Recortar la historia: solo hace falta la ventana necesaria para refinar y confirmar
+        keep = self.refractory + 2 * self.window + 2
+        if len(self._energy_hist) > keep:
+            drop = len(self._energy_hist) - keep
+            self._energy_hist = self._energy_hist[drop:]
+            self._bp_hist = self._bp_hist[drop:]
+            self._offset += drop
+
+        return np.asarray(emitted, dtype=int)
+
+
+def replay_record(signal, fs, chunk_size, tolerance_ms=50, detector=None, offline_peaks=None):
+    """
+    Reproduce una señal almacenada bloque a bloque a través del detector en tiempo real.
+
+    Args:
+        signal (np.ndarray): Array 1-D con la señal de una derivación.
+        fs (int): Frecuencia de muestreo de la señal en Hz.
+        chunk_size (int): Número de muestras por bloque.
+        tolerance_ms (float): Tolerancia para emparejar con los picos offline, en ms.
+        detector (StreamingPeakDetector): Detector a usar. Por defecto, uno nuevo.
+        offline_peaks (np.ndarray): Picos de referencia. Por defecto, ``detect_peaks_batch``.
+
+    Returns:
+        dict: Picos en tiempo real (``peaks``), tiempos de procesamiento por bloque en ms
+              (``chunk_ms``), latencia de emisión de cada pico posterior a la fase de
+              aprendizaje en ms (``latency_ms``),
+              latencia máxima documentada (``max_latency_ms``), frecuencia cardíaca
+              final (``heart_rate``) y concordancia con el detector offline (``agreement``).
+    """
+    signal = np.asarray(signal, dtype=float)
+    detector = detector or StreamingPeakDetector(fs)
+    if offline_peaks is None:
+        per_lead, _ = analysis.detect_peaks_batch(signal, fs)
+        offline_peaks = per_lead[0] if per_lead else np.array([], dtype=int)
+
+    peaks, chunk_ms, latency_ms = [], [], []
+    for start in range(0, len(signal), chunk_size):
+        chunk = signal[start:start + chunk_size]
+        t0 = time.perf_counter()
+        new_peaks = detector.process(chunk)
+        chunk_ms.append((time.perf_counter() - t0) * 1000)
+
+        # Latencia: desde la muestra del pico R hasta la última muestra del bloque que lo emitió
+        arrival = start + len(chunk) - 1
+        latency_ms.extend((arrival - new_peaks) * 1000 / fs)
+        peaks.extend(new_peaks)
+
+    peaks = np.asarray(peaks, dtype=int)
+    latency_ms = np.asarray(latency_ms)
+    # Los picos de la fase de aprendizaje se emiten al terminarla: se excluyen de la latencia
+    latency_ms = latency_ms[peaks >= detector.learning]
+    # Los picos finales (sin periodo refractario completo) no se pueden confirmar en tiempo real
+    horizon = len(signal) - int(detector.max_latency_s * fs)
+    reference = np.asarray(offline_peaks)
+    reference = reference[(reference >= detector.learning) & (reference < horizon)]
+    evaluated = peaks[(peaks >= detector.learning) & (peaks < horizon)]
+
+    return {
+        "peaks": peaks,
+        "chunk_ms": np.asarray(chunk_ms),
+        "latency_ms": latency_ms,
+        "max_latency_ms": detector.max_latency_s * 1000,
+        "heart_rate": detector.heart_rate,
+        "agreement": analysis.compare_peaks(evaluated, reference, fs, tolerance_ms=tolerance_ms),
+    }
@@ -0,0 +1,324 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src import instrumentation
+
+
+def content_hash(*chunks):
+    """
+    Calcula un hash de contenido (BLAKE2b) a partir de uno o varios bloques de bytes.
+
+    Args:
+        *chunks (bytes): Bloques de bytes, p. ej. el contenido de los archivos .mat y .hea.
+
+    Returns:
+        str: Hash hexadecimal del contenido.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in chunks:
+        # Se incluye la longitud para que (b"ab", b"c") y (b"a", b"bc") no colisionen
+        digest.update(len(chunk).to_bytes(8, "little"))
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_uploaded_files(uploaded_files):
+    """
+    Calcula el hash de contenido de un conjunto de archivos subidos con Streamlit.
+
+    El resultado no depende del orden en que se suban los archivos.
+
+    Args:
+        uploaded_files (list): Archivos devueltos por ``st.file_uploader``.
+
+    Returns:
+        str: Hash hexadecimal del contenido de todos los archivos.
+    """
+    chunks = []
+    for uploaded_file in sorted(uploaded_files, key=lambda f: f.name):
+        chunks.append(uploaded_file.name.encode("utf-8"))
+        chunks.append(bytes(uploaded_file.getbuffer()))
+    return content_hash(*chunks)
+
+
+def make_key(record_hash, stage, **params):
+    """
+    Construye la clave de caché para una etapa del análisis.
+
+    Args:
+        record_hash (str): Hash de contenido del registro.
+        stage (str): Nombre de la etapa (p. ej. "record", "peaks", "heart_rate").
+        **params: Parámetros que afectan al resultado (derivación, rango, umbrales...).
+
+    Returns:
+        str: Clave de caché.
+    """
+    param_str = ",".join(f"{name}={params[name]!r}" for name in sorted(params))
+    return f"{record_hash}:{stage}:{param_str}"
+
+
+def _freeze(value):
+    """Marca como solo lectura los arrays NumPy guardados en caché para evitar modificarlos por error."""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _freeze(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _freeze(item)
+    return value
+
+
+def estimate_nbytes(value, _seen=None):
+    """
+    Tamaño aproximado en memoria de un valor guardado en caché: ``nbytes`` de los arrays
+    NumPy, sumado recursivamente en listas, tuplas, diccionarios y atributos de objetos
+    (p. ej. un ``MappedRecord`` o un ``WindowedSignal``). Cada objeto se cuenta una vez.
+
+    Args:
+        value: Valor a medir.
+
+    Returns:
+        int: Bytes estimados.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes, bytearray, memoryview, int, float, bool, type(None))):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(k, seen) + estimate_nbytes(v, seen)
+                                          for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item, seen) for item in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + estimate_nbytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Caché LRU de tamaño acotado para señales decodificadas, picos R y resultados
+    de frecuencia cardíaca, con un nivel opcional en disco y caducidad opcional.
+
+    El nivel en memoria está acotado en número de entradas y, con ``max_bytes``, en
+    bytes (``estimate_nbytes`` de cada valor al guardarlo): se expulsan las entradas
+    menos usadas hasta volver al presupuesto, y un valor mayor que todo el presupuesto
+    no se guarda en memoria.
+
+    Args:
+        max_entries (int): Número máximo de entradas en memoria.
+        disk_dir (str): Directorio para el nivel en disco. ``None`` lo desactiva.
+        ttl_s (float): Tiempo de vida de las entradas, en segundos. ``None`` = sin caducidad.
+        max_bytes (int): Tamaño máximo del nivel en memoria, en bytes. ``None`` = sin límite.
+    """
+
+    def __init__(self, max_entries=64, disk_dir=None, ttl_s=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.ttl_s = ttl_s
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._expires = {}
+        self._sizes = {}
+        self.nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_path(self, key):
+        name = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.pkl")
+
+    def _discard(self, key):
+        # Se llama con el lock adquirido
+        del self._entries[key]
+        self._expires.pop(key, None)
+        self.nbytes -= self._sizes.pop(key)
+
+    def _store(self, key, value):
+        # Se llama con el lock adquirido
+        size = estimate_nbytes(value)
+        if key in self._entries:
+            self._discard(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # no cabe ni vaciando la caché: solo se devuelve (y, si procede, va a disco)
+        self._entries[key] = value
+        self._sizes[key] = size
+        self.nbytes += size
+        if self.ttl_s is not None:
+            self._expires[key] = time.monotonic() + self.ttl_s
+        while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        """
+        Devuelve el valor asociado a ``key`` buscando primero en memoria y después en disco.
+
+        Args:
+            key (str): Clave de caché.
+            default: Valor devuelto si la clave no está en la caché.
+
+        Returns:
+            El valor guardado o ``default``.
+        """
+        with self._lock:
+            if key in self._expires and self._expires[key] <= time.monotonic():
+                # Entrada caducada: se descarta y se trata como un fallo
+                self._discard(key)
+            elif key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            if self.disk_dir:
+                path = self._disk_path(key)
+                fresh = self.ttl_s is None or (os.path.exists(path) and os.path.getmtime(path) + self.ttl_s > time.time())
+                if os.path.exists(path) and fresh:
+                    try:
+                        with open(path, "rb") as f:
+                            value = _freeze(pickle.load(f))
+                    except (OSError, pickle.UnpicklingError, EOFError):
+                        value = None
+                    else:
+                        self.disk_hits += 1
+                        self._store(key, value)
+                        return value
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value, disk=True):
+        """
+        Guarda ``value`` en la caché (y en disco si el nivel en disco está activo).
+
+        Args:
+            key (str): Clave de caché.
+            value: Valor a guardar. Los arrays NumPy se marcan como solo lectura.
+            disk (bool): Si es False, el valor solo se guarda en memoria (p. ej. objetos que
+                         contienen la señal completa y no conviene serializar en cada cálculo).
+
+        Returns:
+            El mismo valor guardado.
+        """
+        value = _freeze(value)
+        with self._lock:
+            self._store(key, value)
+
+        if self.disk_dir and disk:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)  # escritura atómica
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return value
+
+    def get_or_compute(self, key, compute, disk=True):
+        """
+        Devuelve el valor en caché o lo calcula con ``compute()`` y lo guarda.
+
+        Args:
+            key (str): Clave de caché.
+            compute (callable): Función sin argumentos que calcula el valor.
+            disk (bool): Si es False, el valor no se guarda en el nivel en disco (ver ``put``).
+
+        Returns:
+            El valor guardado o recién calculado.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, compute(), disk=disk)
+        return value
+
+    def clear(self):
+        """Vacía el nivel en memoria y reinicia los contadores."""
+        with self._lock:
+            self._entries.clear()
+            self._expires.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Devuelve los contadores de la caché.
+
+        Returns:
+            dict: Aciertos en memoria y en disco, fallos, expulsiones, entradas, bytes en memoria
+                  (estimados) y su límite, y tasa de aciertos.
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+# Caché compartida por todas las sesiones del proceso (sobrevive a los reruns de Streamlit).
+# El nivel en disco se activa definiendo la variable de entorno ECG_CACHE_DIR; el nivel en
+# memoria se limita a ECG_CACHE_MAX_MB (señales completas de registros Holter) y 64 entradas.
+result_cache = ResultCache(
+    max_entries=int(os.getenv("ECG_CACHE_MAX_ENTRIES", "64")),
+    max_bytes=int(float(os.getenv("ECG_CACHE_MAX_MB", "1024")) * 2**20) or None,
+    disk_dir=os.getenv("ECG_CACHE_DIR") or None,
+)
+instrumentation.register_gauges("ecg_result_cache", result_cache.stats)
+
+
+def parse_header_comments(comments):
+    """
+    Extrae los metadatos clínicos (``#Age``, ``#Sex``, ``#Dx``...) de los comentarios
+    de una cabecera WFDB.
+
+    Args:
+        comments (list of str): Comentarios del registro, p. ej. ``record.comments``
+                                (``["Age: 85", "Sex: Male", "Dx: 164889003,59118001"]``).
+
+    Returns:
+        dict: Metadatos con claves en minúsculas. ``age`` es un int (o None si es
+              desconocida) y ``dx`` una lista de códigos SNOMED (str).
+    """
+    metadata = {}
+    for comment in comments or []:
+        key, sep, value = comment.lstrip("#").partition(":")
+        if sep:
+            metadata[key.strip().lower()] = value.strip()
+
+    age = metadata.get("age")
+    try:
+        metadata["age"] = int(float(age)) if age not in (None, "", "Unknown", "NaN") else None
+    except ValueError:
+        metadata["age"] = None
+
+    dx = metadata.get("dx", "")
+    metadata["dx"] = [code.strip() for code in dx.split(",") if code.strip()]
+    return metadata
@@ -0,0 +1,300 @@
+"""
+Visor interactivo de 12 derivaciones con Plotly (trazos WebGL) y datos servidos por ventanas.
+
+El navegador nunca recibe el registro completo: ``WindowedSignal`` sirve, para el
+intervalo visible, como mucho ``max_points`` intervalos min/max por derivación
+(idénticos a nivel de píxel a la señal completa). Para que el coste de cada consulta
+no dependa de la duración del registro, las envolventes min/max se precalculan una
+vez en una pirámide de resoluciones (intervalos de ``base``, ``base·factor``,
+``base·factor²``... muestras) y cada consulta lee el nivel adecuado; al acercarse lo
+suficiente se sirven las muestras originales.
+
+La cuadrícula de papel ECG es la de los ejes de Plotly y los picos R son trazos
+propios que se pueden ocultar desde la leyenda: ninguno se rasteriza. Dentro de la
+ventana servida (la vista más un margen a cada lado) el zoom y el desplazamiento
+son locales en el navegador; al seleccionar un intervalo con el ratón se piden al
+servidor los datos de ese intervalo a más resolución.
+"""
+import numpy as np
+
+from src import instrumentation
+from src.visualization import _grid_steps, decimate_minmax
+
+# Colores del papel ECG (los mismos que los gráficos de matplotlib)
+_PAPER_COLOR = "#fff5f5"
+_MINOR_GRID_COLOR = "#f2c4c4"
+_MAJOR_GRID_COLOR = "#e06666"
+
+# Muestras por bloque al construir la pirámide (acota la memoria con registros en memmap)
+_BUILD_CHUNK = 1 << 20
+
+
+class WindowedSignal:
+    """
+    Proveedor de ventanas decimadas de una señal de varias derivaciones.
+
+    Args:
+        signal (np.ndarray): Señal (muestras x derivaciones) en mV; puede ser un memmap.
+        fs (float): Frecuencia de muestreo en Hz.
+        lead_names (list of str): Nombres de las derivaciones.
+        base (int): Muestras por intervalo del nivel más fino de la pirámide.
+        factor (int): Relación entre los tamaños de intervalo de niveles consecutivos.
+    """
+
+    def __init__(self, signal, fs, lead_names=None, base=64, factor=4):
+        signal = np.asarray(signal)
+        if signal.ndim == 1:
+            signal = signal[:, np.newaxis]
+        self.signal = signal
+        self.fs = float(fs)
+        self.lead_names = list(lead_names) if lead_names is not None else [str(i) for i in range(signal.shape[1])]
+        self.base = base
+        self.factor = factor
+        self._levels = None  # lista de (muestras por intervalo, índices del mínimo, índices del máximo)
+
+    @property
+    def n_samples(self):
+        return self.signal.shape[0]
+
+    @property
+    def duration_ms(self):
+        return (self.n_samples - 1) * 1000 / self.fs if self.n_samples else 0.0
+
+    @instrumentation.timed("viewer.build_pyramid", samples=lambda self: self.n_samples)
+    def _build_levels(self):
+        """Calcula la pirámide min/max (índices de las muestras, por intervalo y derivación)."""
+        n_bins = self.n_samples // self.base
+        index_dtype = np.int32 if self.n_samples < 2**31 else np.int64
+        i_min = np.empty((n_bins, self.signal.shape[1]), dtype=index_dtype)
+        i_max = np.empty_like(i_min)
+        bins_per_chunk = max(1, _BUILD_CHUNK // self.base)
+        for first in range(0, n_bins, bins_per_chunk):
+            last = min(n_bins, first + bins_per_chunk)
+            body = np.asarray(self.signal[first * self.base:last * self.base])
+            body = body.reshape(last - first, self.base, -1)
+            offsets = (np.arange(first, last) * self.base)[:, np.newaxis]
+            i_min[first:last] = body.argmin(axis=1) + offsets
+            i_max[first:last] = body.argmax(axis=1) + offsets
+
+        levels = [(self.base, i_min, i_max)]
+        leads = np.arange(self.signal.shape[1])
+        while len(i_min) >= 2 * self.factor:
+            # Cada intervalo del nivel superior elige el extremo de sus ``factor`` hijos
+            n_parent = len(i_min) // self.factor
+            child_min = i_min[:n_parent * self.factor].reshape(n_parent, self.factor, -1)
+            child_max = i_max[:n_parent * self.factor].reshape(n_parent, self.factor, -1)
+            pick_min = self.signal[child_min, leads].argmin(axis=1)
+            pick_max = self.signal[child_max, leads].argmax(axis=1)
+            i_min = np.take_along_axis(child_min, pick_min[:, np.newaxis, :], axis=1)[:, 0, :]
+            i_max = np.take_along_axis(child_max, pick_max[:, np.newaxis, :], axis=1)[:, 0, :]
+            levels.append((levels[-1][0] * self.factor, i_min, i_max))
+        self._levels = levels
+
+    @instrumentation.timed()
+    def window(self, x_min, x_max, max_points=2000, leads=None):
+        """
+        Datos de ``[x_min, x_max]`` (ms) con como mucho ``max_points`` intervalos min/max
+        por derivación (unos ``2 * max_points`` puntos), sea cual sea la duración.
+
+        Args:
+            x_min (float): Inicio del intervalo en ms.
+            x_max (float): Fin del intervalo en ms.
+            max_points (int): Resolución pedida (normalmente, el ancho del gráfico en píxeles).
+            leads (list of int): Derivaciones a servir. Por defecto, todas.
+
+        Returns:
+            dict: ``x_range`` (intervalo servido, ajustado a la señal), ``bin_samples``
+                  (muestras por intervalo; 1 = muestras originales) y ``traces``
+                  (lista de (nombre, tiempos en ms, valores) por derivación; vacíos si el
+                  intervalo queda entero fuera de la señal).
+        """
+        leads = range(self.signal.shape[1]) if leads is None else leads
+        outside = float(x_max) < 0 or float(x_min) > self.duration_ms or float(x_max) < float(x_min)
+        x_min = min(max(0.0, float(x_min)), self.duration_ms)
+        x_max = max(x_min, min(self.duration_ms, float(x_max)))
+        start = int(np.ceil(x_min * self.fs / 1000))
+        stop = max(start, int(np.floor(x_max * self.fs / 1000)) + 1)
+        if outside:
+            stop = start  # intervalo entero antes o después de la señal (o vacío): trazas vacías
+        span = max(0, stop - start)
+        max_points = max(1, int(max_points))
+
+        if span <= self.base * max_points:
+            # Pocas muestras: decimación directa (o muestras originales), coste O(base · max_points)
+            time = np.arange(start, stop) * (1000 / self.fs)
+            traces = []
+            for lead in leads:
+                t, v = decimate_minmax(time, np.asarray(self.signal[start:stop, lead]), max_points)
+                traces.append((self.lead_names[lead], t, v))
+            bin_samples = 1 if span <= 2 * max_points else int(np.ceil(span / max_points))
+            return {"x_range": (x_min, x_max), "bin_samples": bin_samples, "traces": traces}
+
+        if self._levels is None:
+            self._build_levels()
+        # Nivel más fino con como mucho ``max_points`` intervalos en la ventana
+        bin_samples, i_min, i_max = next(
+            (level for level in self._levels if span / level[0] <= max_points), self._levels[-1]
+        )
+        first, last = start // bin_samples, min(len(i_min), -(-stop // bin_samples))
+        traces = []
+        for lead in leads:
+            lo = np.minimum(i_min[first:last, lead], i_max[first:last, lead])
+            hi = np.maximum(i_min[first:last, lead], i_max[first:last, lead])
+            indices = np.column_stack((lo, hi)).ravel()
+            # Muestras tras el último intervalo completo de este nivel
+            tail_start = max(start, last * bin_samples)
+            if tail_start < stop:
+                tail = np.asarray(self.signal[tail_start:stop, lead])
+                indices = np.append(indices, np.sort([tail_start + tail.argmin(), tail_start + tail.argmax()]))
+            traces.append((self.lead_names[lead], indices * (1000 / self.fs),
+                           np.asarray(self.signal[indices, lead])))
+        return {"x_range": (x_min, x_max), "bin_samples": bin_samples, "traces": traces}
+
+    def peaks(self, qrs_indices, x_min, x_max, lead, max_points=2000):
+        """
+        Picos R visibles de ``[x_min, x_max]`` (ms) en una derivación, como mucho uno
+        por cada uno de los ``max_points`` intervalos de la ventana.
+
+        Returns:
+            np.ndarray: Tiempos de los picos en ms.
+            np.ndarray: Valores de la señal en los picos.
+        """
+        qrs_indices = np.asarray(qrs_indices, dtype=np.int64)
+        first, last = np.searchsorted(qrs_indices, [x_min * self.fs / 1000, x_max * self.fs / 1000 + 1])
+        shown = qrs_indices[first:last]
+        if len(shown) > max_points:
+            columns = ((shown - shown[0]) * max_points // max(1, shown[-1] - shown[0] + 1))
+            shown = shown[np.unique(columns, return_index=True)[1]]
+        return shown * (1000 / self.fs), np.asarray(self.signal[shown, lead])
+
+
+@instrumentation.timed()
+def ecg_figure(window, x_range, peaks=None, title=None, height_per_lead=110):
+    """
+    Figura de Plotly con una fila por derivación (eje de tiempo compartido), trazos
+    WebGL, cuadrícula de papel ECG en los ejes y, opcionalmente, los picos R.
+
+    Args:
+        window (dict): Datos devueltos por ``WindowedSignal.window``.
+        x_range (tuple): Intervalo mostrado inicialmente (ms).
+        peaks (list): Por derivación de ``window``, (tiempos, valores) de los picos R, o None.
+        title (str): Título de la figura.
+        height_per_lead (int): Altura de cada fila en píxeles.
+
+    Returns:
+        plotly.graph_objects.Figure: Figura lista para ``st.plotly_chart``.
+    """
+    # Importación diferida: plotly solo se carga cuando se usa el visor
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    traces = window["traces"]
+    n_rows = len(traces)
+    fig = make_subplots(rows=n_rows, cols=1, shared_xaxes=True, vertical_spacing=0.01)
+    minor_step, major_step = _grid_steps(x_range[1] - x_range[0])
+
+    for row, (name, time, values) in enumerate(traces, start=1):
+        fig.add_trace(
+            go.Scattergl(x=time, y=values, mode="lines", line=dict(color="black", width=1), name=name,
+                         showlegend=False, hovertemplate=f"{name}: %{{y:.3f}} mV<br>%{{x:.0f}} ms<extra></extra>"),
+            row=row, col=1,
+        )
+        if peaks is not None and len(peaks[row - 1][0]):
+            fig.add_trace(
+                go.Scattergl(x=peaks[row - 1][0], y=peaks[row - 1][1], mode="markers",
+                             marker=dict(color="red", size=7), name="Picos R", legendgroup="peaks",
+                             showlegend=row == 1, hovertemplate="Pico R: %{x:.0f} ms<extra></extra>"),
+                row=row, col=1,
+            )
+        fig.update_yaxes(title_text=name, row=row, col=1, dtick=0.5, minor=dict(dtick=0.1, showgrid=True,
+                         gridcolor=_MINOR_GRID_COLOR), gridcolor=_MAJOR_GRID_COLOR, zeroline=False, fixedrange=True)
+
+    fig.update_xaxes(range=list(x_range), dtick=major_step, minor=dict(dtick=minor_step, showgrid=True,
+                     gridcolor=_MINOR_GRID_COLOR), gridcolor=_MAJOR_GRID_COLOR)
+    fig.update_xaxes(title_text="Tiempo (ms)", row=n_rows, col=1)
+    fig.update_layout(
+        title=title,
+        height=max(250, height_per_lead * n_rows + 80),
+        margin=dict(l=60, r=20, t=40 if title else 10, b=40),
+        plot_bgcolor=_PAPER_COLOR,
+        dragmode="select",
+        selectdirection="h",
+        # La vista del navegador se conserva entre ejecuciones mientras no cambie la ventana servida
+        uirevision=f"{x_range[0]:.3f}-{x_range[1]:.3f}",
+        legend=dict(orientation="h", yanchor="bottom", y=1.0, xanchor="right", x=1.0),
+    )
+    return fig
+
+
+def show_ecg_viewer(provider, x_range=None, qrs_indices=None, leads=None, key="ecg_viewer", max_points=1200,
+                    title=None):
+    """
+    Muestra el visor en Streamlit dentro de un fragmento: las interacciones solo
+    reejecutan el visor, no la página.
+
+    Seleccionar un intervalo con el ratón pide al servidor ese intervalo a más
+    resolución; los botones alejan, desplazan o restablecen la vista. Se sirve la
+    vista más un margen de media vista a cada lado, de modo que el zoom y el
+    desplazamiento cortos no necesitan volver al servidor.
+
+    Args:
+        provider (WindowedSignal): Proveedor de datos del registro.
+        x_range (tuple): Vista inicial (ms). Si cambia (p. ej. el slider de la página), la vista se restablece.
+        qrs_indices (np.ndarray): Picos R a marcar (índices de muestra ordenados), o None.
+        leads (list of int): Derivaciones a mostrar. Por defecto, todas.
+        key (str): Clave única del visor en la página.
+        max_points (int): Intervalos min/max por derivación en la vista.
+        title (str): Título de la figura.
+    """
+    import streamlit as st
+
+    full_range = (0.0, provider.duration_ms)
+    x_range = tuple(float(x) for x in (x_range or full_range))
+    state_key = f"{key}_view"
+    # La vista se guarda junto con el rango inicial que la originó
+    if st.session_state.get(state_key, (None, None))[0] != x_range:
+        st.session_state[state_key] = (x_range, x_range)
+
+    def set_view(view):
+        x_min, x_max = view
+        span = max(x_max - x_min, 1000 / provider.fs * 4)
+        x_min = min(max(full_range[0], x_min), max(full_range[0], full_range[1] - span))
+        st.session_state[state_key] = (st.session_state[state_key][0], (x_min, min(full_range[1], x_min + span)))
+
+    def on_select():
+        boxes = st.session_state[f"{key}_chart"]["selection"].get("box", [])
+        if boxes:
+            x0, x1 = sorted(boxes[0]["x"])
+            set_view((x0, x1))
+
+    @st.fragment
+    def viewer():
+        x_min, x_max = st.session_state[state_key][1]
+        span = x_max - x_min
+        cols = st.columns(4)
+        if cols[0].button("◀", key=f"{key}_left", width="stretch"):
+            set_view((x_min - span / 2, x_max - span / 2))
+        if cols[1].button("▶", key=f"{key}_right", width="stretch"):
+            set_view((x_min + span / 2, x_max + span / 2))
+        if cols[2].button("Alejar", key=f"{key}_out", width="stretch"):
+            set_view((x_min - span * 1.5, x_max + span * 1.5))
+        if cols[3].button("Restablecer", key=f"{key}_reset", width="stretch"):
+            set_view(x_range)
+        x_min, x_max = st.session_state[state_key][1]
+        span = x_max - x_min
+
+        # Vista más medio ancho de margen a cada lado, a la resolución de la vista
+        window = provider.window(x_min - span / 2, x_max + span / 2, max_points=2 * max_points, leads=leads)
+        shown_leads = list(range(provider.signal.shape[1])) if leads is None else list(leads)
+        peaks = None
+        if qrs_indices is not None:
+            peaks = [provider.peaks(qrs_indices, *window["x_range"], lead, max_points=2 * max_points)
+                     for lead in shown_leads]
+        fig = ecg_figure(window, (x_min, x_max), peaks=peaks, title=title)
+        resolution = "muestras originales" if window["bin_samples"] == 1 else \
+            f"{window['bin_samples']} muestras por intervalo min/max"
+        st.caption(f"Vista {x_min:.0f}–{x_max:.0f} ms ({resolution}). Selecciona un intervalo para ampliarlo.")
+        st.plotly_chart(fig, key=f"{key}_chart", on_select=on_select, selection_mode="box",
+                        config={"scrollZoom": True, "displaylogo": False})
+
+    viewer()
@@ -1,7 +1,27 @@
+import threading
+
 import streamlit as st
-import matplotlib.pyplot as plt
 import numpy as np
 
+from src import instrumentation
+
+# Resolución con la que st.pyplot rasteriza las figuras (puntos por pulgada)
+RENDER_DPI = 200
+
+# Espaciados de la cuadrícula (ms), de más fino a más grueso. 40 ms = 1 mm de papel ECG.
+_GRID_STEPS_MS = [40, 200, 1000, 5000, 10000, 60000, 300000, 600000, 3600000, 21600000]
+
+# Máximo de líneas verticales de cuadrícula menor y mayor (etiquetadas) por figura (nivel de detalle).
+# Con 250 líneas, la cuadrícula menor de 40 ms (escala de lectura clínica) solo se mantiene en
+# ventanas de hasta 10 s; en rangos más anchos se pasa a 200 ms, 1 s... (a 40 ms serían líneas a
+# menos de 2 píxeles, que se verían como un fondo gris).
+_MAX_MINOR_LINES = 250
+_MAX_MAJOR_LINES = 60
+
+# Figuras persistentes por tipo de gráfico: el estilo de papel ECG se construye una sola vez
+_figures = {}
+_figures_lock = threading.Lock()
+
 
 def validate_x_range(x_range, time):
     """
@@ -40,106 +60,177 @@ def validate_x_range(x_range, time):
         return time[0], time[-1]
     return max(time[0], x_range[0]), min(time[-1], x_range[1])
 
-def plot_ecg_signal_single_lead(signal, time, fs, lead_name="ECG Signal", x_range=None):
-    st.write(f"Mostrando señal de la derivación **{lead_name}** con cuadrícula estilo papel ECG.")
+def visible_bounds(time, x_min, x_max):
+    """
+    Devuelve los índices [inicio, fin) de las muestras dentro de [x_min, x_max] mediante
+    búsqueda binaria sobre el eje de tiempo ordenado (O(log n), sin máscaras).
 
-    x_min, x_max = x_range if x_range else (time[0], time[-1])
-    indices = np.where((time >= x_min) & (time <= x_max))[0]
+    Args:
+        time (np.ndarray): Array NumPy de tiempo (ms), ordenado de forma creciente.
+        x_min (float): Inicio del rango visible (ms).
+        x_max (float): Fin del rango visible (ms).
 
-    if len(indices) == 0:
-        st.warning("El rango de tiempo seleccionado no contiene datos.")
-        return
+    Returns:
+        tuple: Índices (inicio, fin) del rango visible.
+    """
+    start = int(np.searchsorted(time, x_min, side='left'))
+    stop = int(np.searchsorted(time, x_max, side='right'))
+    return start, stop
+
+
+def decimate_minmax(time, signal, n_bins):
+    """
+    Reduce la señal a su envolvente mínimo/máximo en ``n_bins`` intervalos, de modo
+    que el trazo dibujado sea idéntico a nivel de píxel al de todas las muestras.
+
+    Args:
+        time (np.ndarray): Array NumPy de tiempo.
+        signal (np.ndarray): Array NumPy con la señal (misma longitud que ``time``).
+        n_bins (int): Número de intervalos (normalmente, el ancho del gráfico en píxeles).
+
+    Returns:
+        np.ndarray: Tiempos decimados (como máximo 2 * n_bins + 2 puntos).
+        np.ndarray: Valores decimados, en el orden en que aparecen en la señal.
+    """
+    n = len(signal)
+    n_bins = max(1, int(n_bins))
+    if n <= 2 * n_bins:
+        return time, signal
+
+    bin_size = int(np.ceil(n / n_bins))
+    n_full = n // bin_size
+    body = signal[:n_full * bin_size].reshape(n_full, bin_size)
+    base = np.arange(n_full) * bin_size
+    i_min = body.argmin(axis=1) + base
+    i_max = body.argmax(axis=1) + base
+    indices = [np.minimum(i_min, i_max), np.maximum(i_min, i_max)]
+
+    # Último intervalo incompleto
+    if n_full * bin_size < n:
+        tail = signal[n_full * bin_size:]
+        t_min, t_max = n_full * bin_size + tail.argmin(), n_full * bin_size + tail.argmax()
+        indices = [np.append(indices[0], min(t_min, t_max)), np.append(indices[1], max(t_min, t_max))]
+
+    indices = np.column_stack(indices).ravel()
+    return time[indices], signal[indices]
+
+
+def _grid_steps(span_ms):
+    """
+    Elige los espaciados menor y mayor de la cuadrícula según el ancho visible: 40 ms y
+    200 ms (papel ECG estándar) hasta 10 s, y pasos más gruesos en rangos más anchos.
+    """
+    minor = next((step for step in _GRID_STEPS_MS[:-1] if span_ms / step <= _MAX_MINOR_LINES), _GRID_STEPS_MS[-2])
+    major = next((step for step in _GRID_STEPS_MS if step > minor and span_ms / step <= _MAX_MAJOR_LINES),
+                 _GRID_STEPS_MS[-1])
+    return minor, major
 
-    time_display = time[indices]
-    signal_display = signal[indices]
+
+def _ecg_paper_figure(kind):
+    """
+    Devuelve la figura persistente de ``kind`` con el estilo de papel ECG (fondo,
+    cuadrícula, ejes y barra de calibración), creándola la primera vez.
+    """
+    if kind in _figures:
+        return _figures[kind]
+
+    # Importación diferida: matplotlib solo se carga cuando se dibuja el primer gráfico
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MultipleLocator
 
     fig, ax = plt.subplots(figsize=(15, 6))
-    ax.plot(time_display, signal_display, color='black', linewidth=0.75)
 
     # Fondo tipo papel ECG
     ax.set_facecolor('#fff5f5')
 
-    # Cuadrícula milimétrica
-    ax.xaxis.set_minor_locator(plt.MultipleLocator(40))    # 1 mm = 40 ms
-    ax.xaxis.set_major_locator(plt.MultipleLocator(200))   # 5 mm = 200 ms
-    ax.yaxis.set_minor_locator(plt.MultipleLocator(0.1))   # 1 mm = 0.1 mV
-    ax.yaxis.set_major_locator(plt.MultipleLocator(0.5))   # 5 mm = 0.5 mV
-
-    ax.grid(which='minor', color='lightgray', linewidth=0.5)
-    ax.grid(which='major', color='red', linewidth=0.8)
+    # Cuadrícula milimétrica (1 mm = 0.1 mV en el eje vertical); el eje X se ajusta en cada render
+    ax.yaxis.set_minor_locator(MultipleLocator(0.1))   # 1 mm = 0.1 mV
+    ax.yaxis.set_major_locator(MultipleLocator(0.5))   # 5 mm = 0.5 mV
+    ax.grid(which='minor', color='lightgray', linestyle='-', linewidth=0.5)
+    ax.grid(which='major', color='red', linestyle='-', linewidth=0.8)
 
     ax.set_xlabel("Tiempo (ms)")
     ax.set_ylabel("Voltaje (mV)")
-    ax.set_title(f"Señal ECG ({lead_name}) con Cuadrícula y Barra de Calibración")
-
-    # Ejes
-    ax.set_xlim(x_min, x_max)
     ax.set_ylim(-1.0, 1.0)  # fijo para claridad y proporción
-
     ax.tick_params(axis='x', labelrotation=45, labelsize=8)
 
-    # Barra de calibración: 1 mV de altura x 200 ms de ancho
-    cal_x = x_min + 100
-    cal_w = 200
-    cal_h = 1.0
-    ax.plot([cal_x, cal_x], [0, cal_h], color='black', linewidth=2)
-    ax.plot([cal_x, cal_x + cal_w], [cal_h, cal_h], color='black', linewidth=2)
-    ax.plot([cal_x + cal_w, cal_x + cal_w], [cal_h, 0], color='black', linewidth=2)
+    artists = {
+        "fig": fig,
+        "ax": ax,
+        "line": ax.plot([], [], color='black', linewidth=0.75)[0],
+        # Barra de calibración: 1 mV de altura x 200 ms de ancho
+        "calibration": ax.plot([], [], color='black', linewidth=2)[0],
+    }
+    if kind == "qrs":
+        artists["peaks"] = ax.scatter([], [], color='red', marker='o', s=60, label="Picos R", zorder=3)
+        ax.legend(loc='upper right')
 
-    st.pyplot(fig)
-    plt.close(fig)
+    # Ancho del área de datos en píxeles a la resolución de render: resolución de la decimación
+    fig.canvas.draw()
+    artists["pixels"] = int(ax.get_window_extent().width * RENDER_DPI / fig.dpi)
 
-def plot_qrs_detection_single_lead(signal, time, qrs_indices, fs, lead_name="ECG", x_range=None):
-    st.write(f"Visualización de picos R detectados en **{lead_name}** con cuadrícula ECG.")
+    _figures[kind] = artists
+    return artists
+
+
+@instrumentation.timed("visualization.render_ecg_paper", samples=lambda kind, signal, *args, **kwargs: len(signal))
+def _render_ecg_paper(kind, signal, time, x_range, title, qrs_indices=None):
+    """
+    Actualiza la figura persistente con la ventana visible decimada y la muestra en Streamlit.
+
+    Solo se reutilizan la figura, los ejes y su estilo: ``st.pyplot`` rasteriza la figura
+    completa en cada llamada, de modo que la cuadrícula se vuelve a dibujar junto con el
+    trazo (su coste está acotado por ``_MAX_MINOR_LINES`` y ``_MAX_MAJOR_LINES``). Para
+    ventanas de más de 10 s la cuadrícula menor deja de ser la de 40 ms (ver ``_grid_steps``).
+    """
+    from matplotlib.ticker import MultipleLocator
 
     x_min, x_max = x_range if x_range else (time[0], time[-1])
-    indices = np.where((time >= x_min) & (time <= x_max))[0]
+    start, stop = visible_bounds(time, x_min, x_max)
 
-    if len(indices) == 0:
+    if stop <= start:
         st.warning("El rango de tiempo seleccionado no contiene datos.")
         return
 
-    time_display = time[indices]
-    signal_display = signal[indices]
+    with _figures_lock:
+        artists = _ecg_paper_figure(kind)
+        ax = artists["ax"]
 
-    fig, ax = plt.subplots(figsize=(15, 6))
-    ax.plot(time_display, signal_display, color='black', linewidth=0.75)
+        time_display, signal_display = decimate_minmax(time[start:stop], signal[start:stop], artists["pixels"])
+        artists["line"].set_data(time_display, signal_display)
 
-    # Fondo ECG
-    ax.set_facecolor('#fff5f5')
+        # Cuadrícula con nivel de detalle: número de líneas acotado sea cual sea el rango
+        minor_step, major_step = _grid_steps(x_max - x_min)
+        ax.xaxis.set_minor_locator(MultipleLocator(minor_step))
+        ax.xaxis.set_major_locator(MultipleLocator(major_step))
+        ax.set_xlim(x_min, x_max)
+        ax.set_title(title)
 
-    # Cuadrícula
-    ax.xaxis.set_minor_locator(plt.MultipleLocator(40))
-    ax.xaxis.set_major_locator(plt.MultipleLocator(200))
-    ax.yaxis.set_minor_locator(plt.MultipleLocator(0.1))
-    ax.yaxis.set_major_locator(plt.MultipleLocator(0.5))
-    ax.grid(which='minor', color='lightgray', linestyle='-', linewidth=0.5)
-    ax.grid(which='major', color='red', linestyle='-', linewidth=0.8)
+        # Barra de calibración: 1 mV de altura x 200 ms de ancho
+        cal_x, cal_w, cal_h = x_min + 100, 200, 1.0
+        artists["calibration"].set_data([cal_x, cal_x, cal_x + cal_w, cal_x + cal_w], [0, cal_h, cal_h, 0])
 
-    ax.set_xlabel("Tiempo (ms)")
-    ax.set_ylabel("Voltaje (mV)")
-    ax.set_title(f"Picos R en {lead_name} con Cuadrícula de Papel ECG")
+        if qrs_indices is not None:
+            # Picos R visibles: búsqueda binaria sobre los índices ordenados
+            qrs_indices = np.asarray(qrs_indices, dtype=int)
+            first, last = np.searchsorted(qrs_indices, [start, stop])
+            shown = qrs_indices[first:last]
+            if len(shown) > artists["pixels"]:
+                # Más picos que píxeles: se dibuja como máximo un marcador por columna de píxeles
+                columns = ((time[shown] - x_min) * artists["pixels"] / (x_max - x_min)).astype(int)
+                shown = shown[np.unique(columns, return_index=True)[1]]
+            artists["peaks"].set_offsets(np.column_stack((time[shown], signal[shown])))
+
+        st.pyplot(artists["fig"])
 
-    ax.set_xlim(x_min, x_max)
-    ax.set_ylim(-1.0, 1.0)
-    ax.tick_params(axis='x', labelrotation=45, labelsize=8)
 
-    # picos R
-    qrs_times = time[qrs_indices]
-    qrs_in_range = (qrs_times >= x_min) & (qrs_times <= x_max)
-    qrs_shown = qrs_times[qrs_in_range]
-    signal_qrs = signal[qrs_indices[qrs_in_range]]
-
-    ax.scatter(qrs_shown, signal_qrs, color='red', marker='o', s=60, label="Picos R")
-    ax.legend(loc='upper right')
-
-    # Barra de calibración
-    cal_x = x_min + 100
-    cal_w = 200
-    cal_h = 1.0
-    ax.plot([cal_x, cal_x], [0, cal_h], color='black', linewidth=2)
-    ax.plot([cal_x, cal_x + cal_w], [cal_h, cal_h], color='black', linewidth=2)
-    ax.plot([cal_x + cal_w, cal_x + cal_w], [cal_h, 0], color='black', linewidth=2)
-
-    st.pyplot(fig)
-    plt.close(fig)
\ No newline at end of file
+def plot_ecg_signal_single_lead(signal, time, fs, lead_name="ECG Signal", x_range=None):
+    st.write(f"Mostrando señal de la derivación **{lead_name}** con cuadrícula estilo papel ECG.")
+    _render_ecg_paper("signal", signal, time, x_range,
+                      f"Señal ECG ({lead_name}) con Cuadrícula y Barra de Calibración")
+
+
+def plot_qrs_detection_single_lead(signal, time, qrs_indices, fs, lead_name="ECG", x_range=None):
+    st.write(f"Visualización de picos R detectados en **{lead_name}** con cuadrícula ECG.")
+    _render_ecg_paper("qrs", signal, time, x_range,
+                      f"Picos R en {lead_name} con Cuadrícula de Papel ECG", qrs_indices=qrs_indices)